@@ -87,6 +87,7 @@ LAMBDA_FUNCTIONS=(
   "listgroupaccountassignments"
   "getiamroles"
   "accessanalyzerfindingingestion"
+  "identitycenterevents"
   "s3export"
   "updatefunctioncode"
 )
@@ -94,11 +95,12 @@ LAMBDA_FUNCTIONS=(
 # Remove existing zip files
 rm -f ./zip/*.zip
 
-# Create directories and zip files in a loop
+# Create directories and zip files in a loop. The shared modules in source/common
+# are added to every zip, next to lambda_function.py.
 for func in "${LAMBDA_FUNCTIONS[@]}"; do
   echo "Processing ${func}..."
   mkdir -p "./source/${func}"
-  zip -j "./zip/${func}.zip" "./source/${func}/lambda_function.py"
+  zip -j "./zip/${func}.zip" "./source/${func}/lambda_function.py" ./source/common/*.py
 done
 
 echo "Zip files created successfully!"
@@ -0,0 +1,213 @@
+"""In-process result reuse for graph queries.
+
+The ARIA graph only changes when the export state machine re-imports it, so the
+same tool call usually returns the same rows for hours. QueryCache entries are
+keyed by the normalised query text, the canonicalised parameters, and a graph
+snapshot marker, and are evicted by size (LRU) and age (TTL). SingleFlight
+coalesces identical queries that are in flight at the same time, so a burst of
+sessions asking the same question costs one round trip.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# Quoted openCypher literals (single, double, or backtick), kept verbatim when
+# normalising whitespace so that 'a  b' and 'a b' stay distinct.
+_LITERAL_RE = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace outside quoted literals and strip the ends."""
+    parts = _LITERAL_RE.split(query)
+    # split() with a capturing group alternates text, literal, text, ...
+    for i in range(0, len(parts), 2):
+        parts[i] = " ".join(parts[i].split())
+    return " ".join(p for p in parts if p).strip()
+
+
+def canonical_parameters(parameters: dict[str, Any] | None) -> str:
+    """Serialise parameters with sorted keys so equal maps give equal keys."""
+    return json.dumps(
+        parameters or {}, sort_keys=True, separators=(",", ":"), default=str
+    )
+
+
+def cache_key(
+    query: str, parameters: dict[str, Any] | None, snapshot: Hashable = None
+) -> tuple[str, str, Hashable]:
+    """Key for one (query, parameters) pair against one graph snapshot."""
+    return normalize_query(query), canonical_parameters(parameters), snapshot
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "query", "parameters", "hits")
+
+    def __init__(self, value, expires_at, query, parameters) -> None:
+        self.value = value
+        self.expires_at = expires_at
+        self.query = query
+        self.parameters = parameters
+        self.hits = 0
+
+
+class QueryCache:
+    """Thread-safe LRU cache with a per-entry TTL.
+
+    Values are deep-copied on the way in and out, so callers may freely mutate
+    what they get back. A max_entries or ttl_seconds of 0 disables caching.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 900.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return a copy of the cached value, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+            value = entry.value
+        return copy.deepcopy(value)
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        query: str | None = None,
+        parameters: dict[str, Any] | None = None,
+    ) -> None:
+        """Store a value. query/parameters are kept so the entry can be replayed."""
+        if not self.enabled:
+            return
+        entry = _Entry(
+            copy.deepcopy(value),
+            time.monotonic() + self.ttl_seconds,
+            query,
+            parameters,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def hottest(self, n: int) -> list[tuple[str, dict[str, Any] | None]]:
+        """The n most-hit (query, parameters) pairs, for pre-warming."""
+        with self._lock:
+            entries = [e for e in self._entries.values() if e.query is not None]
+        entries.sort(key=lambda e: e.hits, reverse=True)
+        return [(e.query, e.parameters) for e in entries[:n] if e.hits > 0]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Share one execution among concurrent callers with the same key.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is running wait and receive a copy of its result (or its exception). Nothing
+    is kept once the call completes - that is QueryCache's job.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.value)
+
+        try:
+            call.value = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        # Followers may still be copying the shared value, so the leader gets
+        # its own copy too rather than the original.
+        return copy.deepcopy(call.value)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "in_flight": in_flight,
+            "executed": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,116 @@
+"""Columnar encoding for tool results.
+
+Row dicts repeat every column name on every row, and the same user, group and
+permission-set names recur across rows and inside collected lists. With
+`columnar=True` a tool returns its rows as
+
+    {"columns": [...], "values": [[column 0 values], [column 1 values], ...],
+     "dictionary_columns": [...]}
+
+where the values of each column listed in `dictionary_columns` (strings, or
+lists of strings) are indexes into the response's top-level `dictionary`. Other
+columns (numbers, nested objects) are stored as-is. decode_rows() reverses it.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+
+class StringTable:
+    """Interns strings to their position in a shared list."""
+
+    def __init__(self) -> None:
+        self.strings: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def intern(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self._index[value] = index
+            self.strings.append(value)
+        return index
+
+
+def _is_string_column(values: list[Any]) -> bool:
+    present = [v for v in values if v is not None]
+    return bool(present) and all(
+        isinstance(v, str)
+        or (isinstance(v, list) and all(isinstance(x, str) for x in v))
+        for v in present
+    )
+
+
+def encode_rows(rows: list[Any], table: StringTable) -> dict[str, Any] | None:
+    """Column-wise form of `rows`, or None if they are not all dicts."""
+    if not all(isinstance(row, dict) for row in rows):
+        return None
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    values: list[list[Any]] = []
+    encoded: list[str] = []
+    for column in columns:
+        cells = [row.get(column) for row in rows]
+        if _is_string_column(cells):
+            cells = [
+                None if v is None
+                else table.intern(v) if isinstance(v, str)
+                else [table.intern(x) for x in v]
+                for v in cells
+            ]
+            encoded.append(column)
+        values.append(cells)
+    return {"columns": columns, "values": values, "dictionary_columns": encoded}
+
+
+def decode_rows(block: dict[str, Any], dictionary: list[str]) -> list[dict[str, Any]]:
+    """Row dicts back from an encode_rows() block and the response dictionary."""
+    columns = block["columns"]
+    cells = []
+    for column, values in zip(columns, block["values"]):
+        if column in block["dictionary_columns"]:
+            values = [
+                None if v is None
+                else dictionary[v] if isinstance(v, int)
+                else [dictionary[x] for x in v]
+                for v in values
+            ]
+        cells.append(values)
+    count = len(cells[0]) if cells else 0
+    return [{c: cells[i][n] for i, c in enumerate(columns)} for n in range(count)]
+
+
+def _json_size(value: Any) -> int:
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+def to_columnar(result: dict[str, Any]) -> dict[str, Any]:
+    """Re-encode a tool result's `results` (and each of its `groups`) in place.
+
+    Batched results share one dictionary across groups. The response's
+    `encoding` reports the compact-JSON size before and after. If any block
+    cannot be encoded, the result is returned unchanged.
+    """
+    before = _json_size(result)
+    table = StringTable()
+    blocks = [result] + [g for g in result.get("groups") or [] if isinstance(g, dict)]
+    encoded = []
+    for holder in blocks:
+        rows = holder.get("results")
+        if isinstance(rows, list):
+            block = encode_rows(rows, table)
+            if block is None:
+                return result
+            encoded.append((holder, block))
+    for holder, block in encoded:
+        holder["results"] = block
+    result["dictionary"] = table.strings
+    after = _json_size(result)
+    result["encoding"] = {
+        "format": "columnar",
+        "row_bytes": before,
+        "columnar_bytes": after,
+        "saved_ratio": round(1 - after / before, 3) if before else 0.0,
+    }
+    return result
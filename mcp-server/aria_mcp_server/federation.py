@@ -0,0 +1,294 @@
+"""Fan-out of every query across several ARIA graphs.
+
+Separate ARIA deployments (one per organization or region) each have their own
+Neptune Analytics graph. FederatedGraphClient holds one AriaGraphClient per
+graph, runs each query against all of them concurrently and merges the rows,
+so the tools answer across deployments without knowing about them.
+
+Each graph gets `graph_timeout_seconds`; a graph that is slower, or fails, is
+left out and reported under the result's `graphs` with `partial: true`, rather
+than stalling the answer. Rows are tagged with `source_graphs`, the ids of the
+graphs that returned them; rows returned identically by several graphs are
+merged into one. Keyset-paged results are re-sorted on their cursor columns and
+cut back to the page size, so a page's next_cursor resumes every graph at the
+same position.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+from .graph_client import (
+    AriaGraphClient,
+    GraphError,
+    QueryTimeout,
+    assert_read_only,
+    bound_query,
+)
+
+
+def parse_graph_ids(value: str) -> list[tuple[str, str | None]]:
+    """(graph id, region) pairs from "g-abc,us-west-2/g-def" (region optional)."""
+    graphs = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        region, _, graph_id = item.rpartition("/")
+        graphs.append((graph_id, region or None))
+    return graphs
+
+
+def _row_key(row: dict[str, Any]) -> str:
+    return json.dumps(
+        {k: v for k, v in row.items() if k != "source_graphs"},
+        sort_keys=True,
+        default=str,
+    )
+
+
+def _order_key(row: dict[str, Any]) -> tuple:
+    # Batched (*_many) rows are grouped by their input columns first; paged
+    # rows follow the ORDER BY of queries.py (cursor_rank DESC, cursor_key).
+    inputs = tuple(str(row[k]) for k in sorted(row) if k.startswith("input_"))
+    rank = row.get("cursor_rank")
+    return inputs, -rank if isinstance(rank, (int, float)) else 0, str(row.get("cursor_key", ""))
+
+
+def merge_rows(
+    per_graph: list[tuple[str, list[Any]]], limit: int | None
+) -> list[Any]:
+    """Tag, dedup and order the rows of several graphs.
+
+    When the rows carry `cursor_key`, they are sorted as the query sorts them
+    and cut to `limit` distinct cursor keys (per input, for batched rows), as
+    the queries apply LIMIT to keys: every row of the last kept key stays, so
+    the next page resumes after all of them.
+    """
+    merged: dict[str, Any] = {}
+    for graph_id, rows in per_graph:
+        for row in rows:
+            if not isinstance(row, dict):
+                merged[f"{graph_id}:{len(merged)}"] = row
+                continue
+            key = _row_key(row)
+            if key in merged:
+                merged[key]["source_graphs"].append(graph_id)
+            else:
+                merged[key] = {**row, "source_graphs": [graph_id]}
+    rows = list(merged.values())
+    if not rows or not all(isinstance(r, dict) and "cursor_key" in r for r in rows):
+        return rows
+    rows.sort(key=_order_key)
+    if limit is None:
+        return rows
+    kept: list[dict[str, Any]] = []
+    per_input: dict[tuple, set[str]] = {}
+    for row in rows:
+        keys = per_input.setdefault(_order_key(row)[0], set())
+        if row["cursor_key"] in keys or len(keys) < limit:
+            keys.add(row["cursor_key"])
+            kept.append(row)
+    return kept
+
+
+class FederatedGraphClient:
+    """AriaGraphClient look-alike that queries several graphs at once."""
+
+    def __init__(
+        self,
+        graphs: list[tuple[str, str | None]],
+        graph_timeout_seconds: float = 20.0,
+        max_pool_connections: int = 10,
+    ) -> None:
+        if not graphs:
+            raise ValueError("FederatedGraphClient needs at least one graph id.")
+        self.members = {
+            graph_id: AriaGraphClient(
+                graph_id=graph_id,
+                region=region,
+                max_pool_connections=max_pool_connections,
+            )
+            for graph_id, region in graphs
+        }
+        self.graph_timeout_seconds = graph_timeout_seconds
+        # Queries outlive their timeout on the worker thread (boto3 calls
+        # cannot be interrupted), so size the pool for a full set per graph.
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.members) * max_pool_connections,
+            thread_name_prefix="aria-federated",
+        )
+
+    @classmethod
+    def from_env(
+        cls, max_pool_connections: int = 10
+    ) -> FederatedGraphClient | AriaGraphClient | None:
+        """Client for ARIA_GRAPH_IDS, or None when it is unset.
+
+        A single entry needs no fan-out and gets a plain AriaGraphClient for
+        that graph and region.
+        """
+        graphs = parse_graph_ids(os.environ.get("ARIA_GRAPH_IDS", ""))
+        if not graphs:
+            return None
+        if len(graphs) == 1:
+            graph_id, region = graphs[0]
+            return AriaGraphClient(
+                graph_id=graph_id,
+                region=region,
+                max_pool_connections=max_pool_connections,
+            )
+        return cls(
+            graphs,
+            graph_timeout_seconds=float(
+                os.environ.get("ARIA_GRAPH_TIMEOUT_SECONDS", "20")
+            ),
+            max_pool_connections=max_pool_connections,
+        )
+
+    @property
+    def prewarm_queries(self) -> list[tuple[str, dict[str, Any] | None]]:
+        return next(iter(self.members.values())).prewarm_queries
+
+    @prewarm_queries.setter
+    def prewarm_queries(self, queries: list[tuple[str, dict[str, Any] | None]]) -> None:
+        for member in self.members.values():
+            member.prewarm_queries = list(queries)
+
+    def _fan_out(
+        self, call: Callable[[AriaGraphClient], Any]
+    ) -> tuple[dict[str, Any], dict[str, dict[str, Any]], float]:
+        """Run `call` on every member: results and status by graph, and seconds.
+
+        Raises the first error when no graph answered in time.
+        """
+        started = time.perf_counter()
+        futures = {
+            self._executor.submit(call, member): graph_id
+            for graph_id, member in self.members.items()
+        }
+        done, _ = wait(futures, timeout=self.graph_timeout_seconds)
+        results: dict[str, Any] = {}
+        status: dict[str, dict[str, Any]] = {}
+        errors: list[Exception] = []
+        for future, graph_id in futures.items():
+            if future not in done:
+                status[graph_id] = {
+                    "status": "timeout",
+                    "message": f"No answer within {self.graph_timeout_seconds:g}s.",
+                }
+                errors.append(
+                    QueryTimeout(f"Graph {graph_id} did not answer in time.")
+                )
+                continue
+            try:
+                results[graph_id] = future.result()
+            except GraphError as exc:
+                status[graph_id] = {"status": "error", "message": str(exc)}
+                errors.append(exc)
+                continue
+            status[graph_id] = {"status": "ok"}
+        if not results:
+            raise errors[0]
+        return results, status, time.perf_counter() - started
+
+    def _merge(
+        self,
+        results: dict[str, dict[str, Any]],
+        status: dict[str, dict[str, Any]],
+        seconds: float,
+        parameters: dict[str, Any] | None,
+    ) -> dict[str, Any]:
+        limit = (parameters or {}).get("limit")
+        rows = merge_rows(
+            [
+                (graph_id, result.get("results") or [])
+                for graph_id, result in results.items()
+            ],
+            limit if isinstance(limit, int) else None,
+        )
+        for graph_id, result in results.items():
+            status[graph_id]["count"] = result.get("count")
+            status[graph_id]["cached"] = result.get("cached", False)
+        merged: dict[str, Any] = {
+            "graph_ids": list(self.members),
+            "count": len(rows),
+            "results": rows,
+            "cached": all(r.get("cached") for r in results.values()),
+            "graphs": status,
+            "federation_seconds": round(seconds, 3),
+        }
+        if len(results) < len(self.members):
+            merged["partial"] = True
+        return merged
+
+    def execute(
+        self,
+        query: str,
+        parameters: dict[str, Any] | None = None,
+        use_cache: bool = True,
+    ) -> dict[str, Any]:
+        """AriaGraphClient.execute against every graph, merged (see merge_rows)."""
+        assert_read_only(query)
+        results, status, seconds = self._fan_out(
+            lambda member: member.execute(query, parameters, use_cache)
+        )
+        return self._merge(results, status, seconds, parameters)
+
+    def execute_guarded(
+        self, query: str, parameters: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        """AriaGraphClient.execute_guarded against every graph, merged.
+
+        The merged rows are cut to the LIMIT each graph was given, so the
+        federation returns no more rows than a single graph would.
+        """
+        assert_read_only(query)
+        member = next(iter(self.members.values()))
+        _, limit, _ = bound_query(query, parameters, member.max_hops, member.max_rows)
+        results, status, seconds = self._fan_out(
+            lambda member: member.execute_guarded(query, parameters)
+        )
+        merged = self._merge(results, status, seconds, parameters)
+        first = next(iter(results.values()))
+        merged["executed_query"] = first.get("executed_query")
+        merged["bounds"] = list(first.get("bounds") or [])
+        if limit is not None and len(merged["results"]) > limit:
+            merged["bounds"].append(
+                f"Cut the {len(merged['results'])} rows of {len(results)} graphs "
+                f"to LIMIT {limit}."
+            )
+            merged["results"] = merged["results"][:limit]
+            merged["count"] = limit
+        if any(r.get("partial") for r in results.values()):
+            merged["partial"] = True
+        return merged
+
+    def snapshot_marker(self) -> str | None:
+        """The members' snapshot markers combined; changes when any graph does."""
+        markers = [
+            f"{graph_id}={member.snapshot_marker()}"
+            for graph_id, member in self.members.items()
+        ]
+        return ";".join(markers)
+
+    def cache_stats(self) -> dict[str, Any]:
+        return {
+            graph_id: member.cache_stats() for graph_id, member in self.members.items()
+        }
+
+    def warm_up(self, connections: int = 1) -> dict[str, float]:
+        """Warm every member at once; the slowest graph's time for each step.
+
+        Raises GraphError only when no graph could be reached.
+        """
+        results, _, _ = self._fan_out(lambda member: member.warm_up(connections))
+        timings: dict[str, float] = {}
+        for member_timings in results.values():
+            for step, seconds in member_timings.items():
+                timings[step] = max(timings.get(step, 0.0), seconds)
+        return timings
@@ -1,7 +1,8 @@
 """Thin boto3 wrapper for the ARIA-gv Neptune Analytics graph.
 
-Handles graph-id discovery, a read-only query guard, and execution of
-openCypher queries via the neptune-graph data plane (`execute_query`).
+Handles graph-id discovery, a read-only query guard, a cost guard for ad-hoc
+queries, a snapshot-keyed result cache, and execution of openCypher queries via
+the neptune-graph data plane (`execute_query`).
 """
 
 from __future__ import annotations
@@ -9,12 +10,17 @@ from __future__ import annotations
 import json
 import os
 import re
+import threading
+import time
 from typing import Any
 
 import boto3
 from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
 
+from .cache import QueryCache, SingleFlight, cache_key
+from .metrics import METRICS
+
 
 class GraphError(Exception):
     """Raised for anything that stops a query from succeeding."""
@@ -24,6 +30,14 @@ class ReadOnlyViolation(GraphError):
     """Raised when a query contains a mutating openCypher clause."""
 
 
+class QueryRejected(GraphError):
+    """Raised when an ad-hoc query's estimated cost is above the configured cap."""
+
+
+class QueryTimeout(GraphError):
+    """Raised when Neptune stops a query at its server-side timeout."""
+
+
 # openCypher / Neptune clauses that mutate the graph. Matched as whole words,
 # case-insensitively. This server is strictly read-only.
 _MUTATING_CLAUSES = (
@@ -61,34 +75,223 @@ def assert_read_only(query: str) -> None:
         )
 
 
+# A variable-length relationship pattern: -[...*]-, -[:R*2..]-, -[*..9]- etc.
+_VAR_LENGTH_RE = re.compile(
+    r"(-\s*\[[^\]]*?)\*\s*(\d+)?\s*(\.\.\s*(\d+)?)?"
+)
+_LAST_LIMIT_RE = re.compile(r"\bLIMIT\s+(\$\w+|\d+)", re.IGNORECASE)
+# Quoted literals and comments. Literals come first in the alternation so that
+# '//' inside a string is not taken for a comment.
+_NON_CODE_RE = re.compile(
+    r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|//[^\n]*|/\*.*?(?:\*/|$)",
+    re.DOTALL,
+)
+
+
+def mask_query(query: str) -> str:
+    """The query with literals and comments blanked out, keeping every offset.
+
+    Keywords and patterns are searched in the masked text, and edits applied at
+    the same positions in the original.
+    """
+    return _NON_CODE_RE.sub(lambda m: re.sub(r"[^\n]", " ", m.group(0)), query)
+
+
+def bound_query(
+    query: str,
+    parameters: dict[str, Any] | None,
+    max_hops: int,
+    max_rows: int,
+) -> tuple[str, int | None, list[str]]:
+    """Cap the work an ad-hoc query can ask for, before it reaches Neptune.
+
+    Variable-length patterns get an upper bound of at most `max_hops`, and the
+    final RETURN gets a LIMIT of at most `max_rows` (a $parameter LIMIT is
+    inlined so it can be capped). Returns the rewritten query, its final LIMIT
+    (None when there is no single final RETURN to bound, e.g. UNION), and one
+    note per change made. Raises QueryRejected for a pattern whose minimum
+    length is above `max_hops`, which no cap could keep the meaning of.
+    """
+    notes: list[str] = []
+    query = query.strip().rstrip(";").rstrip()
+
+    def cap_hops(match: re.Match) -> str:
+        # Offsets come from the masked text; the prefix is read from the original.
+        prefix = query[match.start(1) : match.end(1)]
+        low, dots, high = match.group(2), match.group(3), match.group(4)
+        pattern = query[match.end(1) : match.end()].strip()
+        if low and int(low) > max_hops:
+            raise QueryRejected(
+                f"The variable-length pattern '{pattern}' needs at least {low} hops, "
+                f"above the limit of {max_hops}."
+            )
+        if low and not dots:
+            # Exact length, e.g. *3.
+            return query[match.start() : match.end()]
+        if high and int(high) <= max_hops:
+            return query[match.start() : match.end()]
+        notes.append(f"Capped variable-length pattern '{pattern}' at {max_hops} hops.")
+        return f"{prefix}*{low or 1}..{max_hops}"
+
+    out, last = [], 0
+    for match in _VAR_LENGTH_RE.finditer(mask_query(query)):
+        out.append(query[last : match.start()])
+        out.append(cap_hops(match))
+        last = match.end()
+    query = "".join(out) + query[last:]
+
+    masked = mask_query(query)
+    returns = list(re.finditer(r"\bRETURN\b", masked, re.IGNORECASE))
+    if not returns or re.search(r"\bUNION\b", masked, re.IGNORECASE):
+        if returns:
+            notes.append("UNION queries are not row-capped; add a LIMIT to each part.")
+        return query, None, notes
+
+    limits = [m for m in _LAST_LIMIT_RE.finditer(masked) if m.start() > returns[-1].end()]
+    if not limits:
+        notes.append(f"Added LIMIT {max_rows}; the query had none.")
+        return f"{query}\nLIMIT {max_rows}", max_rows, notes
+
+    match = limits[-1]
+    value = match.group(1)
+    if value.startswith("$"):
+        raw = (parameters or {}).get(value[1:])
+        requested = raw if isinstance(raw, int) else max_rows
+    else:
+        requested = int(value)
+    limit = min(requested, max_rows)
+    if limit != requested:
+        notes.append(f"Capped LIMIT {requested} to {limit}.")
+    if value.startswith("$") or limit != requested:
+        query = f"{query[: match.start(1)]}{limit}{query[match.end(1) :]}"
+    return query, limit, notes
+
+
+def with_final_limit(query: str, limit: int) -> str:
+    """Replace the final numeric LIMIT of a bound_query() result."""
+    *_, match = _LAST_LIMIT_RE.finditer(mask_query(query))
+    return f"{query[: match.start(1)]}{limit}{query[match.end(1) :]}"
+
+
+def estimated_cost(explain: str) -> float | None:
+    """Largest estimate in an explain table, or None if none can be read.
+
+    Neptune's explain output is a text table; the column whose header mentions
+    an estimate (e.g. estimated cardinality / rows) is read row by row.
+    """
+    column = None
+    best: float | None = None
+    for line in explain.splitlines():
+        cells = [c.strip() for c in re.split(r"[|│]", line)]
+        if len(cells) < 2:
+            continue
+        if column is None:
+            for i, cell in enumerate(cells):
+                if re.search(r"\best", cell, re.IGNORECASE):
+                    column = i
+                    break
+            continue
+        if column < len(cells):
+            try:
+                value = float(cells[column].replace(",", ""))
+            except ValueError:
+                continue
+            best = value if best is None else max(best, value)
+    return best
+
+
+def _env_number(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _read_graph_id_file(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return handle.read().strip() or None
+    except OSError:
+        return None
+
+
+def _write_graph_id_file(path: str, graph_id: str) -> None:
+    # Best effort: a read-only filesystem only costs the next start a lookup.
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(graph_id)
+    except OSError:
+        pass
+
+
 class AriaGraphClient:
-    """Lazily-initialised client for the ARIA-gv Neptune Analytics graph."""
+    """Lazily-initialised client for the ARIA-gv Neptune Analytics graph.
+
+    Results are cached in-process, and identical queries that are in flight at
+    the same time share one execute_query call (see cache.py). The key includes a
+    snapshot marker - the set of completed import tasks for the graph - which is
+    re-read at most every `snapshot_check_seconds`. When it changes, the cache
+    is dropped and the most-used queries of the previous snapshot, plus
+    `prewarm_queries`, are re-run in the background.
+    """
 
     def __init__(
         self,
         graph_id: str | None = None,
         region: str | None = None,
         profile: str | None = None,
+        cache: QueryCache | None = None,
+        max_pool_connections: int = 10,
     ) -> None:
         self._graph_id = graph_id or os.environ.get("ARIA_GRAPH_ID") or None
+        # Where a discovered graph id is kept, so a restarted process skips
+        # list_graphs. Unused when the id is configured.
+        self._graph_id_file = os.environ.get("ARIA_GRAPH_ID_FILE") or None
+        if self._graph_id is None and self._graph_id_file:
+            self._graph_id = _read_graph_id_file(self._graph_id_file)
         self._region = region or os.environ.get("AWS_REGION") or os.environ.get(
             "AWS_DEFAULT_REGION"
         )
         self._profile = profile or os.environ.get("AWS_PROFILE")
         self._client = None
+        self._max_pool_connections = max_pool_connections
+        self._lock = threading.Lock()
+
+        self.cache = cache or QueryCache(
+            max_entries=int(_env_number("ARIA_CACHE_MAX_ENTRIES", 256)),
+            ttl_seconds=_env_number("ARIA_CACHE_TTL_SECONDS", 900),
+        )
+        self.snapshot_check_seconds = _env_number("ARIA_SNAPSHOT_CHECK_SECONDS", 60)
+        self.prewarm_top = int(_env_number("ARIA_CACHE_PREWARM_TOP", 20))
+        # (query, parameters) pairs to run whenever a new snapshot is detected.
+        self.prewarm_queries: list[tuple[str, dict[str, Any] | None]] = []
+        self._snapshot: str | None = None
+        self._snapshot_checked_at: float | None = None
+        self._inflight = SingleFlight()
+
+        # Server-side timeout for every query, and the bounds execute_guarded()
+        # applies to ad-hoc queries. A max_explain_cost of 0 skips the explain check.
+        self.query_timeout_ms = int(_env_number("ARIA_NEPTUNE_QUERY_TIMEOUT_MS", 12000))
+        self.max_hops = int(_env_number("ARIA_MAX_VARIABLE_HOPS", 4))
+        self.max_rows = int(_env_number("ARIA_MAX_RESULT_ROWS", 1000))
+        self.max_explain_cost = _env_number("ARIA_MAX_EXPLAIN_COST", 0)
 
     # -- boto3 plumbing -------------------------------------------------
 
     @property
     def client(self):
         if self._client is None:
-            session = boto3.Session(
-                profile_name=self._profile, region_name=self._region
-            )
-            self._client = session.client(
-                "neptune-graph",
-                config=Config(retries={"max_attempts": 3, "mode": "standard"}),
-            )
+            with self._lock:
+                if self._client is None:
+                    session = boto3.Session(
+                        profile_name=self._profile, region_name=self._region
+                    )
+                    self._client = session.client(
+                        "neptune-graph",
+                        config=Config(
+                            retries={"max_attempts": 3, "mode": "standard"},
+                            max_pool_connections=self._max_pool_connections,
+                        ),
+                    )
         return self._client
 
     def resolve_graph_id(self) -> str:
@@ -124,6 +327,8 @@ class AriaGraphClient:
                 "Could not auto-discover the ARIA graph id. "
                 f"Set ARIA_GRAPH_ID explicitly. Graphs found: {names}."
             )
+        if self._graph_id_file:
+            _write_graph_id_file(self._graph_id_file, self._graph_id)
         return self._graph_id
 
     def _list_graphs(self) -> list[dict]:
@@ -133,49 +338,285 @@ class AriaGraphClient:
             graphs.extend(page.get("graphs", []))
         return graphs
 
+    def warm_up(self, connections: int = 1) -> dict[str, float]:
+        """Do the cold-start work ahead of the first tool call.
+
+        Creates the boto3 client, resolves the graph id and runs a trivial
+        query on `connections` threads at once, so that many pooled TLS
+        connections are open. Returns the seconds spent on each step. Raises
+        GraphError when the graph cannot be reached.
+        """
+        timings: dict[str, float] = {}
+        started = time.perf_counter()
+        self.client
+        timings["client_seconds"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        graph_id = self.resolve_graph_id()
+        timings["graph_id_seconds"] = time.perf_counter() - started
+
+        # Straight to _execute_query: execute() would coalesce the identical
+        # calls into one and only open one connection.
+        errors: list[GraphError] = []
+
+        def ping() -> None:
+            try:
+                self._execute_query(graph_id, "RETURN 1 AS ok", None)
+            except GraphError as exc:
+                errors.append(exc)
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=ping, name="aria-warm-up", daemon=True)
+            for _ in range(max(1, connections))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        timings["warm_up_query_seconds"] = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        return timings
+
+    # -- snapshot tracking ----------------------------------------------
+
+    def snapshot_marker(self) -> str | None:
+        """Identify the graph snapshot currently loaded, re-checking periodically.
+
+        The marker is derived from the graph's completed import tasks, so it
+        changes each time the export state machine re-imports the graph. None
+        means the marker could not be read; entries then age out by TTL only.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._snapshot_checked_at is not None
+                and now - self._snapshot_checked_at < self.snapshot_check_seconds
+            ):
+                return self._snapshot
+            self._snapshot_checked_at = now
+            previous = self._snapshot
+
+        current = self._read_snapshot_marker()
+        with self._lock:
+            self._snapshot = current
+        if previous is not None and current != previous:
+            replay = self.cache.hottest(self.prewarm_top)
+            self.cache.clear()
+            self._start_prewarm(replay + list(self.prewarm_queries))
+        return current
+
+    def _read_snapshot_marker(self) -> str | None:
+        try:
+            graph_id = self.resolve_graph_id()
+            task_ids: list[str] = []
+            kwargs: dict[str, Any] = {}
+            while True:
+                page = self.client.list_import_tasks(**kwargs)
+                task_ids.extend(
+                    t["taskId"]
+                    for t in page.get("tasks", [])
+                    if t.get("graphId") == graph_id and t.get("status") == "SUCCEEDED"
+                )
+                if not page.get("nextToken"):
+                    break
+                kwargs["nextToken"] = page["nextToken"]
+        except (ClientError, BotoCoreError, GraphError):
+            return None
+        return ",".join(sorted(task_ids)) or None
+
+    def _start_prewarm(self, queries: list[tuple[str, dict[str, Any] | None]]) -> None:
+        if not queries or not self.cache.enabled:
+            return
+
+        def run() -> None:
+            for query, parameters in queries:
+                try:
+                    self.execute(query, parameters)
+                except GraphError:
+                    # Pre-warming is best effort; the real call will report errors.
+                    continue
+
+        threading.Thread(target=run, name="aria-cache-prewarm", daemon=True).start()
+
+    def cache_stats(self) -> dict[str, Any]:
+        """Hit/miss counters and sizing for the result cache, plus coalescing."""
+        stats = self.cache.stats()
+        stats["snapshot"] = self._snapshot
+        stats["coalescing"] = self._inflight.stats()
+        return stats
+
     # -- query execution ------------------------------------------------
 
     def execute(
-        self, query: str, parameters: dict[str, Any] | None = None
+        self,
+        query: str,
+        parameters: dict[str, Any] | None = None,
+        use_cache: bool = True,
     ) -> dict[str, Any]:
         """Run a read-only openCypher query and return the parsed result.
 
-        Returns a dict with the parsed `results` list plus metadata. Raises
-        ReadOnlyViolation for mutating queries and GraphError for AWS/transport
-        failures (including the common private-endpoint connectivity case).
+        Returns a dict with the parsed `results` list plus metadata, served from
+        the result cache when the same query and parameters were already run
+        against the current snapshot, and shared with any identical call that is
+        already in flight. use_cache=False skips the result cache, for large
+        one-off reads. Raises ReadOnlyViolation for mutating queries and
+        GraphError for AWS/transport failures (including the common
+        private-endpoint connectivity case).
         """
         assert_read_only(query)
         graph_id = self.resolve_graph_id()
 
+        if not use_cache or not self.cache.enabled:
+            METRICS.record_cache("bypass")
+            key = cache_key(query, parameters)
+            return self._inflight.do(
+                key, lambda: self._execute_query(graph_id, query, parameters)
+            )
+
+        key = cache_key(query, parameters, self.snapshot_marker())
+        cached = self.cache.get(key)
+        if cached is not None:
+            METRICS.record_cache("hit")
+            cached["cached"] = True
+            return cached
+        METRICS.record_cache("miss")
+
+        def fetch() -> dict[str, Any]:
+            result = self._execute_query(graph_id, query, parameters)
+            # Populate the cache before followers are released, so callers that
+            # arrive after this point hit the cache instead of starting a call.
+            self.cache.put(key, result, query, parameters)
+            return result
+
+        return self._inflight.do(key, fetch)
+
+    def execute_guarded(
+        self, query: str, parameters: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        """Run an ad-hoc read-only query within the configured bounds.
+
+        The query is rewritten by bound_query(), optionally rejected with
+        QueryRejected when Neptune's explain estimate exceeds max_explain_cost,
+        and run with the server-side timeout. If that timeout hits, it is
+        retried once with a tenth of the LIMIT and the result is marked
+        `partial`. The result's `bounds` lists every adjustment made.
+        """
+        assert_read_only(query)
+        bounded, limit, notes = bound_query(
+            query, parameters, self.max_hops, self.max_rows
+        )
+        if self.max_explain_cost > 0:
+            cost = self.explain_cost(bounded, parameters)
+            if cost is not None and cost > self.max_explain_cost:
+                raise QueryRejected(
+                    f"Neptune estimates this query at {cost:g} rows/operations, above "
+                    f"the limit of {self.max_explain_cost:g}. Anchor it on a specific "
+                    "node, use fewer or shorter variable-length hops, or lower the LIMIT."
+                )
+
+        try:
+            result = self.execute(bounded, parameters)
+        except QueryTimeout:
+            if limit is None or limit <= 1:
+                raise
+            smaller = max(1, limit // 10)
+            bounded = with_final_limit(bounded, smaller)
+            result = self.execute(bounded, parameters)
+            result["partial"] = True
+            notes.append(
+                f"Timed out after {self.query_timeout_ms} ms; re-ran with LIMIT {smaller}, "
+                "so these are only the first rows."
+            )
+        result["executed_query"] = bounded
+        result["bounds"] = notes
+        return result
+
+    def explain_cost(
+        self, query: str, parameters: dict[str, Any] | None = None
+    ) -> float | None:
+        """Neptune's static explain estimate for a query (see estimated_cost)."""
+        raw = self._call_execute_query(
+            self.resolve_graph_id(), query, parameters, explainMode="STATIC"
+        )
+        return estimated_cost(raw or "")
+
+    def _call_execute_query(
+        self,
+        graph_id: str,
+        query: str,
+        parameters: dict[str, Any] | None,
+        **extra: Any,
+    ) -> str | None:
         kwargs: dict[str, Any] = {
             "graphIdentifier": graph_id,
             "queryString": query,
             "language": "OPEN_CYPHER",
+            **extra,
         }
         if parameters:
             kwargs["parameters"] = parameters
 
+        mode = "explain" if "explainMode" in extra else "query"
+        started = time.perf_counter()
         try:
             resp = self.client.execute_query(**kwargs)
+            payload = resp.get("payload")
+            raw = payload.read() if hasattr(payload, "read") else payload
         except (ClientError, BotoCoreError) as exc:
+            timed_out = self._is_timeout(exc)
+            METRICS.record_query(
+                mode,
+                time.perf_counter() - started,
+                "timeout" if timed_out else type(exc).__name__,
+            )
+            if timed_out:
+                raise QueryTimeout(
+                    f"The query exceeded the server-side timeout of "
+                    f"{self.query_timeout_ms} ms."
+                ) from exc
             raise GraphError(self._explain_transport_error(exc)) from exc
+        METRICS.record_query(
+            mode, time.perf_counter() - started, "ok", len(raw) if raw else 0
+        )
 
-        payload = resp.get("payload")
-        raw = payload.read() if hasattr(payload, "read") else payload
         if isinstance(raw, (bytes, bytearray)):
             raw = raw.decode("utf-8")
+        return raw
+
+    def _execute_query(
+        self, graph_id: str, query: str, parameters: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        extra = {}
+        if self.query_timeout_ms > 0:
+            extra["queryTimeoutMilliseconds"] = self.query_timeout_ms
+        raw = self._call_execute_query(graph_id, query, parameters, **extra)
         try:
             parsed = json.loads(raw) if raw else {}
         except json.JSONDecodeError:
             parsed = {"raw": raw}
 
         results = parsed.get("results", parsed)
+        if isinstance(results, list):
+            METRICS.record_rows(len(results))
         return {
             "graph_id": graph_id,
             "count": len(results) if isinstance(results, list) else None,
             "results": results,
+            "cached": False,
         }
 
+    @staticmethod
+    def _is_timeout(exc: Exception) -> bool:
+        # Neptune reports its own query timeout as UnprocessableException with
+        # reason QUERY_TIMEOUT; anything else mentioning a timeout is transport.
+        if not isinstance(exc, ClientError):
+            return False
+        response = exc.response or {}
+        reason = response.get("reason") or response.get("Error", {}).get("Reason")
+        return reason == "QUERY_TIMEOUT"
+
     @staticmethod
     def _explain_transport_error(exc: Exception) -> str:
         msg = str(exc)
@@ -0,0 +1,665 @@
+"""Embedded, read-only copy of the ARIA graph built from the s3export CSVs.
+
+The export writes the graph as Neptune bulk-load CSVs (one file per node or
+edge table). LocalGraph loads those files into integer-indexed arrays: node
+~ids are interned to ints, and each edge label gets a CSR (compressed sparse
+row) adjacency - an offsets array plus a flat targets array - in both
+directions. Traversals are then array slices rather than round trips to the
+private Neptune endpoint, which is what lets the tools answer offline, in CI,
+or when the VPC path is down.
+
+The query methods mirror the openCypher in queries.py: same columns, same
+keyset paging (cursor_key / cursor_rank), same ordering.
+
+s3export also writes the same structure as one binary file (see the layout
+comment in source/s3export/lambda_function.py). SnapshotGraph maps that file
+and reads its arrays in place, so opening it costs no parsing and processes
+that open the same file share its pages.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Any, Iterable, Iterator
+
+from . import queries
+
+
+# Must match the writer in source/s3export/lambda_function.py.
+SNAPSHOT_MAGIC = b"ARIAGRPH"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_NONE = 0xFFFFFFFF
+SNAPSHOT_SUFFIX = ".snap"
+_SNAPSHOT_HEADER = struct.Struct("<8sII")
+_SNAPSHOT_ENTRY = struct.Struct("<64sQQ")
+
+
+class LocalGraphError(Exception):
+    """Raised when a local graph snapshot cannot be loaded."""
+
+
+class _Adjacency:
+    """CSR adjacency for one edge label and direction."""
+
+    __slots__ = ("offsets", "targets")
+
+    def __init__(self, node_count: int, pairs: Iterable[tuple[int, int]]) -> None:
+        pairs = list(pairs)
+        counts = array("i", bytes(4 * (node_count + 1)))
+        for src, _ in pairs:
+            counts[src + 1] += 1
+        for i in range(node_count):
+            counts[i + 1] += counts[i]
+        self.offsets = counts
+        targets = array("i", bytes(4 * len(pairs)))
+        fill = array("i", counts[:node_count])
+        for src, dst in pairs:
+            targets[fill[src]] = dst
+            fill[src] += 1
+        self.targets = targets
+
+    def neighbours(self, node: int) -> array:
+        return self.targets[self.offsets[node] : self.offsets[node + 1]]
+
+
+def _property_name(header: str) -> str:
+    # Neptune CSV headers carry a type suffix: "username:String" -> "username".
+    return header.split(":", 1)[0]
+
+
+class LocalGraph:
+    """In-memory ARIA graph with CSR adjacency per edge label."""
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.ids: list[str] = []
+        self.labels: list[str | None] = []
+        self.properties: list[dict[str, str]] = []
+        self._index: dict[str, int] = {}
+        self._by_label: dict[str, array] = {}
+        self._out: dict[str, _Adjacency] = {}
+        self._in: dict[str, _Adjacency] = {}
+
+    # -- loading --------------------------------------------------------
+
+    @classmethod
+    def load(cls, source: str) -> "LocalGraph":
+        """Load from a local directory or an s3://bucket/prefix of export CSVs.
+
+        A source ending in SNAPSHOT_SUFFIX is opened as a binary snapshot instead.
+        Raises LocalGraphError for a source that cannot be read or a file that
+        cannot be parsed (bad UTF-8, a header without ~id/~from/~to/~label).
+        """
+        if source.endswith(SNAPSHOT_SUFFIX):
+            return SnapshotGraph.open(source)
+        graph = cls(source)
+        edge_files: list[tuple[str, list[list[str]]]] = []
+        name = source
+        try:
+            for name, text in _read_csv_files(source):
+                rows = list(csv.reader(io.StringIO(text)))
+                if not rows:
+                    continue
+                # Nodes must exist before edges can be resolved to indexes.
+                if "~from" in rows[0]:
+                    edge_files.append((name, rows))
+                else:
+                    graph._add_nodes(rows)
+            if not graph.ids:
+                raise LocalGraphError(f"No node CSVs found under {source}.")
+
+            pairs: dict[str, list[tuple[int, int]]] = {}
+            for name, rows in edge_files:
+                graph._collect_edges(rows, pairs)
+        except (csv.Error, IndexError, OSError, ValueError) as exc:
+            raise LocalGraphError(f"Could not load the graph export file {name}: {exc}") from exc
+        graph._build(pairs)
+        return graph
+
+    def _intern(self, node_id: str) -> int:
+        index = self._index.get(node_id)
+        if index is None:
+            index = len(self.ids)
+            self._index[node_id] = index
+            self.ids.append(node_id)
+            self.labels.append(None)
+            self.properties.append({})
+        return index
+
+    def _add_nodes(self, rows: list[list[str]]) -> None:
+        header = rows[0]
+        id_col = header.index("~id")
+        label_col = header.index("~label") if "~label" in header else None
+        prop_cols = [
+            (i, _property_name(h)) for i, h in enumerate(header) if not h.startswith("~")
+        ]
+        for row in rows[1:]:
+            if not row or not row[id_col]:
+                continue
+            index = self._intern(row[id_col])
+            # Several files can emit the same node (one resource per finding,
+            # the rollup properties of accounts and permission sets). Their
+            # properties are merged, as in the Neptune import; the first label
+            # and the first value of each property win.
+            if self.labels[index] is None and label_col is not None:
+                self.labels[index] = row[label_col] or None
+            properties = self.properties[index]
+            for i, name in prop_cols:
+                if i < len(row) and row[i] != "":
+                    properties.setdefault(name, row[i])
+
+    def _collect_edges(
+        self, rows: list[list[str]], pairs: dict[str, list[tuple[int, int]]]
+    ) -> None:
+        header = rows[0]
+        src_col, dst_col = header.index("~from"), header.index("~to")
+        label_col = header.index("~label")
+        for row in rows[1:]:
+            if not row or not row[src_col] or not row[dst_col]:
+                continue
+            pairs.setdefault(row[label_col], []).append(
+                (self._intern(row[src_col]), self._intern(row[dst_col]))
+            )
+
+    def _build(self, pairs: dict[str, list[tuple[int, int]]]) -> None:
+        n = len(self.ids)
+        for label, edges in pairs.items():
+            unique = sorted(set(edges))
+            self._out[label] = _Adjacency(n, unique)
+            self._in[label] = _Adjacency(n, ((d, s) for s, d in unique))
+        by_label: dict[str, list[int]] = {}
+        for index, label in enumerate(self.labels):
+            if label is not None:
+                by_label.setdefault(label, []).append(index)
+        self._by_label = {label: array("i", nodes) for label, nodes in by_label.items()}
+
+    # -- primitives -----------------------------------------------------
+
+    def out(self, node: int, edge: str, label: str | None = None) -> list[int]:
+        adjacency = self._out.get(edge)
+        if adjacency is None:
+            return []
+        return [t for t in adjacency.neighbours(node) if label is None or self.labels[t] == label]
+
+    def into(self, node: int, edge: str, label: str | None = None) -> list[int]:
+        adjacency = self._in.get(edge)
+        if adjacency is None:
+            return []
+        return [t for t in adjacency.neighbours(node) if label is None or self.labels[t] == label]
+
+    def nodes(self, label: str) -> array:
+        return self._by_label.get(label, array("i"))
+
+    def node_id(self, node: int) -> str:
+        return self.ids[node]
+
+    def prop(self, node: int | None, name: str) -> str | None:
+        if node is None:
+            return None
+        if name == "~id":
+            return self.node_id(node)
+        return self.properties[node].get(name)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "source": self.source,
+            "nodes": len(self.ids),
+            "edges": {label: len(adj.targets) for label, adj in self._out.items()},
+        }
+
+    # -- shared traversal helpers -----------------------------------------
+
+    def _users_matching(self, principal: str, match: str) -> list[int]:
+        return [
+            u for u in self.nodes("UserName")
+            if queries.text_matches(
+                "users", principal, match, self.node_id(u), self.prop(u, "username")
+            )
+        ]
+
+    def _resources_matching(self, resource: str, match: str) -> list[int]:
+        return [
+            r for r in self.nodes("CriticalResources")
+            if queries.text_matches("resources", resource, match, self.node_id(r), None)
+        ]
+
+    def _permission_sets_for_user(self, user: int) -> set[int]:
+        # What (u)-[:EFFECTIVELY_ASSIGNED]->(ps) materialises in Neptune: the
+        # user's own assignments plus those of every group they belong to.
+        sets = set(self.out(user, "ASSIGNED_PERMISSIONSET", "PermissionSet"))
+        for group in self.into(user, "HAS_MEMBERS"):
+            sets.update(self.out(group, "ASSIGNED_PERMISSIONSET", "PermissionSet"))
+        return sets
+
+    def _action_matches(self, finding: int, actions: list[str] | None) -> bool:
+        if not actions:
+            return True
+        flags, substrings = queries.split_action_hints(actions)
+        if any(self.prop(finding, flag) == "true" for flag in flags):
+            return True
+        granted = (self.prop(finding, "action") or "").lower()
+        return any(a.lower() in granted for a in substrings)
+
+    def _findings_between(self, role: int, resource: int) -> list[int]:
+        to_resource = set(self.into(resource, "LINKED_TO", "InternalAccessFinding"))
+        return [f for f in self.into(role, "LINKED_TO", "InternalAccessFinding") if f in to_resource]
+
+    def _assignees(self, permission_set: int, label: str) -> list[int]:
+        return self.into(permission_set, "ASSIGNED_PERMISSIONSET", label)
+
+    def _names(self, nodes: Iterable[int], prop: str) -> list[str]:
+        seen: dict[str, None] = {}
+        for node in nodes:
+            value = self.prop(node, prop)
+            if value is not None:
+                seen[value] = None
+        return list(seen)
+
+    # -- tool queries ---------------------------------------------------
+
+    def find_access_paths(
+        self,
+        principal: str,
+        resource: str,
+        actions: list[str] | None,
+        limit: int,
+        after: str = "",
+        *,
+        match: str = "contains",
+    ) -> list[dict[str, Any]]:
+        """Local equivalent of queries.find_access_paths."""
+        resources = set(self._resources_matching(resource, match))
+        keyed: dict[str, tuple[int, int, int, int, int]] = {}
+        for user in self._users_matching(principal, match):
+            for ps in self._permission_sets_for_user(user):
+                for role in self.out(ps, "CREATED_AS", "RoleName"):
+                    for res in self.out(role, "GRANTS_ACCESS_TO", "CriticalResources"):
+                        if res not in resources:
+                            continue
+                        for finding in self._findings_between(role, res):
+                            if not self._action_matches(finding, actions):
+                                continue
+                            key = f"{self.node_id(user)}|{self.node_id(ps)}|{self.node_id(finding)}"
+                            if key > after:
+                                keyed[key] = (user, ps, role, res, finding)
+
+        rows: list[dict[str, Any]] = []
+        for key in sorted(keyed)[:limit]:
+            user, ps, role, res, finding = keyed[key]
+            groups = [
+                g for g in self.into(user, "HAS_MEMBERS", "GroupName")
+                if ps in self.out(g, "ASSIGNED_PERMISSIONSET")
+            ] or [None]
+            for group in groups:
+                rows.append({
+                    "user": self.prop(user, "username"),
+                    "via_group": self.prop(group, "groupname"),
+                    "permission_set": self.prop(ps, "name"),
+                    "iam_role": self.prop(role, "rolename"),
+                    "resource": self.node_id(res),
+                    "granted_actions": self.prop(finding, "action"),
+                    "cursor_key": key,
+                })
+        return rows
+
+    def who_can_access(
+        self,
+        resource: str,
+        actions: list[str] | None,
+        limit: int,
+        after: str = "",
+        *,
+        match: str = "contains",
+    ) -> list[dict[str, Any]]:
+        """Local equivalent of queries.who_can_access."""
+        keyed: dict[tuple[str, int], tuple[int, int, int]] = {}
+        for res in self._resources_matching(resource, match):
+            for role in self.into(res, "GRANTS_ACCESS_TO", "RoleName"):
+                if actions and not any(
+                    self._action_matches(f, actions) for f in self._findings_between(role, res)
+                ):
+                    continue
+                key = f"{self.node_id(res)}|{self.node_id(role)}"
+                if key <= after:
+                    continue
+                for ps in self.into(role, "CREATED_AS", "PermissionSet"):
+                    keyed[(key, ps)] = (res, role, ps)
+
+        rows: list[dict[str, Any]] = []
+        for key, ps_index in sorted(keyed, key=lambda k: (k[0], self.node_id(k[1])))[:limit]:
+            res, role, ps = keyed[(key, ps_index)]
+            # Groups count only when they have members, as in the Cypher pattern.
+            groups = [
+                g for g in self._assignees(ps, "GroupName")
+                if self.out(g, "HAS_MEMBERS", "UserName")
+            ]
+            rows.append({
+                "resource": self.node_id(res),
+                "iam_role": self.prop(role, "rolename"),
+                "permission_set": self.prop(ps, "name"),
+                "directly_assigned_users": self._names(self._assignees(ps, "UserName"), "username"),
+                "via_groups": self._names(groups, "groupname"),
+                "group_member_users": self._names(
+                    (u for g in groups for u in self.out(g, "HAS_MEMBERS", "UserName")),
+                    "username",
+                ),
+                "cursor_key": key,
+            })
+        return rows
+
+    def principal_access_report(
+        self,
+        principal: str,
+        account: str | None,
+        limit: int,
+        after: str = "",
+        *,
+        match: str = "contains",
+    ) -> list[dict[str, Any]]:
+        """Local equivalent of the split principal_access_report.
+
+        Produces the page pairs and the three sub-query row sets, then nests
+        them with queries.join_principal_access, as the server does.
+        """
+        in_scope = queries.account_in_scope(account, match=match)
+
+        def reach(ps: int) -> list[tuple[int, int | None]]:
+            return [
+                (role, res)
+                for role in self.out(ps, "CREATED_AS", "RoleName")
+                for res in self.out(role, "GRANTS_ACCESS_TO", "CriticalResources") or [None]
+            ]
+
+        def owners(res: int) -> list[int]:
+            return self.out(res, "BELONGS_TO", "AccountName")
+
+        def scoped(ps: int) -> bool:
+            if in_scope is None:
+                return True
+            accounts = self.out(ps, "PROVISIONED_INTO", "AccountName")
+            owned = [a for _, res in reach(ps) if res is not None for a in owners(res)]
+            return any(in_scope(self.node_id(a), self.prop(a, "name")) for a in accounts + owned)
+
+        keyed: dict[str, tuple[int, int]] = {}
+        for user in self._users_matching(principal, match):
+            for ps in self._permission_sets_for_user(user):
+                key = f"{self.node_id(user)}|{self.node_id(ps)}"
+                if key > after and scoped(ps):
+                    keyed[key] = (user, ps)
+
+        pairs, accounts, resources, resource_accounts = [], [], [], []
+        seen_ps: set[int] = set()
+        seen_res: set[int] = set()
+        for key in sorted(keyed)[:limit]:
+            user, ps = keyed[key]
+            ps_id = self.node_id(ps)
+            pairs.append({
+                "user": self.prop(user, "username"),
+                "permission_set_id": ps_id,
+                "permission_set": self.prop(ps, "name"),
+                "cursor_key": key,
+            })
+            if ps in seen_ps:
+                continue
+            seen_ps.add(ps)
+            for acct in self.out(ps, "PROVISIONED_INTO", "AccountName"):
+                accounts.append({
+                    "permission_set_id": ps_id,
+                    "account_id": self.node_id(acct),
+                    "account": self.prop(acct, "name"),
+                })
+            for role, res in reach(ps):
+                resources.append({
+                    "permission_set_id": ps_id,
+                    "iam_role": self.prop(role, "rolename"),
+                    "role_account_id": self.prop(role, "accountid"),
+                    "resource": self.node_id(res) if res is not None else None,
+                })
+                if res is not None and res not in seen_res:
+                    seen_res.add(res)
+                    for acct in owners(res):
+                        resource_accounts.append({
+                            "resource": self.node_id(res),
+                            "account_id": self.node_id(acct),
+                            "account": self.prop(acct, "name"),
+                        })
+        return queries.join_principal_access(
+            pairs, accounts, resources, resource_accounts, in_scope
+        )
+
+    def unused_access(
+        self,
+        limit: int,
+        after: str | None = None,
+        after_rank: int = -1,
+    ) -> list[dict[str, Any]]:
+        """Local equivalent of queries.unused_access."""
+        candidates: list[tuple[int, str, int, int]] = []
+        for role in self.nodes("RoleName"):
+            for finding in self.out(role, "HAS_UNUSED_ACCESS", "UnusedAccessFinding"):
+                try:
+                    unused = int(self.prop(finding, "numberofunusedactions") or "")
+                except ValueError:
+                    unused = -1
+                fid = self.node_id(finding)
+                if after is not None and not (
+                    unused < after_rank or (unused == after_rank and fid > after)
+                ):
+                    continue
+                candidates.append((unused, fid, role, finding))
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+
+        rows: list[dict[str, Any]] = []
+        for unused, fid, role, finding in candidates[:limit]:
+            sets = self.into(role, "CREATED_AS", "PermissionSet")
+            rows.append({
+                "iam_role": self.prop(role, "rolename"),
+                "account": self.prop(role, "accountid"),
+                "unused_actions": self.prop(finding, "numberofunusedactions"),
+                "unused_services": self.prop(finding, "numberofunusedservices"),
+                "status": self.prop(finding, "status"),
+                "unused_service_list": self.prop(finding, "unusedservices"),
+                "unused_action_list": self.prop(finding, "unusedactions"),
+                "users": self._names(
+                    (u for ps in sets for u in self._assignees(ps, "UserName")), "username"
+                ),
+                "groups": self._names(
+                    (g for ps in sets for g in self._assignees(ps, "GroupName")), "groupname"
+                ),
+                "cursor_key": fid,
+                "cursor_rank": unused,
+            })
+        return rows
+
+
+class SnapshotGraph(LocalGraph):
+    """LocalGraph over a memory-mapped binary snapshot.
+
+    Every array is a memoryview into the mapping and strings are decoded only
+    when a query reads them, so opening the file does no per-node work.
+    """
+
+    def __init__(self, source: str, buffer: mmap.mmap) -> None:
+        super().__init__(source)
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, count = _SNAPSHOT_HEADER.unpack_from(view, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise LocalGraphError(
+                f"{source} is not a version {SNAPSHOT_VERSION} ARIA graph snapshot."
+            )
+        self._sections: dict[str, memoryview] = {}
+        for i in range(count):
+            raw, offset, length = _SNAPSHOT_ENTRY.unpack_from(
+                view, _SNAPSHOT_HEADER.size + i * _SNAPSHOT_ENTRY.size
+            )
+            name = raw.rstrip(b"\0").decode("utf-8")
+            section = view[offset : offset + length]
+            self._sections[name] = section if name == "strings.data" else section.cast("I")
+        self._strings = self._sections["strings.data"]
+        self._string_offsets = self._sections["strings.offsets"]
+        self._node_ids = self._sections["nodes.id"]
+        self._node_labels = self._sections["nodes.label"]
+        self._label_index = {self.string(i): i for i in self._sections["labels"]}
+        self.node_count = len(self._node_ids)
+
+    @classmethod
+    def open(cls, source: str) -> "SnapshotGraph":
+        """Map a snapshot file; an s3:// source is downloaded to a temp file first."""
+        # The arrays are read in place, so their byte order must be the host's.
+        if sys.byteorder != "little":
+            raise LocalGraphError("Graph snapshots can only be mapped on little-endian hosts.")
+        try:
+            fh = _download_s3_object(source) if source.startswith("s3://") else open(source, "rb")
+            with fh:
+                buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            raise LocalGraphError(f"Could not open the graph snapshot {source}: {exc}") from exc
+        try:
+            return cls(source, buffer)
+        except (KeyError, ValueError, TypeError, struct.error) as exc:
+            raise LocalGraphError(f"The graph snapshot {source} is damaged: {exc}") from exc
+
+    def string(self, index: int) -> str:
+        start, end = self._string_offsets[index], self._string_offsets[index + 1]
+        return bytes(self._strings[start:end]).decode("utf-8")
+
+    def node_id(self, node: int) -> str:
+        return self.string(self._node_ids[node])
+
+    def _adjacent(self, direction: str, node: int, edge: str, label: str | None) -> list[int]:
+        offsets = self._sections.get(f"{direction}.{edge}.offsets")
+        if offsets is None:
+            return []
+        targets = self._sections[f"{direction}.{edge}.targets"][offsets[node] : offsets[node + 1]]
+        if label is None:
+            return list(targets)
+        wanted = self._label_index.get(label)
+        return [t for t in targets if self._node_labels[t] == wanted]
+
+    def out(self, node: int, edge: str, label: str | None = None) -> list[int]:
+        return self._adjacent("out", node, edge, label)
+
+    def into(self, node: int, edge: str, label: str | None = None) -> list[int]:
+        return self._adjacent("in", node, edge, label)
+
+    def nodes(self, label: str) -> memoryview | array:
+        return self._sections.get(f"label.{label}", array("I"))
+
+    def prop(self, node: int | None, name: str) -> str | None:
+        if node is None:
+            return None
+        if name == "~id":
+            return self.node_id(node)
+        column = self._sections.get(f"prop.{name}")
+        if column is None or column[node] == SNAPSHOT_NONE:
+            return None
+        return self.string(column[node])
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "source": self.source,
+            "nodes": self.node_count,
+            "edges": {
+                name[len("out.") : -len(".targets")]: len(view)
+                for name, view in self._sections.items()
+                if name.startswith("out.") and name.endswith(".targets")
+            },
+            "snapshot_bytes": len(self._buffer),
+        }
+
+
+def source_marker(source: str) -> str:
+    """A value that changes whenever the export under `source` is rewritten.
+
+    Listing metadata only (names, sizes, mtimes or ETags), so it is cheap to
+    poll. Raises LocalGraphError when the source cannot be listed.
+    """
+    try:
+        if source.startswith("s3://"):
+            return _s3_marker(source)
+        if source.endswith(SNAPSHOT_SUFFIX):
+            info = os.stat(source)
+            return f"{info.st_size}:{info.st_mtime_ns}"
+        entries = []
+        for name in sorted(os.listdir(source)):
+            if name.endswith(".csv"):
+                info = os.stat(os.path.join(source, name))
+                entries.append(f"{name}:{info.st_size}:{info.st_mtime_ns}")
+        return "|".join(entries)
+    except OSError as exc:
+        raise LocalGraphError(f"Could not list the graph export {source}: {exc}") from exc
+
+
+def _s3_marker(uri: str) -> str:
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    s3 = boto3.client("s3")
+    try:
+        if prefix.endswith(SNAPSHOT_SUFFIX):
+            return s3.head_object(Bucket=bucket, Key=prefix)["ETag"]
+        entries = []
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(".csv"):
+                    entries.append(f"{obj['Key']}:{obj['ETag']}")
+        return "|".join(sorted(entries))
+    except (ClientError, BotoCoreError) as exc:
+        raise LocalGraphError(f"Could not list the graph export {uri}: {exc}") from exc
+
+
+def _read_csv_files(source: str) -> Iterator[tuple[str, str]]:
+    """Yield (name, text) for every .csv under a directory or s3:// prefix."""
+    if source.startswith("s3://"):
+        yield from _read_s3_csv_files(source)
+        return
+    if not os.path.isdir(source):
+        raise LocalGraphError(f"Local graph directory not found: {source}")
+    for name in sorted(os.listdir(source)):
+        if name.endswith(".csv"):
+            with open(os.path.join(source, name), encoding="utf-8", newline="") as fh:
+                yield name, fh.read()
+
+
+def _read_s3_csv_files(uri: str) -> Iterator[tuple[str, str]]:
+    # Imported here so a directory-only setup never pays for boto3 S3 setup.
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    s3 = boto3.client("s3")
+    try:
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if key.endswith(".csv"):
+                    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+                    yield key, body.decode("utf-8")
+    except (ClientError, BotoCoreError) as exc:
+        raise LocalGraphError(f"Could not read the graph export from {uri}: {exc}") from exc
+
+
+def _download_s3_object(uri: str):
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    fh = tempfile.TemporaryFile()
+    try:
+        boto3.client("s3").download_fileobj(bucket, key, fh)
+        fh.flush()
+    except (ClientError, BotoCoreError) as exc:
+        fh.close()
+        raise LocalGraphError(f"Could not download the graph snapshot {uri}: {exc}") from exc
+    return fh
@@ -0,0 +1,213 @@
+"""In-process metrics for tool calls and Neptune queries.
+
+Every tool call and every execute_query call is recorded: latency histograms,
+result rows, payload bytes, result-cache outcomes and error classes. The
+registry is exposed in the Prometheus text format (server.py serves it at
+/metrics next to /mcp) and, every `interval` seconds, as one JSON log line on
+stdout so the numbers also reach CloudWatch Logs on AgentCore Runtime.
+
+Comparing `aria_tool_seconds` with `aria_neptune_query_seconds` for the same
+period tells whether a slow answer was spent in the graph or in the server.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+import time
+from typing import Any
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_HELP = {
+    "aria_tool_calls_total": ("counter", "Tool calls by tool and outcome."),
+    "aria_tool_seconds": ("histogram", "Tool call latency, including waits for a query slot."),
+    "aria_tool_rows": ("histogram", "Rows returned by a tool call."),
+    "aria_tool_response_bytes": ("histogram", "Compact-JSON size of a tool response."),
+    "aria_neptune_queries_total": ("counter", "execute_query calls by mode and outcome."),
+    "aria_neptune_query_seconds": ("histogram", "execute_query round-trip latency."),
+    "aria_neptune_rows": ("histogram", "Rows returned by execute_query."),
+    "aria_neptune_payload_bytes": ("histogram", "Size of the execute_query response payload."),
+    "aria_cache_requests_total": ("counter", "Result-cache lookups by outcome (hit, miss, bypass)."),
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class _Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self) -> None:
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], _Histogram] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(
+        self, name: str, value: float, buckets: tuple[float, ...], **labels: str
+    ) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    # -- recording helpers ----------------------------------------------
+
+    def record_tool(
+        self, tool: str, seconds: float, outcome: str, rows: int | None, size: int | None
+    ) -> None:
+        """One tool call; `outcome` is "ok" or the result's error class."""
+        self.inc("aria_tool_calls_total", tool=tool, outcome=outcome)
+        self.observe("aria_tool_seconds", seconds, LATENCY_BUCKETS, tool=tool)
+        if rows is not None:
+            self.observe("aria_tool_rows", rows, ROW_BUCKETS, tool=tool)
+        if size is not None:
+            self.observe("aria_tool_response_bytes", size, BYTE_BUCKETS, tool=tool)
+
+    def record_query(
+        self, mode: str, seconds: float, outcome: str, size: int | None = None
+    ) -> None:
+        """One execute_query round trip; `mode` is "query" or "explain"."""
+        self.inc("aria_neptune_queries_total", mode=mode, outcome=outcome)
+        self.observe("aria_neptune_query_seconds", seconds, LATENCY_BUCKETS, mode=mode)
+        if size is not None:
+            self.observe("aria_neptune_payload_bytes", size, BYTE_BUCKETS, mode=mode)
+
+    def record_rows(self, rows: int) -> None:
+        self.observe("aria_neptune_rows", rows, ROW_BUCKETS)
+
+    def record_cache(self, outcome: str) -> None:
+        self.inc("aria_cache_requests_total", outcome=outcome)
+
+    # -- exposition -----------------------------------------------------
+
+    def render(self) -> str:
+        """The registry in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (h.buckets, list(h.counts), h.sum, h.count))
+                for key, h in self._histograms.items()
+            )
+        lines: list[str] = []
+        described: set[str] = set()
+
+        def describe(name: str) -> None:
+            if name not in described and name in _HELP:
+                kind, text = _HELP[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels + (('le', _number(bound)),))} {cumulative}"
+                )
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, Any]:
+        """Counters and per-series count/mean/p50/p95 (bucket upper bounds)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (h.buckets, list(h.counts), h.sum, h.count)
+                for key, h in self._histograms.items()
+            }
+        out: dict[str, Any] = {
+            "uptime_seconds": round(time.time() - self.started_at, 1)
+        }
+        for (name, labels), value in sorted(counters.items()):
+            out.setdefault(name, {})[_series(labels)] = value
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            out.setdefault(name, {})[_series(labels)] = {
+                "count": count,
+                "mean": round(total / count, 4) if count else None,
+                "p50": _quantile(buckets, counts, count, 0.5),
+                "p95": _quantile(buckets, counts, count, 0.95),
+            }
+        return out
+
+    def start_log_thread(self, interval: float) -> None:
+        """Print summary() as a JSON line every `interval` seconds (0 disables)."""
+        if interval <= 0:
+            return
+
+        def run() -> None:
+            while True:
+                time.sleep(interval)
+                print(
+                    json.dumps({"event": "aria_metrics", **self.summary()}, default=str),
+                    flush=True,
+                )
+
+        threading.Thread(target=run, name="aria-metrics-log", daemon=True).start()
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join(
+        k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    )
+    return "{" + body + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _series(labels: Labels) -> str:
+    return ",".join(f"{k}={v}" for k, v in labels) or "all"
+
+
+def _quantile(
+    buckets: tuple[float, ...], counts: list[int], count: int, q: float
+) -> float | None:
+    if not count:
+        return None
+    seen = 0
+    for bound, n in zip(buckets, counts):
+        seen += n
+        if seen >= q * count:
+            return bound
+    return float("inf")
+
+
+# Shared by graph_client.py and server.py.
+METRICS = Metrics()
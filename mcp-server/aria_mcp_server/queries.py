@@ -4,14 +4,41 @@ Every builder returns a (query_string, parameters) pair. User-supplied values
 are passed as openCypher parameters ($name), never string-interpolated, so the
 tools are injection-safe.
 
+The *_many builders take lists and UNWIND them in a single query, tagging each
+row with the input it answers (input_resource, input_principal) so the caller
+can group the rows per input.
+
+List-style builders are paged with keyset pagination: each row carries a
+`cursor_key` built from stable node ids (`~id`), rows are ordered on it, and the
+next page starts strictly after the last key seen (`WHERE cursor_key > $after`).
+Callers see this only as an opaque cursor token (encode_cursor/decode_cursor).
+
+A user's permission sets, direct or through any group, are read from the
+EFFECTIVELY_ASSIGNED edges the export materialises, one hop instead of
+expanding group membership at query time.
+
+Entry nodes are selected by the caller's text according to a match mode (see
+search_predicate). "contains" is a substring match; "prefix" and "exact"
+compare with STARTS WITH / equality against the lower-cased names the export
+stores (name_lc; for a resource, the resource name from its ARN), which
+Neptune answers without testing every node of the label. An ARN is compared
+with a resource's `~id` as given.
+
 Graph model (see the solution's s3export lambda for the source of truth):
 
-  Nodes:  UserName{username}, GroupName{groupname}, PermissionSet{name},
-          AccountName{name}, RoleName{rolename,accountid},
-          CriticalResources{resourcetype}, InternalAccessFinding{action,...},
+  Nodes:  UserName{username,name_lc,instancearn},
+          GroupName{groupname,name_lc,instancearn},
+          PermissionSet{name,name_lc,instancearn},
+          AccountName{name,name_lc,instancearn},
+          RoleName{rolename,accountid},
+          CriticalResources{resourcetype,arn_partition,arn_service,arn_region,
+                            arn_account,arn_resourcetype,arn_resourcename,
+                            name_lc},
+          InternalAccessFinding{action,...},
           UnusedAccessFinding{...}
   Edges:  (Group)-[:HAS_MEMBERS]->(User)
           (User|Group)-[:ASSIGNED_PERMISSIONSET]->(PermissionSet)
+          (User)-[:EFFECTIVELY_ASSIGNED{accountid,viagroups,direct}]->(PermissionSet)
           (User|Group)-[:ASSIGNED_ACCOUNT]->(Account)
           (PermissionSet)-[:PROVISIONED_INTO]->(Account)
           (PermissionSet)-[:CREATED_AS]->(Role)
@@ -24,11 +51,42 @@ Graph model (see the solution's s3export lambda for the source of truth):
 
 from __future__ import annotations
 
-from typing import Any
+import base64
+import binascii
+import json
+from typing import Any, Callable
 
 # Default action substrings that indicate a mutating / write-style permission.
 WRITE_ACTION_HINTS = ["put", "update", "write", "delete", "create", "modify", "*"]
 
+# Action hints that name a category rather than part of an action name. They
+# are answered from the boolean flags the export sets on InternalAccessFinding
+# (see classify_actions in the s3export lambda) instead of scanning `action`.
+ACTION_CATEGORIES = {
+    "read": "is_read",
+    "write": "is_write",
+    "delete": "is_delete",
+    "permissions": "is_permissions_mgmt",
+    "permissions_mgmt": "is_permissions_mgmt",
+}
+
+# How a tool's name or ARN argument selects nodes (see search_predicate).
+MATCH_MODES = ("contains", "prefix", "exact")
+
+# Upper bound on any page, whatever limit the caller asks for.
+MAX_PAGE_SIZE = 500
+
+# Upper bound on the inputs (or input pairs) of one batched query.
+MAX_BATCH_INPUTS = 100
+
+# Upper bound on the rows of one sub-query of a split report
+# (see principal_access_report).
+MAX_SUBQUERY_ROWS = 5000
+
+# Row columns that carry the keyset position. They are used to build the next
+# cursor and are not part of the result shown to the caller.
+CURSOR_COLUMNS = ("cursor_key", "cursor_rank")
+
 _ENTITY_MAP = {
     "users": ("UserName", "username"),
     "groups": ("GroupName", "groupname"),
@@ -39,65 +97,306 @@ _ENTITY_MAP = {
 }
 
 
-def _action_filter(var: str, actions_param: str = "actions") -> str:
-    """openCypher predicate: finding `var`.action matches any hint in $actions."""
-    return (
-        f"ANY(a IN ${actions_param} WHERE "
-        f"toLower({var}.action) CONTAINS toLower(a))"
-    )
+def page_size(limit: int) -> int:
+    """Clamp a caller-supplied limit to 1..MAX_PAGE_SIZE."""
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def encode_cursor(scope: str, position: dict[str, Any]) -> str:
+    """Opaque token for a keyset position. `scope` ties it to one builder."""
+    raw = json.dumps({"s": scope, **position}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(scope: str, token: str | None) -> dict[str, Any]:
+    """Position encoded in `token`, or {} for the first page.
+
+    Raises ValueError for a malformed token or one issued by another tool.
+    """
+    if not token:
+        return {}
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError) as exc:
+        raise ValueError("Invalid cursor. Pass the next_cursor value unchanged.") from exc
+    if not isinstance(position, dict) or position.pop("s", None) != scope:
+        raise ValueError("This cursor belongs to a different tool. Start without a cursor.")
+    return position
+
+
+def next_cursor(scope: str, row: dict[str, Any]) -> str:
+    """Cursor that resumes after `row`, the last row of a full page."""
+    position = {"k": row["cursor_key"]}
+    if "cursor_rank" in row:
+        position["r"] = row["cursor_rank"]
+    return encode_cursor(scope, position)
+
+
+def batch_inputs(values: list[str], name: str) -> list[str]:
+    """De-duplicated, non-empty batch inputs in request order.
+
+    Raises ValueError when nothing is left or there are more than
+    MAX_BATCH_INPUTS.
+    """
+    inputs = list(dict.fromkeys(v.strip() for v in values if v and v.strip()))
+    if not inputs:
+        raise ValueError(f"Pass at least one value in `{name}`.")
+    if len(inputs) > MAX_BATCH_INPUTS:
+        raise ValueError(
+            f"At most {MAX_BATCH_INPUTS} {name} per call; split the batch."
+        )
+    return inputs
+
+
+def parse_arn(text: str) -> dict[str, str] | None:
+    """The arn_* properties the export derives from a resource ARN, or None
+    when `text` is not a complete ARN.
+
+    Mirrors parse_arn in the s3export lambda: the resource part is split into
+    type and name at the first "/" or ":", except for S3 (no type; the bucket
+    or bucket/key is the name); IAM names drop their path.
+    """
+    parts = text.split(":", 5)
+    if len(parts) != 6 or parts[0] != "arn":
+        return None
+    _, partition, service, region, account, resource = parts
+    resource_type, resource_name = "", resource
+    if service != "s3":
+        cuts = [i for i in (resource.find("/"), resource.find(":")) if i >= 0]
+        if cuts:
+            resource_type, resource_name = resource[: min(cuts)], resource[min(cuts) + 1 :]
+        if service == "iam":
+            resource_name = resource_name.rsplit("/", 1)[-1]
+    return {
+        "arn_partition": partition,
+        "arn_service": service,
+        "arn_region": region,
+        "arn_account": account,
+        "arn_resourcetype": resource_type,
+        "arn_resourcename": resource_name,
+    }
+
+
+def _is_account_id(text: str) -> bool:
+    return len(text) == 12 and text.isdigit()
+
+
+def search_predicate(
+    kind: str, var: str, text: str, param: str, match: str, params: dict[str, Any]
+) -> str:
+    """openCypher predicate selecting `var`, a node of `kind`, by `text`.
+
+    kind is "users", "accounts" or "resources"; match is one of MATCH_MODES:
+
+      contains  user names case-insensitively, account names and resource
+                ARNs as given (the tools' historical behaviour)
+      prefix    name_lc STARTS WITH the lower-cased text; for resources the
+                lower-cased resource name (e.g. a bucket name)
+      exact     name_lc equal to the lower-cased text (accounts: the account
+                id for a 12-digit text)
+
+    Text starting with "arn:" is compared with a resource's `~id` as given:
+    CONTAINS, STARTS WITH or equality by mode. Sets $`param` in `params`.
+    Raises ValueError for an unknown mode.
+    """
+    if match not in MATCH_MODES:
+        raise ValueError(
+            f"Unknown match '{match}'. Choose one of: {', '.join(MATCH_MODES)}."
+        )
+    if kind == "resources" and (match == "contains" or text.startswith("arn:")):
+        params[param] = text
+        operator = {"contains": "CONTAINS", "prefix": "STARTS WITH", "exact": "="}[match]
+        return f"{var}.`~id` {operator} ${param}"
+    if match == "contains":
+        params[param] = text
+        if kind == "users":
+            return f"toLower({var}.username) CONTAINS toLower(${param})"
+        return f"{var}.name CONTAINS ${param}"
+    if kind == "accounts" and match == "exact" and _is_account_id(text):
+        params[param] = text
+        return f"{var}.`~id` = ${param}"
+    params[param] = text.lower()
+    operator = "=" if match == "exact" else "STARTS WITH"
+    return f"{var}.name_lc {operator} ${param}"
+
+
+def text_matches(
+    kind: str, text: str, match: str, node_id: str, name: str | None
+) -> bool:
+    """search_predicate evaluated in Python, for the embedded graph and the
+    report's account scope. `name` is the node's username/name (unused for
+    resources, whose arn_* values are re-derived from `node_id`)."""
+    if kind == "resources":
+        if match == "contains":
+            return text in node_id
+        if text.startswith("arn:"):
+            return node_id == text if match == "exact" else node_id.startswith(text)
+        # The resource's name_lc, re-derived from its ARN.
+        name = (parse_arn(node_id) or {}).get("arn_resourcename", "")
+    name = name or ""
+    if match == "contains":
+        return text.lower() in name.lower() if kind == "users" else text in name
+    if kind == "accounts" and match == "exact" and _is_account_id(text):
+        return node_id == text
+    if match == "exact":
+        return name.lower() == text.lower()
+    return name.lower().startswith(text.lower())
+
+
+def _entry_point(
+    params: dict[str, Any],
+    var: str,
+    ids: list[str] | None,
+    ids_param: str,
+    kind: str,
+    text: str,
+    text_param: str,
+    match: str,
+) -> str:
+    """WHERE clause selecting an entry node.
+
+    With `ids` (resolved by resolver.py) the node is anchored on `~id`;
+    otherwise it falls back to search_predicate on the raw text.
+    """
+    if ids is not None:
+        params[ids_param] = ids
+        return f"WHERE {var}.`~id` IN ${ids_param}\n"
+    return f"WHERE {search_predicate(kind, var, text, text_param, match, params)}\n"
+
+
+def split_action_hints(actions: list[str]) -> tuple[list[str], list[str]]:
+    """(finding flags named by category hints, remaining substring hints)."""
+    flags: list[str] = []
+    substrings: list[str] = []
+    for hint in actions:
+        flag = ACTION_CATEGORIES.get(hint.strip().lower())
+        if flag is None:
+            substrings.append(hint)
+        elif flag not in flags:
+            flags.append(flag)
+    return flags, substrings
+
+
+def _action_filter(
+    var: str, actions: list[str], params: dict[str, Any], actions_param: str = "actions"
+) -> str:
+    """openCypher predicate: finding `var` matches any hint in `actions`.
+
+    Category hints (ACTION_CATEGORIES) test the flag the export precomputed on
+    the finding; any other hint is matched as a substring of `var`.action,
+    passed as $actions_param.
+    """
+    flags, substrings = split_action_hints(actions)
+    tests = [f"{var}.{flag} = true" for flag in flags]
+    if substrings:
+        params[actions_param] = substrings
+        tests.append(
+            f"ANY(a IN ${actions_param} WHERE "
+            f"toLower({var}.action) CONTAINS toLower(a))"
+        )
+    return "(" + " OR ".join(tests) + ")" if len(tests) > 1 else tests[0]
 
 
 def find_access_paths(
-    principal: str, resource: str, actions: list[str] | None
+    principal: str,
+    resource: str,
+    actions: list[str] | None,
+    limit: int = 50,
+    cursor: str | None = None,
+    user_ids: list[str] | None = None,
+    resource_ids: list[str] | None = None,
+    match: str = "contains",
 ) -> tuple[str, dict[str, Any]]:
-    """Every path from a user to a critical resource, optional action filter."""
-    params: dict[str, Any] = {"principal": principal, "resource": resource}
+    """Every path from a user to a critical resource, optional action filter.
+
+    Paged on (user, permission set, finding); one finding fixes the role and
+    resource, so the key identifies a path up to the optional via-group.
+    `principal` and `resource` are compared per `match` (see
+    search_predicate). `user_ids` / `resource_ids`, when resolved, replace
+    those comparisons.
+    """
+    position = decode_cursor("find_access_paths", cursor)
+    params: dict[str, Any] = {
+        "limit": page_size(limit),
+        "after": position.get("k", ""),
+    }
+    user_clause = _entry_point(
+        params, "u", user_ids, "user_ids", "users", principal, "principal", match
+    )
+    resource_clause = _entry_point(
+        params, "r", resource_ids, "resource_ids", "resources", resource, "resource", match
+    )
     action_clause = ""
     if actions:
-        params["actions"] = actions
-        action_clause = f"  AND {_action_filter('f')}\n"
+        action_clause = f"  AND {_action_filter('f', actions, params)}\n"
 
     query = (
         "MATCH (u:UserName)\n"
-        "WHERE toLower(u.username) CONTAINS toLower($principal)\n"
+        f"{user_clause}"
         "MATCH (r:CriticalResources)\n"
-        "WHERE r.`~id` CONTAINS $resource\n"
-        "MATCH (u)-[:ASSIGNED_PERMISSIONSET|HAS_MEMBERS*1..2]-(ps:PermissionSet)\n"
+        f"{resource_clause}"
+        "MATCH (u)-[:EFFECTIVELY_ASSIGNED]->(ps:PermissionSet)\n"
         "MATCH (ps)-[:CREATED_AS]->(role:RoleName)-[:GRANTS_ACCESS_TO]->(r)\n"
         "MATCH (f:InternalAccessFinding)-[:LINKED_TO]->(role)\n"
         "WHERE (f)-[:LINKED_TO]->(r)\n"
         f"{action_clause}"
+        "WITH DISTINCT u, ps, role, r, f,\n"
+        "     u.`~id` + '|' + ps.`~id` + '|' + f.`~id` AS cursor_key\n"
+        "WHERE cursor_key > $after\n"
+        "ORDER BY cursor_key\n"
+        "LIMIT $limit\n"
         "OPTIONAL MATCH (g:GroupName)-[:HAS_MEMBERS]->(u)\n"
         "WHERE (g)-[:ASSIGNED_PERMISSIONSET]->(ps)\n"
         "RETURN DISTINCT u.username AS user, g.groupname AS via_group,\n"
         "       ps.name AS permission_set, role.rolename AS iam_role,\n"
-        "       r.`~id` AS resource, f.action AS granted_actions\n"
-        "LIMIT 50"
+        "       r.`~id` AS resource, f.action AS granted_actions, cursor_key\n"
+        "ORDER BY cursor_key"
     )
     return query, params
 
 
 def who_can_access(
-    resource: str, actions: list[str] | None
+    resource: str,
+    actions: list[str] | None,
+    limit: int = 100,
+    cursor: str | None = None,
+    resource_ids: list[str] | None = None,
+    match: str = "contains",
 ) -> tuple[str, dict[str, Any]]:
-    """Every human principal that can reach a resource, optional action filter."""
-    params: dict[str, Any] = {"resource": resource}
+    """Every human principal that can reach a resource, optional action filter.
+
+    Paged on (resource, role); each page row aggregates the principals behind
+    one role. `resource` is compared per `match` (see search_predicate);
+    `resource_ids`, when resolved, replaces that comparison.
+    """
+    position = decode_cursor("who_can_access", cursor)
+    params: dict[str, Any] = {
+        "limit": page_size(limit),
+        "after": position.get("k", ""),
+    }
+    resource_clause = _entry_point(
+        params, "r", resource_ids, "resource_ids", "resources", resource, "resource", match
+    )
     action_join = ""
     action_clause = ""
     if actions:
-        params["actions"] = actions
         action_join = (
             "MATCH (f:InternalAccessFinding)-[:LINKED_TO]->(role)\n"
             "WHERE (f)-[:LINKED_TO]->(r)\n"
         )
-        action_clause = f"  AND {_action_filter('f')}\n"
+        action_clause = f"  AND {_action_filter('f', actions, params)}\n"
 
     query = (
         "MATCH (r:CriticalResources)\n"
-        "WHERE r.`~id` CONTAINS $resource\n"
+        f"{resource_clause}"
         "MATCH (role:RoleName)-[:GRANTS_ACCESS_TO]->(r)\n"
         "MATCH (ps:PermissionSet)-[:CREATED_AS]->(role)\n"
         f"{action_join}{action_clause}"
+        "WITH DISTINCT r, role, ps, r.`~id` + '|' + role.`~id` AS cursor_key\n"
+        "WHERE cursor_key > $after\n"
+        "ORDER BY cursor_key\n"
+        "LIMIT $limit\n"
         "OPTIONAL MATCH (du:UserName)-[:ASSIGNED_PERMISSIONSET]->(ps)\n"
         "OPTIONAL MATCH (g:GroupName)-[:ASSIGNED_PERMISSIONSET]->(ps),\n"
         "               (g)-[:HAS_MEMBERS]->(gu:UserName)\n"
@@ -105,77 +404,409 @@ def who_can_access(
         "       ps.name AS permission_set,\n"
         "       collect(DISTINCT du.username) AS directly_assigned_users,\n"
         "       collect(DISTINCT g.groupname) AS via_groups,\n"
-        "       collect(DISTINCT gu.username) AS group_member_users\n"
-        "LIMIT 100"
+        "       collect(DISTINCT gu.username) AS group_member_users,\n"
+        "       cursor_key\n"
+        "ORDER BY cursor_key"
+    )
+    return query, params
+
+
+def find_access_paths_many(
+    principals: list[str],
+    resources: list[str],
+    actions: list[str] | None,
+    limit: int = 20,
+) -> tuple[str, dict[str, Any]]:
+    """find_access_paths for every (principal, resource) pair in one query.
+
+    Rows carry input_principal/input_resource so they can be grouped per pair.
+    Each pair gets at most `limit` paths, ordered and keyed exactly as
+    find_access_paths orders them, so a full group can be continued with a
+    find_access_paths cursor.
+    """
+    principals = batch_inputs(principals, "principals")
+    resources = batch_inputs(resources, "resources")
+    if len(principals) * len(resources) > MAX_BATCH_INPUTS:
+        raise ValueError(
+            f"At most {MAX_BATCH_INPUTS} principal/resource pairs per call; "
+            "split the batch."
+        )
+    params: dict[str, Any] = {
+        "principals": principals,
+        "resources": resources,
+        "limit": page_size(limit),
+    }
+    action_clause = ""
+    if actions:
+        action_clause = f"  AND {_action_filter('f', actions, params)}\n"
+
+    query = (
+        "UNWIND $principals AS input_principal\n"
+        "MATCH (u:UserName)\n"
+        "WHERE toLower(u.username) CONTAINS toLower(input_principal)\n"
+        "UNWIND $resources AS input_resource\n"
+        "MATCH (r:CriticalResources)\n"
+        "WHERE r.`~id` CONTAINS input_resource\n"
+        "MATCH (u)-[:EFFECTIVELY_ASSIGNED]->(ps:PermissionSet)\n"
+        "MATCH (ps)-[:CREATED_AS]->(role:RoleName)-[:GRANTS_ACCESS_TO]->(r)\n"
+        "MATCH (f:InternalAccessFinding)-[:LINKED_TO]->(role)\n"
+        "WHERE (f)-[:LINKED_TO]->(r)\n"
+        f"{action_clause}"
+        "WITH DISTINCT input_principal, input_resource, u, ps, role, r, f,\n"
+        "     u.`~id` + '|' + ps.`~id` + '|' + f.`~id` AS cursor_key\n"
+        "ORDER BY cursor_key\n"
+        "WITH input_principal, input_resource,\n"
+        "     collect({u: u, ps: ps, role: role, r: r, f: f, cursor_key: cursor_key})"
+        "[..$limit] AS hits\n"
+        "UNWIND hits AS hit\n"
+        "WITH input_principal, input_resource, hit.u AS u, hit.ps AS ps,\n"
+        "     hit.role AS role, hit.r AS r, hit.f AS f, hit.cursor_key AS cursor_key\n"
+        "OPTIONAL MATCH (g:GroupName)-[:HAS_MEMBERS]->(u)\n"
+        "WHERE (g)-[:ASSIGNED_PERMISSIONSET]->(ps)\n"
+        "RETURN DISTINCT input_principal, input_resource,\n"
+        "       u.username AS user, g.groupname AS via_group,\n"
+        "       ps.name AS permission_set, role.rolename AS iam_role,\n"
+        "       r.`~id` AS resource, f.action AS granted_actions, cursor_key\n"
+        "ORDER BY input_principal, input_resource, cursor_key"
+    )
+    return query, params
+
+
+def who_can_access_many(
+    resources: list[str],
+    actions: list[str] | None,
+    limit: int = 50,
+) -> tuple[str, dict[str, Any]]:
+    """who_can_access for many resources in one query.
+
+    Rows carry input_resource so they can be grouped per resource. Each
+    resource gets at most `limit` rows, ordered and keyed as who_can_access
+    orders them, so a full group can be continued with a who_can_access cursor.
+    """
+    params: dict[str, Any] = {
+        "resources": batch_inputs(resources, "resources"),
+        "limit": page_size(limit),
+    }
+    action_join = ""
+    action_clause = ""
+    if actions:
+        action_join = (
+            "MATCH (f:InternalAccessFinding)-[:LINKED_TO]->(role)\n"
+            "WHERE (f)-[:LINKED_TO]->(r)\n"
+        )
+        action_clause = f"  AND {_action_filter('f', actions, params)}\n"
+
+    query = (
+        "UNWIND $resources AS input_resource\n"
+        "MATCH (r:CriticalResources)\n"
+        "WHERE r.`~id` CONTAINS input_resource\n"
+        "MATCH (role:RoleName)-[:GRANTS_ACCESS_TO]->(r)\n"
+        "MATCH (ps:PermissionSet)-[:CREATED_AS]->(role)\n"
+        f"{action_join}{action_clause}"
+        "WITH DISTINCT input_resource, r, role, ps,\n"
+        "     r.`~id` + '|' + role.`~id` AS cursor_key\n"
+        "ORDER BY cursor_key\n"
+        "WITH input_resource,\n"
+        "     collect({r: r, role: role, ps: ps, cursor_key: cursor_key})[..$limit] AS hits\n"
+        "UNWIND hits AS hit\n"
+        "WITH input_resource, hit.r AS r, hit.role AS role, hit.ps AS ps,\n"
+        "     hit.cursor_key AS cursor_key\n"
+        "OPTIONAL MATCH (du:UserName)-[:ASSIGNED_PERMISSIONSET]->(ps)\n"
+        "OPTIONAL MATCH (g:GroupName)-[:ASSIGNED_PERMISSIONSET]->(ps),\n"
+        "               (g)-[:HAS_MEMBERS]->(gu:UserName)\n"
+        "RETURN input_resource, r.`~id` AS resource, role.rolename AS iam_role,\n"
+        "       ps.name AS permission_set,\n"
+        "       collect(DISTINCT du.username) AS directly_assigned_users,\n"
+        "       collect(DISTINCT g.groupname) AS via_groups,\n"
+        "       collect(DISTINCT gu.username) AS group_member_users,\n"
+        "       cursor_key\n"
+        "ORDER BY input_resource, cursor_key"
     )
     return query, params
 
 
 def principal_access_report(
-    principal: str, account: str | None
+    principal: str,
+    account: str | None,
+    limit: int = 50,
+    cursor: str | None = None,
+    user_ids: list[str] | None = None,
+    account_ids: list[str] | None = None,
+    match: str = "contains",
 ) -> tuple[str, dict[str, Any]]:
-    """Everything a user can reach, optionally scoped to one account name."""
-    params: dict[str, Any] = {"principal": principal}
-    account_clause = ""
+    """One page of (user, permission set) pairs for a principal access report.
+
+    Paged on (user, permission set). Only the pairs are returned; their
+    accounts, roles and resources are fetched by the permission_set_* and
+    resource_accounts builders, anchored on the page's permission set ids, and
+    joined by the caller. With `account`, only permission sets provisioned into
+    a matching account, or reaching a resource in one, are listed.
+    `principal` and `account` are compared per `match` (see
+    search_predicate); `user_ids` / `account_ids`, when resolved, replace
+    those comparisons.
+    """
+    position = decode_cursor("principal_access_report", cursor)
+    params: dict[str, Any] = {
+        "limit": page_size(limit),
+        "after": position.get("k", ""),
+    }
+    user_clause = _entry_point(
+        params, "u", user_ids, "user_ids", "users", principal, "principal", match
+    )
+    account_scope = ""
     if account:
-        params["account"] = account
-        account_clause = (
-            "WHERE acct.name CONTAINS $account OR resacct.name CONTAINS $account\n"
+        acct_clause = _entry_point(
+            params, "acct", account_ids, "account_ids", "accounts", account, "account", match
+        )
+        resacct_clause = _entry_point(
+            params, "resacct", account_ids, "account_ids", "accounts", account, "account", match
+        )
+        account_scope = (
+            "OPTIONAL MATCH (ps)-[:PROVISIONED_INTO]->(acct:AccountName)\n"
+            f"{acct_clause}"
+            "OPTIONAL MATCH (ps)-[:CREATED_AS]->(:RoleName)"
+            "-[:GRANTS_ACCESS_TO]->(:CriticalResources)"
+            "-[:BELONGS_TO]->(resacct:AccountName)\n"
+            f"{resacct_clause}"
+            "WITH u, ps, cursor_key, count(acct) + count(resacct) AS in_scope\n"
+            "WHERE in_scope > 0\n"
         )
 
     query = (
         "MATCH (u:UserName)\n"
-        "WHERE toLower(u.username) CONTAINS toLower($principal)\n"
-        "MATCH (u)-[:ASSIGNED_PERMISSIONSET|HAS_MEMBERS*1..2]-(ps:PermissionSet)\n"
-        "OPTIONAL MATCH (ps)-[:PROVISIONED_INTO]->(acct:AccountName)\n"
-        "OPTIONAL MATCH (ps)-[:CREATED_AS]->(role:RoleName)"
-        "-[:GRANTS_ACCESS_TO]->(res:CriticalResources)\n"
-        "OPTIONAL MATCH (res)-[:BELONGS_TO]->(resacct:AccountName)\n"
-        f"{account_clause}"
-        "RETURN DISTINCT u.username AS user, ps.name AS permission_set,\n"
-        "       acct.name AS account, role.rolename AS iam_role,\n"
-        "       res.`~id` AS resource, resacct.name AS resource_account\n"
-        "ORDER BY account, permission_set\n"
-        "LIMIT 200"
+        f"{user_clause}"
+        "MATCH (u)-[:EFFECTIVELY_ASSIGNED]->(ps:PermissionSet)\n"
+        "WITH DISTINCT u, ps, u.`~id` + '|' + ps.`~id` AS cursor_key\n"
+        "WHERE cursor_key > $after\n"
+        f"{account_scope}"
+        "RETURN u.username AS user, ps.`~id` AS permission_set_id,\n"
+        "       ps.name AS permission_set, cursor_key\n"
+        "ORDER BY cursor_key\n"
+        "LIMIT $limit"
     )
     return query, params
 
 
-def unused_access(limit: int) -> tuple[str, dict[str, Any]]:
-    """Roles with IAM Access Analyzer unused-access findings, worst first."""
-    params = {"limit": limit}
+def permission_set_accounts(ps_ids: list[str]) -> tuple[str, dict[str, Any]]:
+    """Accounts each permission set is provisioned into."""
+    query = (
+        "MATCH (ps:PermissionSet)-[:PROVISIONED_INTO]->(acct:AccountName)\n"
+        "WHERE ps.`~id` IN $ps_ids\n"
+        "RETURN DISTINCT ps.`~id` AS permission_set_id,\n"
+        "       acct.`~id` AS account_id, acct.name AS account\n"
+        "LIMIT $limit"
+    )
+    return query, {"ps_ids": ps_ids, "limit": MAX_SUBQUERY_ROWS}
+
+
+def permission_set_resources(ps_ids: list[str]) -> tuple[str, dict[str, Any]]:
+    """Roles each permission set created, and the critical resources they reach."""
+    query = (
+        "MATCH (ps:PermissionSet)-[:CREATED_AS]->(role:RoleName)\n"
+        "WHERE ps.`~id` IN $ps_ids\n"
+        "OPTIONAL MATCH (role)-[:GRANTS_ACCESS_TO]->(res:CriticalResources)\n"
+        "RETURN DISTINCT ps.`~id` AS permission_set_id, role.rolename AS iam_role,\n"
+        "       role.accountid AS role_account_id, res.`~id` AS resource\n"
+        "LIMIT $limit"
+    )
+    return query, {"ps_ids": ps_ids, "limit": MAX_SUBQUERY_ROWS}
+
+
+def resource_accounts(resource_ids: list[str]) -> tuple[str, dict[str, Any]]:
+    """Account each critical resource belongs to."""
+    query = (
+        "MATCH (res:CriticalResources)-[:BELONGS_TO]->(acct:AccountName)\n"
+        "WHERE res.`~id` IN $resource_ids\n"
+        "RETURN DISTINCT res.`~id` AS resource,\n"
+        "       acct.`~id` AS account_id, acct.name AS account\n"
+        "LIMIT $limit"
+    )
+    return query, {"resource_ids": resource_ids, "limit": MAX_SUBQUERY_ROWS}
+
+
+def account_in_scope(
+    account: str | None,
+    account_ids: list[str] | None = None,
+    match: str = "contains",
+) -> Callable[[str | None, str | None], bool] | None:
+    """Predicate on (account id, account name) for a report's `account` scope.
+
+    None when the report is not scoped. Mirrors the page query: resolved ids
+    match exactly, otherwise the account is compared per `match`.
+    """
+    if not account:
+        return None
+    if account_ids is not None:
+        wanted = set(account_ids)
+        return lambda account_id, name: account_id in wanted
+    return lambda account_id, name: text_matches(
+        "accounts", account, match, account_id or "", name
+    )
+
+
+def join_principal_access(
+    pairs: list[dict[str, Any]],
+    accounts: list[dict[str, Any]],
+    resources: list[dict[str, Any]],
+    resource_accounts: list[dict[str, Any]],
+    in_scope: Callable[[str | None, str | None], bool] | None = None,
+) -> list[dict[str, Any]]:
+    """Nest the principal_access_report sub-query rows under each page pair.
+
+    Returns one entry per (user, permission set) pair, in page order, with the
+    permission set's accounts and its roles, each role listing the resources it
+    reaches. With `in_scope` (see account_in_scope) accounts are trimmed to the
+    matching ones; when none match, only resources in a matching account are
+    kept.
+    """
+    accounts_by_ps: dict[str, list[dict[str, Any]]] = {}
+    for row in accounts:
+        accounts_by_ps.setdefault(row["permission_set_id"], []).append(row)
+    account_of: dict[str, dict[str, Any]] = {}
+    for row in resource_accounts:
+        account_of.setdefault(row["resource"], row)
+    reach_by_ps: dict[str, list[dict[str, Any]]] = {}
+    for row in resources:
+        reach_by_ps.setdefault(row["permission_set_id"], []).append(row)
+
+    entries = []
+    for pair in pairs:
+        ps_id = pair["permission_set_id"]
+        ps_accounts = accounts_by_ps.get(ps_id, [])
+        any_account = True
+        if in_scope is not None:
+            ps_accounts = [a for a in ps_accounts if in_scope(a["account_id"], a["account"])]
+            any_account = bool(ps_accounts)
+
+        roles: dict[str, dict[str, Any]] = {}
+        for row in reach_by_ps.get(ps_id, []):
+            owner = account_of.get(row["resource"], {}) if row["resource"] else {}
+            if not any_account and not (
+                row["resource"] and in_scope(owner.get("account_id"), owner.get("account"))
+            ):
+                continue
+            role = roles.setdefault(
+                row["iam_role"],
+                {"iam_role": row["iam_role"], "account_id": row["role_account_id"], "resources": []},
+            )
+            if row["resource"]:
+                role["resources"].append(
+                    {"resource": row["resource"], "resource_account": owner.get("account")}
+                )
+        for role in roles.values():
+            role["resources"].sort(key=lambda r: r["resource"])
+
+        entries.append({
+            "user": pair["user"],
+            "permission_set": pair["permission_set"],
+            "accounts": sorted({a["account"] for a in ps_accounts if a["account"]}),
+            "roles": [roles[name] for name in sorted(roles, key=lambda n: n or "")],
+            "cursor_key": pair["cursor_key"],
+        })
+    return entries
+
+
+def unused_access(limit: int, cursor: str | None = None) -> tuple[str, dict[str, Any]]:
+    """Roles with IAM Access Analyzer unused-access findings, worst first.
+
+    Paged on (unused action count descending, finding id); the count is the
+    `cursor_rank` half of the position.
+    """
+    position = decode_cursor("unused_access", cursor)
+    params: dict[str, Any] = {"limit": page_size(limit)}
+    cursor_clause = ""
+    if position:
+        params["after"] = position.get("k", "")
+        params["after_rank"] = position.get("r", -1)
+        cursor_clause = (
+            "WHERE unused < $after_rank\n"
+            "   OR (unused = $after_rank AND f.`~id` > $after)\n"
+        )
     query = (
         "MATCH (role:RoleName)-[:HAS_UNUSED_ACCESS]->(f:UnusedAccessFinding)\n"
+        "WITH role, f, coalesce(toInteger(f.numberofunusedactions), -1) AS unused\n"
+        f"{cursor_clause}"
+        "ORDER BY unused DESC, f.`~id`\n"
+        "LIMIT $limit\n"
         "OPTIONAL MATCH (ps:PermissionSet)-[:CREATED_AS]->(role)\n"
         "OPTIONAL MATCH (u:UserName)-[:ASSIGNED_PERMISSIONSET]->(ps)\n"
         "OPTIONAL MATCH (g:GroupName)-[:ASSIGNED_PERMISSIONSET]->(ps)\n"
         "RETURN role.rolename AS iam_role, role.accountid AS account,\n"
         "       f.numberofunusedactions AS unused_actions,\n"
         "       f.numberofunusedservices AS unused_services, f.status AS status,\n"
+        "       f.unusedservices AS unused_service_list,\n"
+        "       f.unusedactions AS unused_action_list,\n"
         "       collect(DISTINCT u.username) AS users,\n"
-        "       collect(DISTINCT g.groupname) AS groups\n"
-        "ORDER BY toInteger(f.numberofunusedactions) DESC\n"
+        "       collect(DISTINCT g.groupname) AS groups,\n"
+        "       f.`~id` AS cursor_key, unused AS cursor_rank\n"
+        "ORDER BY cursor_rank DESC, cursor_key"
+    )
+    return query, params
+
+
+# Rollup properties the export stores on AccountName / PermissionSet nodes.
+_ROLLUP_PROPERTIES = {
+    "accounts": (
+        "AccountName",
+        ["userscount", "directuserscount", "groupuserscount",
+         "permissionsetscount", "rolescount", "resourcescount"],
+    ),
+    "permissionsets": (
+        "PermissionSet",
+        ["userscount", "directuserscount", "groupuserscount", "accountscount", "rolescount"],
+    ),
+}
+
+
+def access_rollups(
+    kind: str, text: str | None, limit: int
+) -> tuple[str, dict[str, Any]]:
+    """Precomputed rollup properties of accounts or permission sets, most users first.
+
+    Matches the name or id by substring; with no text, every node of the kind.
+    """
+    if kind not in _ROLLUP_PROPERTIES:
+        raise ValueError(
+            f"Unknown kind '{kind}'. Choose one of: {', '.join(sorted(_ROLLUP_PROPERTIES))}."
+        )
+    label, properties = _ROLLUP_PROPERTIES[kind]
+    params: dict[str, Any] = {"limit": page_size(limit)}
+    where = ""
+    if text:
+        params["text"] = text
+        where = "WHERE n.name CONTAINS $text OR n.`~id` CONTAINS $text\n"
+    columns = ", ".join(f"n.{p} AS {p}" for p in properties)
+    query = (
+        f"MATCH (n:{label})\n"
+        f"{where}"
+        f"RETURN n.`~id` AS id, n.name AS name, {columns}\n"
+        "ORDER BY coalesce(userscount, 0) DESC, id\n"
         "LIMIT $limit"
     )
     return query, params
 
 
-def list_entities(entity: str, limit: int) -> tuple[str, dict[str, Any]]:
-    """List nodes of one kind. `entity` is a key of _ENTITY_MAP."""
+def list_entities(
+    entity: str, limit: int, cursor: str | None = None
+) -> tuple[str, dict[str, Any]]:
+    """List nodes of one kind, in node-id order. `entity` is a key of _ENTITY_MAP."""
     key = entity.lower().strip()
     if key not in _ENTITY_MAP:
         raise ValueError(
             f"Unknown entity '{entity}'. Choose one of: {', '.join(sorted(_ENTITY_MAP))}."
         )
+    # The cursor is scoped per entity kind so a users cursor cannot page groups.
+    position = decode_cursor(f"list_entities:{key}", cursor)
     label, prop = _ENTITY_MAP[key]
     extra = ", n.resourcetype AS resourcetype" if key == "resources" else ""
     query = (
         f"MATCH (n:{label})\n"
-        f"RETURN n.{prop} AS value{extra}\n"
-        f"ORDER BY value\n"
+        "WHERE n.`~id` > $after\n"
+        f"RETURN n.{prop} AS value{extra}, n.`~id` AS cursor_key\n"
+        "ORDER BY cursor_key\n"
         "LIMIT $limit"
     )
-    return query, {"limit": limit}
+    return query, {"limit": page_size(limit), "after": position.get("k", "")}
 
 
 def node_label_counts() -> tuple[str, dict[str, Any]]:
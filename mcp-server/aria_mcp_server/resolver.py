@@ -0,0 +1,245 @@
+"""Local index that resolves user input to exact node ids.
+
+The query builders match their entry points by substring (`CONTAINS`), which
+Neptune answers with a scan of every node of the label. NameResolver keeps the
+names of users, groups, accounts and critical resources in memory with a
+trigram index, resolves the caller's text to the matching `~id`s with the same
+substring semantics, and lets the builders anchor on `~id IN $ids` instead.
+
+The index is rebuilt every `refresh_seconds` and whenever the graph client
+reports a new snapshot. Only the first build blocks; later rebuilds run on a
+background thread while callers keep using the previous index. When nothing
+matches, `suggest` offers the closest names by trigram similarity.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from .federation import FederatedGraphClient
+from .graph_client import AriaGraphClient, GraphError
+
+# kind -> (node label, name property, case-insensitive?). Case folding follows
+# the CONTAINS predicates in queries.py: user names are matched
+# case-insensitively, account names and ARNs as given.
+INDEXED_KINDS = {
+    "users": ("UserName", "username", True),
+    "groups": ("GroupName", "groupname", True),
+    "accounts": ("AccountName", "name", False),
+    "resources": ("CriticalResources", "`~id`", False),
+}
+
+# Wait before retrying a background rebuild that failed, so a graph outage does
+# not start a rebuild on every call.
+RETRY_SECONDS = 30.0
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class _NameIndex:
+    """Trigram postings over the names of one node kind."""
+
+    def __init__(self, rows: list[tuple[str, str]], fold: bool) -> None:
+        self.fold = fold
+        self.ids = [node_id for node_id, _ in rows]
+        self.names = [name for _, name in rows]
+        self._keys = [name.lower() if fold else name for name in self.names]
+        self._postings: dict[str, list[int]] = {}
+        for i, key in enumerate(self._keys):
+            for gram in _trigrams(key):
+                self._postings.setdefault(gram, []).append(i)
+
+    def search(self, text: str) -> list[int]:
+        """Entries whose name contains `text`, as CONTAINS would match them."""
+        needle = text.lower() if self.fold else text
+        grams = _trigrams(needle)
+        if not grams:
+            # Under three characters there is no trigram to look up.
+            candidates: Any = range(len(self._keys))
+        else:
+            postings = sorted(
+                (self._postings.get(g, []) for g in grams), key=len
+            )
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+            candidates = sorted(candidates)
+        return [i for i in candidates if needle in self._keys[i]]
+
+    def suggest(self, text: str, n: int) -> list[str]:
+        """Up to n names most similar to `text` (trigram Jaccard similarity)."""
+        needle = text.lower() if self.fold else text
+        grams = _trigrams(needle)
+        shared: dict[int, int] = {}
+        for gram in grams:
+            for i in self._postings.get(gram, []):
+                shared[i] = shared.get(i, 0) + 1
+        scored = sorted(
+            shared.items(),
+            key=lambda item: (
+                -item[1] / (len(grams) + len(_trigrams(self._keys[item[0]])) - item[1]),
+                self.names[item[0]],
+            ),
+        )
+        return [self.names[i] for i, _ in scored[:n]]
+
+
+class NameResolver:
+    """Resolves names and ARN fragments to node ids from a refreshed local index.
+
+    A refresh_seconds of 0 disables the resolver; callers then keep using the
+    substring queries.
+    """
+
+    def __init__(
+        self,
+        client: AriaGraphClient | FederatedGraphClient,
+        refresh_seconds: float = 300.0,
+        max_ids: int = 200,
+    ) -> None:
+        self.client = client
+        self.refresh_seconds = refresh_seconds
+        self.max_ids = max_ids
+        self._indexes: dict[str, _NameIndex] = {}
+        self._built_at: float | None = None
+        self._snapshot: str | None = None
+        self._attempted_at: float | None = None
+        self._rebuilding = False
+        self._error: str | None = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.refresh_seconds > 0
+
+    def resolve(self, kind: str, text: str) -> list[str] | None:
+        """Node ids whose name contains `text`.
+
+        Returns None when the caller should fall back to a substring query:
+        the resolver is disabled, or more than max_ids nodes match (an id list
+        that long is no cheaper than the scan). Raises GraphError when the
+        first index cannot be built; a failed rebuild keeps the previous one.
+        """
+        if not self.enabled:
+            return None
+        index = self._index(kind)
+        matches = index.search(text)
+        if len(matches) > self.max_ids:
+            return None
+        return [index.ids[i] for i in matches]
+
+    def lookup(self, kind: str, text: str, limit: int) -> list[dict[str, str]]:
+        """Matching (id, name) pairs, for showing resolution results."""
+        index = self._index(kind)
+        return [
+            {"id": index.ids[i], "name": index.names[i]}
+            for i in index.search(text)[:limit]
+        ]
+
+    def suggest(self, kind: str, text: str, n: int = 5) -> list[str]:
+        """Closest known names, from the current index only (never refreshes)."""
+        index = self._indexes.get(kind)
+        return index.suggest(text, n) if index is not None else []
+
+    def warm_up(self) -> None:
+        """Build the index now rather than on the first resolve()."""
+        if self.enabled:
+            self._refresh_if_stale()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "snapshot": self._snapshot,
+            "age_seconds": (
+                round(time.monotonic() - self._built_at, 1)
+                if self._built_at is not None
+                else None
+            ),
+            "names": {kind: len(index.ids) for kind, index in self._indexes.items()},
+            "rebuilding": self._rebuilding,
+            "error": self._error,
+        }
+
+    def _index(self, kind: str) -> _NameIndex:
+        if kind not in INDEXED_KINDS:
+            raise ValueError(
+                f"Unknown kind '{kind}'. Choose one of: {', '.join(sorted(INDEXED_KINDS))}."
+            )
+        self._refresh_if_stale()
+        return self._indexes[kind]
+
+    def _refresh_if_stale(self) -> None:
+        snapshot = self.client.snapshot_marker()
+        if self._built_at is None:
+            # Nothing to serve yet: build here, one caller at a time.
+            with self._build_lock:
+                if self._built_at is None:
+                    try:
+                        self._swap(self._build(), snapshot)
+                    except GraphError as exc:
+                        self._error = str(exc)
+                        raise
+            return
+        now = time.monotonic()
+        with self._lock:
+            due = (
+                not self._rebuilding
+                and (
+                    now - self._built_at >= self.refresh_seconds
+                    or snapshot != self._snapshot
+                )
+                and (
+                    self._error is None
+                    or now - (self._attempted_at or 0.0) >= RETRY_SECONDS
+                )
+            )
+            if due:
+                self._attempted_at = now
+                self._rebuilding = True
+        if due:
+            # Callers keep the previous index while the new one is built.
+            threading.Thread(
+                target=self._rebuild,
+                args=(snapshot,),
+                name="aria-resolver",
+                daemon=True,
+            ).start()
+
+    def _rebuild(self, snapshot: str | None) -> None:
+        try:
+            self._swap(self._build(), snapshot)
+        except GraphError as exc:
+            self._error = str(exc)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _build(self) -> dict[str, _NameIndex]:
+        indexes = {}
+        for kind, (label, prop, fold) in INDEXED_KINDS.items():
+            result = self.client.execute(
+                f"MATCH (n:{label}) RETURN n.`~id` AS id, n.{prop} AS name",
+                use_cache=False,
+            )
+            rows = [
+                (row["id"], row["name"])
+                for row in result.get("results") or []
+                if row.get("id") is not None and row.get("name") is not None
+            ]
+            indexes[kind] = _NameIndex(rows, fold)
+        return indexes
+
+    def _swap(self, indexes: dict[str, _NameIndex], snapshot: str | None) -> None:
+        # One assignment, so readers see either the old or the new index.
+        with self._lock:
+            self._indexes = indexes
+            self._built_at = time.monotonic()
+            self._snapshot = snapshot
+            self._error = None
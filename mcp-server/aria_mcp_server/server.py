@@ -3,16 +3,50 @@
 The graph is a point-in-time Neptune Analytics snapshot of identity/access
 relationships collected from IAM Identity Center, IAM, and IAM Access Analyzer.
 All tools are read-only. See queries.py for the graph model.
+
+Tools are async. Blocking boto3 calls run on a bounded thread pool with a
+per-request timeout, so one slow query cannot stall the other sessions served by
+the process.
+
+With ARIA_LOCAL_GRAPH set, the traversal tools answer from an in-memory copy of
+the graph loaded from the export CSVs (see local_graph.py), reloaded when a
+newer export is written, and use Neptune only when that copy cannot be loaded.
 """
 
 from __future__ import annotations
 
-from typing import Any
+import asyncio
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Taken before the third-party imports (mcp, starlette, boto3), which dominate
+# startup, for the startup profile logged by main_http().
+_IMPORT_STARTED = time.perf_counter()
 
 from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
 
 from . import queries
-from .graph_client import AriaGraphClient, GraphError, ReadOnlyViolation
+from .encoding import to_columnar
+from .federation import FederatedGraphClient
+from .graph_client import (
+    AriaGraphClient,
+    GraphError,
+    QueryRejected,
+    QueryTimeout,
+    ReadOnlyViolation,
+)
+from .local_graph import LocalGraph, LocalGraphError, source_marker
+from .metrics import METRICS
+from .resolver import NameResolver
+from .stats import GraphStats, StatsError
 
 # Host/port/path satisfy the AgentCore Runtime MCP contract (0.0.0.0:8000, /mcp).
 # Stateless mode is required by AgentCore Runtime, which injects its own
@@ -25,42 +59,504 @@ mcp = FastMCP(
     streamable_http_path="/mcp",
 )
 
+# Max graph queries running at once, and how long a tool call may wait for a
+# free slot plus its query before it gives up.
+MAX_INFLIGHT_QUERIES = int(os.environ.get("ARIA_MAX_INFLIGHT_QUERIES", "8"))
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("ARIA_QUERY_TIMEOUT_SECONDS", "30"))
+
 # One lazily-initialised client for the process. boto3/graph-id resolution
-# happens on first query, not at import time, so the server starts cleanly even
-# without credentials configured.
-_client = AriaGraphClient()
+# happens in the background warm-up started by main_http() (or on the first
+# query), not at import time, so the server starts cleanly even without
+# credentials configured.
+# With ARIA_GRAPH_IDS naming several graphs, every query fans out to all of
+# them (see federation.py); otherwise its single entry, or the ARIA_GRAPH_ID
+# graph, is used.
+_client: AriaGraphClient | FederatedGraphClient = FederatedGraphClient.from_env(
+    max_pool_connections=MAX_INFLIGHT_QUERIES + 2
+) or AriaGraphClient(max_pool_connections=MAX_INFLIGHT_QUERIES + 2)
+# Argument-free tool queries re-run whenever a new graph snapshot is detected.
+_client.prewarm_queries = [
+    queries.node_label_counts(),
+    queries.unused_access(50),
+]
+
+
+# Resolves names/ARN fragments to node ids so the traversal tools can anchor on
+# `~id` instead of scanning a label with CONTAINS. See resolver.py.
+_resolver = NameResolver(
+    _client,
+    refresh_seconds=float(os.environ.get("ARIA_RESOLVER_REFRESH_SECONDS", "300")),
+    max_ids=int(os.environ.get("ARIA_RESOLVER_MAX_IDS", "200")),
+)
+
+# Stats and rollups precomputed by the export (stats/aria-graph-stats.json in
+# the export bucket, or a local copy). Optional; see stats.py.
+_stats = GraphStats(
+    os.environ.get("ARIA_GRAPH_STATS", ""),
+    refresh_seconds=float(os.environ.get("ARIA_GRAPH_STATS_REFRESH_SECONDS", "300")),
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=MAX_INFLIGHT_QUERIES, thread_name_prefix="aria-query"
+)
+_inflight = asyncio.Semaphore(MAX_INFLIGHT_QUERIES)
+
+# Warm-up at startup (see _warm_up) and how many pooled connections it opens.
+STARTUP_WARM_UP = os.environ.get("ARIA_STARTUP_WARM_UP", "true").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+WARM_UP_CONNECTIONS = int(os.environ.get("ARIA_WARM_UP_CONNECTIONS", "2"))
+_startup: dict[str, Any] = {"ready": not STARTUP_WARM_UP, "error": None}
+
+# How often the metrics summary is written to stdout as a JSON line (0: never).
+METRICS_LOG_SECONDS = float(os.environ.get("ARIA_METRICS_LOG_SECONDS", "60"))
+
+# Directory or s3://bucket/prefix holding the export CSVs. Loaded on first use,
+# then checked for a newer export every LOCAL_GRAPH_REFRESH_SECONDS (0: never).
+LOCAL_GRAPH_SOURCE = os.environ.get("ARIA_LOCAL_GRAPH", "")
+LOCAL_GRAPH_REFRESH_SECONDS = float(
+    os.environ.get("ARIA_LOCAL_GRAPH_REFRESH_SECONDS", "300")
+)
+_local: LocalGraph | None = None
+_local_error: str | None = None
+_local_marker: str | None = None
+_local_checked: float | None = None
+_local_reloading = False
+_local_lock = threading.Lock()
+
+
+def _reload_local() -> None:
+    """Load the embedded graph when its source changed since the last load.
+
+    The marker is read before loading, so an export written during the load
+    is picked up by the next check. A failed load keeps the previous graph.
+    """
+    global _local, _local_error, _local_marker, _local_reloading
+    try:
+        marker = source_marker(LOCAL_GRAPH_SOURCE)
+        if marker != _local_marker or _local is None:
+            graph = LocalGraph.load(LOCAL_GRAPH_SOURCE)
+            replaced = _local is not None
+            with _local_lock:
+                _local, _local_marker, _local_error = graph, marker, None
+            if replaced:
+                event = {"event": "aria_local_graph_reloaded", **graph.stats()}
+                print(json.dumps(event, default=str), flush=True)
+    except LocalGraphError as exc:
+        with _local_lock:
+            _local_error = str(exc)
+    finally:
+        with _local_lock:
+            _local_reloading = False
+
+
+def _local_graph() -> LocalGraph | None:
+    """The embedded graph, or None when it is not configured or not loaded.
+
+    The first call loads it; later calls start a background check for a newer
+    export once LOCAL_GRAPH_REFRESH_SECONDS have passed and keep answering from
+    the current graph meanwhile. Without a graph the tools use Neptune.
+    """
+    global _local_checked, _local_reloading
+    if not LOCAL_GRAPH_SOURCE:
+        return None
+    now = time.monotonic()
+    with _local_lock:
+        first = _local_checked is None
+        due = not _local_reloading and (
+            first
+            or (
+                LOCAL_GRAPH_REFRESH_SECONDS > 0
+                and now - _local_checked >= LOCAL_GRAPH_REFRESH_SECONDS
+            )
+        )
+        if due:
+            _local_checked = now
+            _local_reloading = True
+    if due and first:
+        _reload_local()
+    elif due:
+        threading.Thread(
+            target=_reload_local, name="aria-local-graph", daemon=True
+        ).start()
+    return _local
+
+
+def _local_status() -> dict[str, Any] | None:
+    if not LOCAL_GRAPH_SOURCE:
+        return None
+    if _local is not None:
+        return {**_local.stats(), "error": _local_error}
+    return {"source": LOCAL_GRAPH_SOURCE, "loaded": False, "error": _local_error}
+
+
+async def _offload(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run blocking graph work on the bounded executor.
+
+    A slot is held until the worker thread finishes, not just until the caller
+    stops waiting, so a query that outlives its timeout still counts against the
+    in-flight limit. Raises asyncio.TimeoutError when the slot or the result is
+    not available within QUERY_TIMEOUT_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + QUERY_TIMEOUT_SECONDS
+    await asyncio.wait_for(_inflight.acquire(), QUERY_TIMEOUT_SECONDS)
+    try:
+        future = loop.run_in_executor(_executor, fn, *args)
+    except BaseException:
+        _inflight.release()
+        raise
+    future.add_done_callback(lambda _: _inflight.release())
+    # shield() keeps the executor future alive when the caller times out, so
+    # the done-callback above still fires when the thread completes.
+    return await asyncio.wait_for(
+        asyncio.shield(future), max(deadline - loop.time(), 0.0)
+    )
+
+
+def _timeout(query: str) -> dict[str, Any]:
+    return {
+        "error": "timeout",
+        "message": (
+            f"The query did not complete within {QUERY_TIMEOUT_SECONDS:g}s. "
+            "Narrow it (a more specific name or ARN, or a lower limit) and retry."
+        ),
+        "query": query,
+    }
 
 
-def _run(query: str, parameters: dict[str, Any] | None = None) -> dict[str, Any]:
-    """Execute a query and normalise success/error into a dict for the model."""
+async def _run(
+    query: str,
+    parameters: dict[str, Any] | None = None,
+    execute: Callable[..., dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """Execute a query and normalise success/error into a dict for the model.
+
+    `execute` defaults to the client's plain execute; execute_cypher passes
+    execute_guarded.
+    """
     try:
-        result = _client.execute(query, parameters)
+        result = await _offload(execute or _client.execute, query, parameters)
         result["query"] = query
         return result
+    except (asyncio.TimeoutError, QueryTimeout):
+        return _timeout(query)
     except ReadOnlyViolation as exc:
         return {"error": "read_only_violation", "message": str(exc), "query": query}
+    except QueryRejected as exc:
+        return {"error": "query_too_expensive", "message": str(exc), "query": query}
     except GraphError as exc:
         # Return the query so the caller can paste it into Graph Explorer if the
         # private endpoint is unreachable.
         return {"error": "graph_error", "message": str(exc), "query": query}
 
 
+async def _run_paged(
+    scope: str, query: str, parameters: dict[str, Any]
+) -> dict[str, Any]:
+    """Run a keyset-paged query and attach `next_cursor`.
+
+    The cursor columns are stripped from the rows. next_cursor is null once a
+    page comes back short, i.e. with fewer than `limit` distinct cursor keys
+    (LIMIT applies to keys; a key can expand into several rows).
+    """
+    return _paginate(scope, await _run(query, parameters), parameters["limit"])
+
+
+def _paginate(scope: str, result: dict[str, Any], limit: int) -> dict[str, Any]:
+    rows = result.get("results")
+    if "error" in result or not isinstance(rows, list):
+        return result
+    last = rows[-1] if rows else None
+    keys = {row.get("cursor_key") for row in rows if isinstance(row, dict)}
+    result["next_cursor"] = (
+        queries.next_cursor(scope, last)
+        if last is not None and len(keys) >= limit
+        else None
+    )
+    for row in rows:
+        for column in queries.CURSOR_COLUMNS:
+            row.pop(column, None)
+    return result
+
+
+def _query_local(method: str, *args: Any, **options: Any) -> list[dict[str, Any]] | None:
+    graph = _local_graph()
+    return None if graph is None else getattr(graph, method)(*args, **options)
+
+
+async def _run_local(
+    scope: str,
+    query: str,
+    parameters: dict[str, Any],
+    method: str,
+    *args: Any,
+    **options: Any,
+) -> dict[str, Any] | None:
+    """Answer a paged tool from the embedded graph; None when it is not in use.
+
+    `method` is the LocalGraph method equivalent to `query`; it receives `args`
+    followed by the paging values already resolved into `parameters`, and
+    `options` as keyword arguments.
+    """
+    if not LOCAL_GRAPH_SOURCE:
+        return None
+    paging = [parameters["limit"]]
+    if "after" in parameters:
+        paging.append(parameters["after"])
+    if "after_rank" in parameters:
+        paging.append(parameters["after_rank"])
+    try:
+        rows = await _offload(
+            functools.partial(_query_local, **options), method, *args, *paging
+        )
+    except asyncio.TimeoutError:
+        return _timeout(query)
+    if rows is None:
+        return None
+    result = {
+        "source": "local",
+        "snapshot": LOCAL_GRAPH_SOURCE,
+        "count": len(rows),
+        "results": rows,
+    }
+    return _paginate(scope, result, parameters["limit"])
+
+
+async def _run_traversal(
+    scope: str,
+    query: str,
+    parameters: dict[str, Any],
+    method: str,
+    *args: Any,
+    **options: Any,
+) -> dict[str, Any]:
+    """Answer a paged tool from the embedded graph, else from Neptune."""
+    local = await _run_local(scope, query, parameters, method, *args, **options)
+    if local is not None:
+        return local
+    return await _run_paged(scope, query, parameters)
+
+
+async def _run_principal_access(
+    query: str,
+    parameters: dict[str, Any],
+    account: str | None,
+    account_ids: list[str] | None,
+    match: str,
+) -> dict[str, Any]:
+    """Run the split principal access report against Neptune.
+
+    One query pages the (user, permission set) pairs. The permission sets'
+    accounts and their roles/resources are then fetched concurrently, anchored
+    on the page's ids, followed by the resources' accounts, and everything is
+    nested per pair by queries.join_principal_access. Each query stays bounded
+    by its own fan-out instead of the product of all of them.
+    """
+    page = await _run(query, parameters)
+    if "error" in page:
+        return page
+    pairs = page["results"]
+    ps_ids = sorted({pair["permission_set_id"] for pair in pairs})
+    subqueries: list[dict[str, Any]] = []
+    if ps_ids:
+        subqueries = list(
+            await asyncio.gather(
+                _run(*queries.permission_set_accounts(ps_ids)),
+                _run(*queries.permission_set_resources(ps_ids)),
+            )
+        )
+        resource_ids = sorted(
+            {row["resource"] for row in subqueries[1].get("results") or [] if row["resource"]}
+        )
+        if resource_ids:
+            subqueries.append(await _run(*queries.resource_accounts(resource_ids)))
+    for sub in subqueries:
+        if "error" in sub:
+            return sub
+    rows = [sub["results"] for sub in subqueries] + [[]] * (3 - len(subqueries))
+
+    entries = queries.join_principal_access(
+        pairs, *rows, queries.account_in_scope(account, account_ids, match)
+    )
+    result = {**page, "count": len(entries), "results": entries}
+    if any(len(r) >= queries.MAX_SUBQUERY_ROWS for r in rows):
+        result["truncated"] = True
+        result["message"] = (
+            "Some accounts, roles or resources were cut off. Lower `limit` to "
+            "report fewer permission sets per page."
+        )
+    return _paginate("principal_access_report", result, parameters["limit"])
+
+
+def _query_local_many(
+    method: str, groups: list[dict[str, str]], actions: list[str] | None, limit: int
+) -> list[dict[str, Any]] | None:
+    graph = _local_graph()
+    if graph is None:
+        return None
+    rows = []
+    for tags in groups:
+        for row in getattr(graph, method)(*tags.values(), actions, limit, ""):
+            rows.append({**tags, **row})
+    return rows
+
+
+async def _run_batch(
+    scope: str,
+    query: str,
+    parameters: dict[str, Any],
+    groups: list[dict[str, str]],
+    method: str,
+    actions: list[str] | None,
+) -> dict[str, Any]:
+    """Run a batched (*_many) query and split its rows into one group per input.
+
+    `groups` holds the input columns of each group in request order, e.g.
+    {"input_resource": "bucket1"}. Every group is paged like the single-input
+    tool `scope`, so its next_cursor can be passed to that tool.
+    """
+    rows = None
+    if LOCAL_GRAPH_SOURCE:
+        try:
+            rows = await _offload(
+                _query_local_many, method, groups, actions, parameters["limit"]
+            )
+        except asyncio.TimeoutError:
+            return _timeout(query)
+        result: dict[str, Any] = {"source": "local", "snapshot": LOCAL_GRAPH_SOURCE}
+    if rows is None:
+        result = await _run(query, parameters)
+        if "error" in result:
+            return result
+        rows = result.pop("results")
+
+    columns = list(groups[0])
+    grouped: dict[tuple, list[dict[str, Any]]] = {
+        tuple(tags.values()): [] for tags in groups
+    }
+    for row in rows:
+        grouped[tuple(row.pop(c) for c in columns)].append(row)
+    result["count"] = len(rows)
+    result["groups"] = [
+        _paginate(scope, {**tags, "count": len(found), "results": found}, parameters["limit"])
+        for tags, found in zip(groups, grouped.values())
+    ]
+    return result
+
+
+async def _resolve(
+    kind: str, text: str | None, match: str = "contains"
+) -> list[str] | None:
+    """Exact node ids for `text`, or None to keep the query's own match.
+
+    Only substring ("contains") matches are resolved; prefix and exact
+    matches already compare the export's normalized properties. Skipped when
+    the embedded graph answers the tools. Resolution is an optimisation, so a
+    failure to build the index falls back silently.
+    """
+    if not text or match != "contains" or LOCAL_GRAPH_SOURCE or not _resolver.enabled:
+        return None
+    try:
+        return await _offload(_resolver.resolve, kind, text)
+    except (asyncio.TimeoutError, GraphError):
+        return None
+
+
+def _no_match(kind: str, text: str) -> dict[str, Any]:
+    """Empty page for input that resolved to no node, with close names."""
+    return {
+        "count": 0,
+        "results": [],
+        "next_cursor": None,
+        "message": f"No {kind} match '{text}'.",
+        "did_you_mean": _resolver.suggest(kind, text),
+    }
+
+
+def _shape(columnar: bool, result: dict[str, Any]) -> dict[str, Any]:
+    """Apply the columnar encoding when asked for; errors are left as they are."""
+    if columnar and "error" not in result:
+        return to_columnar(result)
+    return result
+
+
+def _bad_argument(exc: ValueError) -> dict[str, Any]:
+    return {"error": "bad_argument", "message": str(exc)}
+
+
+def _record_tool(name: str, started: float, result: Any) -> None:
+    if isinstance(result, dict):
+        outcome = result.get("error") or "ok"
+        rows = result.get("count") if isinstance(result.get("count"), int) else None
+        size = len(json.dumps(result, separators=(",", ":"), default=str))
+    else:
+        outcome, rows, size = "ok", None, len(str(result))
+    METRICS.record_tool(name, time.perf_counter() - started, outcome, rows, size)
+
+
+def _instrumented(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Record latency, rows, response size and outcome of every call to a tool.
+
+    Applied beneath @mcp.tool(); functools.wraps keeps the signature and
+    docstring FastMCP builds the tool schema from.
+    """
+    name = fn.__name__
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException:
+                METRICS.record_tool(name, time.perf_counter() - started, "exception", None, None)
+                raise
+            _record_tool(name, started, result)
+            return result
+
+        return wrapper
+
+    @functools.wraps(fn)
+    def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            METRICS.record_tool(name, time.perf_counter() - started, "exception", None, None)
+            raise
+        _record_tool(name, started, result)
+        return result
+
+    return sync_wrapper
+
+
 SCHEMA_DOC = """\
 ARIA-gv graph model (Neptune Analytics, openCypher).
 
 Nodes (node id `~id` in parentheses):
-- UserName (UserId): username
-- GroupName (GroupId): groupname
-- PermissionSet (PermissionSetArn): name, description
-- AccountName (AccountId): name
+- UserName (UserId): username, name_lc, instancearn
+- GroupName (GroupId): groupname, name_lc, instancearn
+- PermissionSet (PermissionSetArn): name, description, name_lc, instancearn, and rollups
+  userscount, directuserscount, groupuserscount, accountscount, rolescount
+- AccountName (AccountId): name, name_lc, instancearn, and rollups userscount,
+  directuserscount, groupuserscount, permissionsetscount, rolescount, resourcescount
 - RoleName (IamRoleArn): rolename, accountid, roleid, attachedpolicies
-- CriticalResources (ResourceARN): resourcetype
-- InternalAccessFinding (FindingId): action, principal, resourcearn, findingtype, accesstype, status, ...
-- UnusedAccessFinding (FindingId): resourcearn, numberofunusedactions, numberofunusedservices, status, ...
+- CriticalResources (ResourceARN): resourcetype, the ARN's components arn_partition,
+  arn_service, arn_region, arn_account, arn_resourcetype, arn_resourcename (e.g. the
+  bucket name), and name_lc
+- InternalAccessFinding (FindingId): action, principal, resourcearn, findingtype, accesstype, status,
+  is_read, is_write, is_delete, is_permissions_mgmt (booleans), services (list), ...
+- UnusedAccessFinding (FindingId): resourcearn, numberofunusedactions, numberofunusedservices, unusedservices, unusedactions, status, ...
 
 Edges (from -> to):
 - (GroupName)-[:HAS_MEMBERS]->(UserName)
 - (UserName|GroupName)-[:ASSIGNED_PERMISSIONSET]->(PermissionSet)
+- (UserName)-[:EFFECTIVELY_ASSIGNED]->(PermissionSet): one edge per user, permission
+  set and account, whether assigned directly or through groups; properties
+  accountid, viagroups (";"-joined GroupIds), direct (true/false)
 - (UserName|GroupName)-[:ASSIGNED_ACCOUNT]->(AccountName)
 - (PermissionSet)-[:PROVISIONED_INTO]->(AccountName)
 - (PermissionSet)-[:CREATED_AS]->(RoleName)
@@ -73,19 +569,38 @@ Edges (from -> to):
 A human-to-resource path is typically:
   (User)<-[:HAS_MEMBERS]-(Group)-[:ASSIGNED_PERMISSIONSET]->(PermissionSet)
         -[:CREATED_AS]->(Role)-[:GRANTS_ACCESS_TO]->(CriticalResources)
-or, for a directly-assigned user, without the group hop.
+or, for a directly-assigned user, without the group hop. Start from
+(User)-[:EFFECTIVELY_ASSIGNED]->(PermissionSet) to cover both in one hop.
 
 What a principal can DO to a resource lives on InternalAccessFinding.action, not
-on the edge. Filter on that property for verbs like update / write / delete.
+on the edge. Filter on that property for verbs like update / put, or on the
+precomputed flags (e.g. f.is_delete = true, 's3' IN f.services) for whole
+classes of actions.
+
+instancearn is the IAM Identity Center instance a node was collected from. A
+deployment that collects several instances (or organizations) into one graph
+can filter on it to keep an answer within one of them.
+
+UnusedAccessFinding.unusedservices is a ", "-joined list of unused service
+namespaces. UnusedAccessFinding.unusedactions groups unused actions per service as
+"service:Action1|Action2", with groups joined by ";" ("service:*" when the whole
+service is unused). Both are empty until the finding has been enriched.
 
-Notes: names are case-sensitive in the data; resources are matched by ARN
-substring. The graph shows POTENTIAL access at snapshot time - it does not model
+List-style tools are paged: when a response has a non-null `next_cursor`, call
+the tool again with the same arguments and `cursor` set to it.
+
+Notes: names are case-sensitive in the data; name_lc holds the lower-cased name.
+Prefer equality or STARTS WITH on name_lc / arn_* (e.g. r.arn_service = 's3' AND
+r.arn_resourcename = 'my-bucket') over CONTAINS, which tests every node of the
+label. The tools match by substring unless called with match="prefix"/"exact".
+The graph shows POTENTIAL access at snapshot time - it does not model
 IdP context, IAM trust-policy conditions, SCPs/RCPs, or session policies, and is
 not proof an action occurred.
 """
 
 
 @mcp.tool()
+@_instrumented
 def describe_graph_schema() -> str:
     """Return the ARIA-gv graph node/edge model and the property names.
 
@@ -96,109 +611,460 @@ def describe_graph_schema() -> str:
 
 
 @mcp.tool()
-def find_access_paths(
-    principal: str, resource: str, actions: list[str] | None = None
+@_instrumented
+async def find_access_paths(
+    principal: str,
+    resource: str,
+    actions: list[str] | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+    match: str = "contains",
+    columnar: bool = False,
 ) -> dict[str, Any]:
     """Show HOW a user can reach a critical resource (the "how was Bob able to
     update this resource" question).
 
     Returns every distinct path from the user to the resource: the group (if
     any), permission set, IAM role, and the finding actions that permit it.
+    Results are paged; pass `next_cursor` back as `cursor` for the next page.
 
     Args:
         principal: user name or a substring of it (case-insensitive match).
         resource: resource ARN or a substring of it (e.g. a bucket name).
         actions: optional list of action substrings to require, e.g.
             ["put", "delete", "update"] to answer "how could they UPDATE it".
-            Omit for any access. Use WRITE_ACTION_HINTS-style verbs.
+            The category words "read", "write", "delete" and "permissions"
+            select findings by their precomputed action class instead.
+            Omit for any access.
+        limit: max paths per page (default 50, max 500).
+        cursor: next_cursor from the previous page; omit for the first page.
+        match: "contains" (default, substring), "prefix" or "exact". Prefix
+            and exact compare the user name case-insensitively and the
+            resource's name (e.g. a bucket name), and are much cheaper on a
+            large graph. A resource ARN is always matched as a prefix.
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
     """
-    query, params = queries.find_access_paths(principal, resource, actions)
-    return _run(query, params)
+    user_ids = await _resolve("users", principal, match)
+    if user_ids == []:
+        return _no_match("users", principal)
+    resource_ids = await _resolve("resources", resource, match)
+    if resource_ids == []:
+        return _no_match("resources", resource)
+    try:
+        query, params = queries.find_access_paths(
+            principal, resource, actions, limit, cursor,
+            user_ids=user_ids, resource_ids=resource_ids, match=match,
+        )
+    except ValueError as exc:
+        return _bad_argument(exc)
+    result = await _run_traversal(
+        "find_access_paths", query, params,
+        "find_access_paths", principal, resource, actions, match=match,
+    )
+    return _shape(columnar, result)
 
 
 @mcp.tool()
-def who_can_access(
-    resource: str, actions: list[str] | None = None
+@_instrumented
+async def who_can_access(
+    resource: str,
+    actions: list[str] | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+    match: str = "contains",
+    columnar: bool = False,
 ) -> dict[str, Any]:
     """List every human principal (users, directly or via groups) that can reach
     a resource.
 
+    Results are paged by IAM role; pass `next_cursor` back as `cursor` for the
+    next page.
+
     Args:
         resource: resource ARN or substring.
-        actions: optional action-substring filter, e.g. ["delete"] for "who can
-            delete this". Omit for any access.
+        actions: optional action filter, e.g. ["delete"] for "who can delete
+            this" or ["s3:PutObject"]; category words as for find_access_paths.
+            Omit for any access.
+        limit: max roles per page (default 100, max 500).
+        cursor: next_cursor from the previous page; omit for the first page.
+        match: "contains" (default), "prefix" or "exact", as for
+            find_access_paths; "exact" with a bucket name finds that bucket.
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
+    """
+    resource_ids = await _resolve("resources", resource, match)
+    if resource_ids == []:
+        return _no_match("resources", resource)
+    try:
+        query, params = queries.who_can_access(
+            resource, actions, limit, cursor, resource_ids=resource_ids, match=match
+        )
+    except ValueError as exc:
+        return _bad_argument(exc)
+    result = await _run_traversal(
+        "who_can_access", query, params, "who_can_access", resource, actions,
+        match=match,
+    )
+    return _shape(columnar, result)
+
+
+@mcp.tool()
+@_instrumented
+async def find_access_paths_many(
+    principals: list[str],
+    resources: list[str],
+    actions: list[str] | None = None,
+    limit_per_pair: int = 20,
+    columnar: bool = False,
+) -> dict[str, Any]:
+    """find_access_paths for every principal x resource pair in ONE graph query.
+
+    Use this instead of repeated find_access_paths calls when auditing several
+    users against several resources. Results come back in `groups`, one per
+    pair in request order. A group with a non-null `next_cursor` has more
+    paths: fetch them with find_access_paths for that pair, passing the cursor.
+
+    Args:
+        principals: user names or substrings (case-insensitive match).
+        resources: resource ARNs or substrings.
+        actions: optional action-substring filter, as for find_access_paths.
+        limit_per_pair: max paths per pair (default 20, max 500). At most
+            100 pairs per call.
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
     """
-    query, params = queries.who_can_access(resource, actions)
-    return _run(query, params)
+    try:
+        query, params = queries.find_access_paths_many(
+            principals, resources, actions, limit_per_pair
+        )
+    except ValueError as exc:
+        return _bad_argument(exc)
+    groups = [
+        {"input_principal": p, "input_resource": r}
+        for p in params["principals"]
+        for r in params["resources"]
+    ]
+    result = await _run_batch(
+        "find_access_paths", query, params, groups, "find_access_paths", actions
+    )
+    return _shape(columnar, result)
 
 
 @mcp.tool()
-def get_principal_access(
-    principal: str, account: str | None = None
+@_instrumented
+async def who_can_access_many(
+    resources: list[str],
+    actions: list[str] | None = None,
+    limit_per_resource: int = 50,
+    columnar: bool = False,
+) -> dict[str, Any]:
+    """who_can_access for many resources in ONE graph query - use it for bulk
+    audits (e.g. every bucket in a list) instead of one call per resource.
+
+    Results come back in `groups`, one per resource in request order. A group
+    with a non-null `next_cursor` has more roles: fetch them with
+    who_can_access for that resource, passing the cursor.
+
+    Args:
+        resources: resource ARNs or substrings (at most 100).
+        actions: optional action-substring filter, as for who_can_access.
+        limit_per_resource: max roles per resource (default 50, max 500).
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
+    """
+    try:
+        query, params = queries.who_can_access_many(
+            resources, actions, limit_per_resource
+        )
+    except ValueError as exc:
+        return _bad_argument(exc)
+    groups = [{"input_resource": r} for r in params["resources"]]
+    result = await _run_batch(
+        "who_can_access", query, params, groups, "who_can_access", actions
+    )
+    return _shape(columnar, result)
+
+
+@mcp.tool()
+@_instrumented
+async def get_principal_access(
+    principal: str,
+    account: str | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+    match: str = "contains",
+    columnar: bool = False,
 ) -> dict[str, Any]:
     """Report everything a user can access: their permission sets, the accounts
     those are provisioned into, and the critical resources reachable.
 
+    Each result is one (user, permission set) with its accounts and its IAM
+    roles, each role listing the resources it reaches. Results are paged by
+    permission set; pass `next_cursor` back as `cursor` for the next page.
+
     Args:
         principal: user name or substring.
-        account: optional account-name substring to scope the report.
+        account: optional account-name substring to scope the report to
+            permission sets provisioned into, or reaching resources in, it.
+        limit: max permission sets per page (default 50, max 500).
+        cursor: next_cursor from the previous page; omit for the first page.
+        match: "contains" (default), "prefix" or "exact" for both `principal`
+            and `account`, compared case-insensitively for prefix/exact; an
+            exact 12-digit `account` is matched as the account id.
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
     """
-    query, params = queries.principal_access_report(principal, account)
-    return _run(query, params)
+    user_ids = await _resolve("users", principal, match)
+    if user_ids == []:
+        return _no_match("users", principal)
+    account_ids = await _resolve("accounts", account, match)
+    if account_ids == []:
+        return _no_match("accounts", account)
+    try:
+        query, params = queries.principal_access_report(
+            principal, account, limit, cursor,
+            user_ids=user_ids, account_ids=account_ids, match=match,
+        )
+    except ValueError as exc:
+        return _bad_argument(exc)
+    local = await _run_local(
+        "principal_access_report", query, params,
+        "principal_access_report", principal, account, match=match,
+    )
+    if local is not None:
+        return _shape(columnar, local)
+    result = await _run_principal_access(query, params, account, account_ids, match)
+    return _shape(columnar, result)
 
 
 @mcp.tool()
-def find_unused_access(limit: int = 50) -> dict[str, Any]:
+@_instrumented
+async def find_unused_access(
+    limit: int = 50, cursor: str | None = None, columnar: bool = False
+) -> dict[str, Any]:
     """List IAM roles flagged with IAM Access Analyzer unused-access findings
     (least-privilege violations), worst first, with the users/groups that hold
-    them.
+    them and, where available, which services and actions are unused.
 
     Args:
-        limit: max roles to return (default 50).
+        limit: max roles per page (default 50, max 500).
+        cursor: next_cursor from the previous page; omit for the first page.
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
     """
-    query, params = queries.unused_access(limit)
-    return _run(query, params)
+    try:
+        query, params = queries.unused_access(limit, cursor)
+    except ValueError as exc:
+        return _bad_argument(exc)
+    result = await _run_traversal(
+        "unused_access", query, params, "unused_access"
+    )
+    return _shape(columnar, result)
 
 
 @mcp.tool()
-def list_entities(entity: str, limit: int = 100) -> dict[str, Any]:
+@_instrumented
+async def list_entities(
+    entity: str,
+    limit: int = 100,
+    cursor: str | None = None,
+    columnar: bool = False,
+) -> dict[str, Any]:
     """List nodes of one kind - useful to confirm exact names/ARNs before a
-    targeted query.
+    targeted query. Rows come back in node-id order, one page at a time.
 
     Args:
         entity: one of users, groups, permissionsets, accounts, roles, resources.
-        limit: max rows (default 100).
+        limit: max rows per page (default 100, max 500).
+        cursor: next_cursor from the previous page; omit for the first page.
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
+    """
+    try:
+        query, params = queries.list_entities(entity, limit, cursor)
+    except ValueError as exc:
+        return _bad_argument(exc)
+    result = await _run_paged(
+        f"list_entities:{entity.lower().strip()}", query, params
+    )
+    return _shape(columnar, result)
+
+
+@mcp.tool()
+@_instrumented
+async def resolve_names(kind: str, text: str, limit: int = 20) -> dict[str, Any]:
+    """Resolve a name or ARN fragment to exact graph nodes, with "did you mean"
+    suggestions when nothing matches. Cheap: served from a local index.
+
+    Args:
+        kind: one of users, groups, accounts, resources.
+        text: name or ARN substring, matched like the other tools match it.
+        limit: max matches to return (default 20).
     """
+    if not _resolver.enabled:
+        return {
+            "error": "resolver_disabled",
+            "message": "Name resolution is disabled (ARIA_RESOLVER_REFRESH_SECONDS=0). "
+            "Use list_entities instead.",
+        }
     try:
-        query, params = queries.list_entities(entity, limit)
+        matches = await _offload(_resolver.lookup, kind, text, queries.page_size(limit))
     except ValueError as exc:
-        return {"error": "bad_argument", "message": str(exc)}
-    return _run(query, params)
+        return _bad_argument(exc)
+    except asyncio.TimeoutError:
+        return {
+            "error": "timeout",
+            "message": (
+                f"Building the name index did not complete within "
+                f"{QUERY_TIMEOUT_SECONDS:g}s. Retry shortly."
+            ),
+        }
+    except GraphError as exc:
+        return {"error": "graph_error", "message": str(exc)}
+    result: dict[str, Any] = {"kind": kind, "count": len(matches), "results": matches}
+    if not matches:
+        result["did_you_mean"] = _resolver.suggest(kind, text)
+    return result
 
 
 @mcp.tool()
-def graph_summary() -> dict[str, Any]:
+@_instrumented
+async def get_access_rollups(
+    kind: str, name: str | None = None, limit: int = 50
+) -> dict[str, Any]:
+    """How many users can reach each account or permission set - directly, via
+    groups, and in total - with role, account and resource counts. Precomputed
+    at export time, so this is cheap even for the whole organization.
+
+    Args:
+        kind: accounts or permissionsets.
+        name: optional name or id substring; omit to list all, most users first.
+        limit: max rows (default 50, max 500).
+    """
+    try:
+        query, params = queries.access_rollups(kind, name, limit)
+    except ValueError as exc:
+        return _bad_argument(exc)
+    if _stats.enabled:
+        try:
+            rows = await _offload(_stats.rollups, kind, name, params["limit"])
+            return {"source": "stats", "count": len(rows), "results": rows}
+        except (asyncio.TimeoutError, StatsError):
+            pass
+    return await _run(query, params)
+
+
+@mcp.tool()
+@_instrumented
+async def graph_summary() -> dict[str, Any]:
     """Return a count of nodes per label - a quick health/inventory check that
-    also confirms the server can reach the graph.
+    also confirms the server can reach the graph. Also reports the server's
+    result-cache counters and, when configured, the embedded graph's size.
+
+    With the export's stats configured, the counts (plus edge counts and degree
+    distributions) come from them instead of a scan of the graph.
     """
-    query, params = queries.node_label_counts()
-    return _run(query, params)
+    result: dict[str, Any] | None = None
+    if _stats.enabled:
+        try:
+            result = await _offload(_stats.summary)
+        except (asyncio.TimeoutError, StatsError):
+            result = None
+    if result is None:
+        query, params = queries.node_label_counts()
+        result = await _run(query, params)
+    result["cache"] = _client.cache_stats()
+    result["resolver"] = _resolver.stats()
+    local = _local_status()
+    if local is not None:
+        result["local_graph"] = local
+    return result
 
 
 @mcp.tool()
-def execute_cypher(query: str, parameters: dict[str, Any] | None = None) -> dict[str, Any]:
+@_instrumented
+async def execute_cypher(
+    query: str,
+    parameters: dict[str, Any] | None = None,
+    columnar: bool = False,
+) -> dict[str, Any]:
     """Run an arbitrary READ-ONLY openCypher query against the graph.
 
     Use the higher-level tools when they fit; use this for questions they do not
     cover. Mutating queries (CREATE/MERGE/SET/DELETE/REMOVE/DETACH/DROP/LOAD) are
     rejected. Prefer passing user values via `parameters` ($name placeholders)
-    rather than string interpolation. Always include a LIMIT for exploration.
+    rather than string interpolation.
+
+    Queries are bounded before they run: variable-length patterns are capped
+    (e.g. [*] becomes [*1..4]; a pattern needing more hops than that is
+    rejected) and the final RETURN gets a LIMIT if it has none or a capped one. `bounds` lists what was changed and `executed_query` shows
+    what ran. A query that hits the server-side timeout is re-run with a smaller
+    LIMIT and returned with `partial: true`.
 
     Args:
         query: the openCypher query. Call describe_graph_schema first for the model.
         parameters: optional map of openCypher parameters referenced as $name.
+        columnar: return results column-wise with repeated strings interned
+            into one `dictionary` (smaller for large results; see `encoding`).
     """
-    return _run(query, parameters)
+    result = await _run(query, parameters, _client.execute_guarded)
+    return _shape(columnar, result)
+
+
+def _warm_up() -> None:
+    """Pay the cold-start costs before the first tool call, then mark ready.
+
+    Creates the boto3 client, resolves the graph id, opens pooled connections
+    with a trivial query, builds the name index and loads the embedded graph.
+    Retried with backoff on any error (graph unreachable, no credentials yet,
+    an unreadable snapshot), so a transient failure cannot leave /ready at 503
+    for good; the timings are logged as one JSON line.
+    """
+    delay = 2.0
+    while True:
+        profile: dict[str, Any] = {"import_seconds": _IMPORT_SECONDS}
+        try:
+            profile.update(
+                _client.warm_up(min(WARM_UP_CONNECTIONS, MAX_INFLIGHT_QUERIES))
+            )
+            started = time.perf_counter()
+            _resolver.warm_up()
+            profile["resolver_seconds"] = time.perf_counter() - started
+            if LOCAL_GRAPH_SOURCE:
+                started = time.perf_counter()
+                _local_graph()
+                profile["local_graph_seconds"] = time.perf_counter() - started
+        except Exception as exc:
+            error = str(exc) if isinstance(exc, GraphError) else f"{type(exc).__name__}: {exc}"
+            _startup["error"] = error
+            event = {"event": "aria_startup", "ready": False, "error": error}
+            print(json.dumps({**event, "retry_seconds": delay}), flush=True)
+            time.sleep(delay)
+            delay = min(delay * 2, 60.0)
+            continue
+        profile = {k: round(v, 3) for k, v in profile.items()}
+        _startup.update(ready=True, error=None, profile=profile)
+        print(json.dumps({"event": "aria_startup", "ready": True, **profile}), flush=True)
+        return
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready_endpoint(request: Request) -> JSONResponse:
+    """Readiness probe: 200 once the startup warm-up has reached the graph."""
+    return JSONResponse(_startup, status_code=200 if _startup["ready"] else 503)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Prometheus text exposition of the tool and Neptune metrics."""
+    return PlainTextResponse(
+        METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# Module import time, including the third-party imports above.
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 
 def main_http() -> None:
@@ -206,8 +1072,12 @@ def main_http() -> None:
 
     This is the only transport the server exposes. It hosts the MCP protocol on
     Amazon Bedrock AgentCore Runtime, which speaks streamable-HTTP and provides
-    session isolation.
+    session isolation. GET /metrics serves the metrics in the Prometheus format
+    and GET /ready reports whether the startup warm-up has finished.
     """
+    METRICS.start_log_thread(METRICS_LOG_SECONDS)
+    if STARTUP_WARM_UP:
+        threading.Thread(target=_warm_up, name="aria-warm-up", daemon=True).start()
     mcp.run(transport="streamable-http")
 
 
@@ -0,0 +1,106 @@
+"""Graph statistics precomputed by the export.
+
+The s3export lambda writes `stats/aria-graph-stats.json` to the export bucket:
+node and edge counts per label, degree distributions per edge label, and
+per-account / per-permission-set rollups (users directly and via groups,
+roles, accounts, resources). The same rollups are stored as properties of the
+AccountName and PermissionSet nodes (`userscount`, `directuserscount`,
+`groupuserscount`, ...), so they can also be read from the graph.
+
+GraphStats serves graph_summary and get_access_rollups from that document
+without scanning the graph. It is re-read every `refresh_seconds`.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Any
+
+# Rollup kinds -> key in the stats document.
+ROLLUP_KINDS = {"accounts": "accounts", "permissionsets": "permission_sets"}
+
+
+class StatsError(Exception):
+    """Raised when the stats document cannot be read."""
+
+
+def _read(source: str) -> dict[str, Any]:
+    if source.startswith("s3://"):
+        import boto3
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        bucket, _, key = source[len("s3://"):].partition("/")
+        try:
+            body = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()
+        except (ClientError, BotoCoreError) as exc:
+            raise StatsError(f"Could not read graph stats from {source}: {exc}") from exc
+    else:
+        try:
+            with open(source, "rb") as fh:
+                body = fh.read()
+        except OSError as exc:
+            raise StatsError(f"Could not read graph stats from {source}: {exc}") from exc
+    try:
+        return json.loads(body)
+    except ValueError as exc:
+        raise StatsError(f"Graph stats at {source} are not valid JSON: {exc}") from exc
+
+
+class GraphStats:
+    """The export's stats document, re-read when older than refresh_seconds."""
+
+    def __init__(self, source: str, refresh_seconds: float = 300.0) -> None:
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self._document: dict[str, Any] | None = None
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.source)
+
+    def document(self) -> dict[str, Any]:
+        """The current document. Raises StatsError when it cannot be read and
+        no earlier copy is held."""
+        with self._lock:
+            stale = (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at >= self.refresh_seconds
+            )
+            if stale:
+                try:
+                    self._document = _read(self.source)
+                except StatsError:
+                    if self._document is None:
+                        raise
+                # Also on failure, so an unreachable bucket is not retried per call.
+                self._loaded_at = time.monotonic()
+            return self._document
+
+    def summary(self) -> dict[str, Any]:
+        """graph_summary's node counts, plus edge counts and degree distributions."""
+        doc = self.document()
+        nodes = sorted((doc.get("nodes") or {}).items(), key=lambda item: -item[1])
+        return {
+            "source": "stats",
+            "generated_at": doc.get("generated_at"),
+            "count": len(nodes),
+            "results": [{"label": [label], "count": count} for label, count in nodes],
+            "edges": doc.get("edges") or {},
+            "degrees": doc.get("degrees") or {},
+        }
+
+    def rollups(self, kind: str, text: str | None, limit: int) -> list[dict[str, Any]]:
+        """Rollups of the accounts or permission sets whose name or id contains
+        `text` (all of them without it), most users first."""
+        entries = self.document().get(ROLLUP_KINDS[kind]) or {}
+        rows = [
+            {"id": node_id, **values}
+            for node_id, values in entries.items()
+            if not text or text in node_id or text in (values.get("name") or "")
+        ]
+        rows.sort(key=lambda row: (-row.get("userscount", 0), row["id"]))
+        return rows[:limit]
@@ -105,7 +105,7 @@ fi
 
 LAUNCHER="${SCRIPT_DIR}/connect-kiro.sh"
 
-APPROVE='["describe_graph_schema","find_access_paths","who_can_access","get_principal_access","find_unused_access","list_entities","graph_summary"]'
+APPROVE='["describe_graph_schema","find_access_paths","who_can_access","find_access_paths_many","who_can_access_many","get_principal_access","find_unused_access","list_entities","resolve_names","get_access_rollups","graph_summary"]'
 
 render_option_a() {
   MCP_URL="$MCP_URL" AUTHZ_VALUE="$AUTHZ_VALUE" APPROVE="$APPROVE" python3 - <<'PY'
@@ -0,0 +1,19 @@
+from aria_mcp_server.encoding import to_columnar
+
+
+def test_to_columnar_leaves_result_unchanged_when_a_block_fails():
+    result = {
+        "results": [{"name": "alice"}],
+        "groups": [
+            {"input": "a", "results": [{"name": "bob"}]},
+            {"input": "b", "results": ["not a row"]},
+        ],
+    }
+
+    assert to_columnar(result) == {
+        "results": [{"name": "alice"}],
+        "groups": [
+            {"input": "a", "results": [{"name": "bob"}]},
+            {"input": "b", "results": ["not a row"]},
+        ],
+    }
@@ -0,0 +1,83 @@
+from aria_mcp_server.federation import FederatedGraphClient, merge_rows
+from aria_mcp_server.graph_client import AriaGraphClient
+
+
+def _path(user, group, key):
+    return {"user": user, "via_group": group, "cursor_key": key}
+
+
+def test_merge_rows_cuts_on_distinct_cursor_keys():
+    # find_access_paths returns one row per via-group, so one cursor_key can
+    # span several rows; the cut must keep all of them.
+    graph_a = [
+        _path("alice", "admins", "u1|ps1|f1"),
+        _path("alice", "ops", "u1|ps1|f1"),
+        _path("bob", "admins", "u2|ps1|f1"),
+        _path("bob", "ops", "u2|ps1|f1"),
+    ]
+    graph_b = [
+        _path("alice", "admins", "u1|ps1|f1"),
+        _path("carol", "devs", "u3|ps1|f1"),
+    ]
+
+    rows = merge_rows([("g-a", graph_a), ("g-b", graph_b)], limit=2)
+
+    assert [(r["cursor_key"], r["via_group"]) for r in rows] == [
+        ("u1|ps1|f1", "admins"),
+        ("u1|ps1|f1", "ops"),
+        ("u2|ps1|f1", "admins"),
+        ("u2|ps1|f1", "ops"),
+    ]
+    assert rows[0]["source_graphs"] == ["g-a", "g-b"]
+    assert rows[1]["source_graphs"] == ["g-a"]
+
+
+def test_merge_rows_cuts_batched_rows_per_input():
+    graph_a = [
+        {"input_resource": "r1", "via_group": "admins", "cursor_key": "k1"},
+        {"input_resource": "r1", "via_group": "ops", "cursor_key": "k1"},
+        {"input_resource": "r1", "via_group": "admins", "cursor_key": "k2"},
+    ]
+    graph_b = [
+        {"input_resource": "r2", "via_group": "devs", "cursor_key": "k1"},
+        {"input_resource": "r2", "via_group": "devs", "cursor_key": "k2"},
+    ]
+
+    rows = merge_rows([("g-a", graph_a), ("g-b", graph_b)], limit=1)
+
+    assert [(r["input_resource"], r["cursor_key"]) for r in rows] == [
+        ("r1", "k1"),
+        ("r1", "k1"),
+        ("r2", "k1"),
+    ]
+
+
+def test_from_env_uses_a_single_entry_as_the_graph(monkeypatch):
+    monkeypatch.setenv("ARIA_GRAPH_IDS", "us-west-2/g-abc")
+
+    client = FederatedGraphClient.from_env()
+
+    assert isinstance(client, AriaGraphClient)
+    assert client._graph_id == "g-abc"
+
+
+def test_execute_guarded_cuts_merged_rows_to_the_bound_limit(monkeypatch):
+    client = FederatedGraphClient([("g-a", None), ("g-b", None)])
+    for graph_id, member in client.members.items():
+        rows = [{"graph": graph_id, "n": n} for n in range(3)]
+        monkeypatch.setattr(
+            member,
+            "execute_guarded",
+            lambda query, parameters, rows=rows: {
+                "results": rows,
+                "count": len(rows),
+                "executed_query": query,
+                "bounds": [],
+            },
+        )
+
+    result = client.execute_guarded("MATCH (n) RETURN n LIMIT 4")
+
+    assert result["count"] == 4
+    assert len(result["results"]) == 4
+    assert result["bounds"] == ["Cut the 6 rows of 2 graphs to LIMIT 4."]
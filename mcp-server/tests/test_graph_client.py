@@ -0,0 +1,47 @@
+import pytest
+
+from aria_mcp_server.graph_client import QueryRejected, bound_query, with_final_limit
+
+
+def test_limit_in_a_comment_is_not_the_final_limit():
+    query = "MATCH (u:UserName) RETURN u.username // LIMIT 5"
+    bounded, limit, notes = bound_query(query, None, max_hops=4, max_rows=100)
+
+    assert limit == 100
+    assert bounded == f"{query}\nLIMIT 100"
+    assert notes == ["Added LIMIT 100; the query had none."]
+
+
+def test_block_comments_and_literals_are_left_alone():
+    query = (
+        "MATCH (u)-[*1..2]->(a) /* -[*1..20]- LIMIT 3 */ "
+        "WHERE u.name = 'x//y' RETURN a LIMIT 500"
+    )
+    bounded, limit, _ = bound_query(query, None, max_hops=4, max_rows=100)
+
+    assert limit == 100
+    assert bounded == query.replace("LIMIT 500", "LIMIT 100")
+    assert with_final_limit(bounded, 10).endswith("RETURN a LIMIT 10")
+
+
+def test_upper_bound_is_capped():
+    bounded, _, notes = bound_query(
+        "MATCH (u)-[:R*2..9]->(a) RETURN a LIMIT 5", None, max_hops=4, max_rows=100
+    )
+
+    assert "-[:R*2..4]->" in bounded
+    assert notes == ["Capped variable-length pattern '*2..9' at 4 hops."]
+
+
+def test_unbounded_pattern_is_capped():
+    bounded, _, _ = bound_query(
+        "MATCH (u)-[*]->(a) RETURN a LIMIT 5", None, max_hops=4, max_rows=100
+    )
+
+    assert "-[*1..4]->" in bounded
+
+
+@pytest.mark.parametrize("pattern", ["*5..9", "*5..", "*6"])
+def test_lower_bound_above_max_hops_is_rejected(pattern):
+    with pytest.raises(QueryRejected):
+        bound_query(f"MATCH (u)-[{pattern}]->(a) RETURN a", None, max_hops=4, max_rows=100)
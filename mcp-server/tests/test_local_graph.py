@@ -0,0 +1,51 @@
+import pytest
+
+from aria_mcp_server.local_graph import LocalGraph, LocalGraphError, source_marker
+
+
+def _write(directory, name, text):
+    (directory / name).write_text(text, encoding="utf-8", newline="")
+
+
+def test_load_wraps_a_malformed_header(tmp_path):
+    _write(tmp_path, "AriaIdCUsers.csv", "id,username:String\r\nu1,alice\r\n")
+
+    with pytest.raises(LocalGraphError, match="AriaIdCUsers.csv"):
+        LocalGraph.load(str(tmp_path))
+
+
+def test_load_wraps_bad_utf8(tmp_path):
+    (tmp_path / "AriaIdCUsers.csv").write_bytes(b"~id,~label\r\nu\xff,UserName\r\n")
+
+    with pytest.raises(LocalGraphError):
+        LocalGraph.load(str(tmp_path))
+
+
+def test_source_marker_changes_with_the_export(tmp_path):
+    _write(tmp_path, "AriaIdCUsers.csv", "~id,~label\r\nu1,UserName\r\n")
+    before = source_marker(str(tmp_path))
+
+    _write(tmp_path, "AriaIdCUsers.csv", "~id,~label\r\nu1,UserName\r\nu2,UserName\r\n")
+
+    assert source_marker(str(tmp_path)) != before
+
+
+def test_load_merges_rollup_properties_into_the_node(tmp_path):
+    # AriaIdCAccountRollups.csv is read before AriaIdCAccounts.csv.
+    _write(
+        tmp_path,
+        "AriaIdCAccountRollups.csv",
+        "~id,~label,userscount:Int\r\na1,AccountName,3\r\n",
+    )
+    _write(
+        tmp_path,
+        "AriaIdCAccounts.csv",
+        "~id,~label,name:String,name_lc:String\r\na1,AccountName,Prod,prod\r\n",
+    )
+
+    graph = LocalGraph.load(str(tmp_path))
+    (node,) = graph.nodes("AccountName")
+
+    assert graph.prop(node, "userscount") == "3"
+    assert graph.prop(node, "name") == "Prod"
+    assert graph.prop(node, "name_lc") == "prod"
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from aria_mcp_server.resolver import NameResolver
+
+
+class _Client:
+    """Graph client stub whose queries block until `release` is set."""
+
+    def __init__(self) -> None:
+        self.marker = "s1"
+        self.names = ["alice"]
+        self.release = threading.Event()
+        self.release.set()
+
+    def snapshot_marker(self) -> str:
+        return self.marker
+
+    def execute(self, query: str, parameters=None, use_cache: bool = True) -> dict:
+        self.release.wait()
+        if "UserName" not in query:
+            return {"results": []}
+        return {"results": [{"id": f"u-{n}", "name": n} for n in self.names]}
+
+
+def test_rebuild_keeps_serving_the_previous_index():
+    client = _Client()
+    resolver = NameResolver(client)
+    assert resolver.resolve("users", "ali") == ["u-alice"]
+
+    # A new snapshot starts a rebuild that blocks in the graph; resolve()
+    # answers from the old index meanwhile instead of waiting.
+    client.marker = "s2"
+    client.names = ["alicia"]
+    client.release.clear()
+    started = time.monotonic()
+    assert resolver.resolve("users", "ali") == ["u-alice"]
+    assert time.monotonic() - started < 1
+    assert resolver.stats()["rebuilding"]
+
+    client.release.set()
+    deadline = time.monotonic() + 5
+    while resolver.stats()["rebuilding"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert resolver.resolve("users", "ali") == ["u-alicia"]
@@ -1,9 +1,33 @@
 import json
+import os
+import threading
+import time
 import boto3
 from datetime import datetime
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Adaptive retries absorb Access Analyzer throttling when finding details are
+# fetched concurrently during enrichment.
+BOTO_CONFIG = Config(
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    max_pool_connections=50
+)
+
+# Unused-access findings enriched concurrently, and the ceiling on
+# get_finding_v2 calls per second shared by all worker threads.
+ENRICH_MAX_WORKERS = int(os.environ.get('ENRICH_MAX_WORKERS', '8'))
+ENRICH_MAX_CALLS_PER_SECOND = float(os.environ.get('ENRICH_MAX_CALLS_PER_SECOND', '10'))
+
+# Stop submitting new work once fewer than this many milliseconds remain, so
+# in-flight results can still be written before the Lambda timeout.
+RUNTIME_SAFETY_BUFFER_MS = 30_000
+
+# Analyzer types that produce unused-access findings, in lookup order.
+UNUSED_ACCESS_ANALYZER_TYPES = ('ORGANIZATION_UNUSED_ACCESS', 'ACCOUNT_UNUSED_ACCESS')
+
 # Internal Access Finding
 def parse_internalaccess_finding(event,table_ia):
     # Parse the event detail
@@ -94,6 +118,7 @@ def parse_unusedaccess_finding(event,table_ua):
     created_at = detail['createdAt']
     updated_at = detail['updatedAt']
     analyzed_at = detail['analyzedAt']
+    analyzer_arn = detail.get('analyzerArn', 'N/A')
     
     # Prepare the item to be inserted into DynamoDB
     item = {
@@ -113,12 +138,183 @@ def parse_unusedaccess_finding(event,table_ua):
         'CreatedAt': created_at,
         'UpdatedAt': updated_at,
         'AnalyzedAt': analyzed_at,
+        'AnalyzerArn': analyzer_arn,
         'ProcessedAt': datetime.now().isoformat()
     }
+
+    # put_item replaces the whole item, so carry over enrichment details that are
+    # still valid for this UpdatedAt. A redelivered or unchanged finding then
+    # keeps its details instead of being fetched again.
+    item.update(cached_unused_details(table_ua, finding_id, updated_at))
     
     # Add the item to the DynamoDB table
     table_ua.put_item(Item=item)
 
+
+def cached_unused_details(table_ua, finding_id, updated_at):
+    # Return the stored enrichment attributes for a finding if they were fetched
+    # for the same UpdatedAt, otherwise an empty dict.
+    response = table_ua.get_item(
+        Key={'FindingId': finding_id},
+        ProjectionExpression='DetailsUpdatedAt, UnusedServiceList, UnusedActionList'
+    )
+    existing = response.get('Item')
+    if not existing or existing.get('DetailsUpdatedAt') != updated_at:
+        return {}
+    return existing
+
+
+# Unused Access Finding enrichment
+class RateLimiter:
+    # Spaces calls evenly so that all worker threads together stay under
+    # max_per_second. get_finding_v2 has a low per-account rate limit, and the
+    # adaptive retry mode alone would spend most of its budget backing off.
+    def __init__(self, max_per_second):
+        self._interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def encode_unused_details(finding_details):
+    # Encode get_finding_v2 findingDetails compactly for storage and export.
+    #
+    # UnusedServiceList: service namespaces joined by ", " (e.g. "ec2, s3").
+    # UnusedActionList:  one "service:Action1|Action2" group per service, joined
+    #                    by ";" (e.g. "s3:GetObject|PutObject;ec2:RunInstances").
+    #                    The service prefix is written once per group rather than
+    #                    once per action. A service whose actions are not listed
+    #                    (the whole service is unused) appears as "service:*".
+    services = {}
+    for detail in finding_details:
+        permission = detail.get('unusedPermissionDetails')
+        if not permission:
+            continue
+        service = permission['serviceNamespace']
+        actions = services.setdefault(service, set())
+        for action in permission.get('actions') or []:
+            # Actions arrive either bare ("GetObject") or prefixed ("s3:GetObject").
+            actions.add(action['action'].split(':', 1)[-1])
+
+    groups = []
+    for service in sorted(services):
+        verbs = sorted(services[service]) or ['*']
+        groups.append(f"{service}:{'|'.join(verbs)}")
+    return ", ".join(sorted(services)), ";".join(groups)
+
+
+def resolve_unused_access_analyzer_arn(analyzer):
+    # Find the analyzer that produces unused-access findings. Events carry the
+    # analyzer ARN when available; this covers items stored without one.
+    for analyzer_type in UNUSED_ACCESS_ANALYZER_TYPES:
+        paginator = analyzer.get_paginator('list_analyzers')
+        for page in paginator.paginate(type=analyzer_type):
+            for entry in page['analyzers']:
+                if entry.get('status') == 'ACTIVE':
+                    return entry['arn']
+    return None
+
+
+def fetch_unused_finding_details(analyzer, rate_limiter, analyzer_arn, finding_id):
+    # Return every findingDetails entry for a finding, following pagination.
+    details = []
+    kwargs = {'analyzerArn': analyzer_arn, 'id': finding_id}
+    while True:
+        rate_limiter.wait()
+        response = analyzer.get_finding_v2(**kwargs)
+        details.extend(response.get('findingDetails', []))
+        next_token = response.get('nextToken')
+        if not next_token:
+            return details
+        kwargs['nextToken'] = next_token
+
+
+def findings_needing_details(table_ua):
+    # The cache key is (FindingId, UpdatedAt): a finding is only fetched when it
+    # has never been enriched, or has changed since it was last enriched.
+    items = []
+    kwargs = {
+        'ProjectionExpression': 'FindingId, FindingType, UpdatedAt, DetailsUpdatedAt, AnalyzerArn'
+    }
+    while True:
+        response = table_ua.scan(**kwargs)
+        for item in response.get('Items', []):
+            # Unused IAM role findings have no per-action detail to fetch.
+            if item.get('FindingType') == 'UnusedIAMRole':
+                continue
+            if item.get('DetailsUpdatedAt') != item.get('UpdatedAt'):
+                items.append(item)
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def enrich_unused_access_findings(table_ua, context):
+    # Fetch per-action detail for unused-access findings concurrently, under a
+    # shared rate limit, and store it in compact encoded form on each item.
+    analyzer = boto3.client('accessanalyzer', config=BOTO_CONFIG)
+    rate_limiter = RateLimiter(ENRICH_MAX_CALLS_PER_SECOND)
+
+    pending = findings_needing_details(table_ua)
+    total = len(pending)
+    print(f"Enriching {total} unused access findings with up to {ENRICH_MAX_WORKERS} workers")
+    if not pending:
+        return 0, 0
+
+    default_analyzer_arn = None
+    if any(item.get('AnalyzerArn', 'N/A') == 'N/A' for item in pending):
+        default_analyzer_arn = resolve_unused_access_analyzer_arn(analyzer)
+
+    def enrich(item):
+        analyzer_arn = item.get('AnalyzerArn', 'N/A')
+        if analyzer_arn == 'N/A':
+            analyzer_arn = default_analyzer_arn
+        if not analyzer_arn:
+            raise ValueError("no active unused access analyzer found")
+        details = fetch_unused_finding_details(analyzer, rate_limiter, analyzer_arn, item['FindingId'])
+        service_list, action_list = encode_unused_details(details)
+        # The condition drops the write if the finding was updated or resolved
+        # while its details were being fetched; the next run picks it up again.
+        table_ua.update_item(
+            Key={'FindingId': item['FindingId']},
+            UpdateExpression='SET UnusedServiceList = :s, UnusedActionList = :a, DetailsUpdatedAt = :u',
+            ConditionExpression='UpdatedAt = :u',
+            ExpressionAttributeValues={':s': service_list, ':a': action_list, ':u': item['UpdatedAt']}
+        )
+
+    enriched = 0
+    submitted = 0
+    with ThreadPoolExecutor(max_workers=ENRICH_MAX_WORKERS) as executor:
+        future_to_id = {}
+        for item in pending:
+            if context is not None and context.get_remaining_time_in_millis() < RUNTIME_SAFETY_BUFFER_MS:
+                print(f"Approaching Lambda timeout; stopping after submitting {submitted}/{total} findings")
+                break
+            future_to_id[executor.submit(enrich, item)] = item['FindingId']
+            submitted += 1
+        for future in as_completed(future_to_id):
+            finding_id = future_to_id[future]
+            try:
+                future.result()
+                enriched += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    print(f"Finding {finding_id} changed during enrichment; skipping")
+                else:
+                    print(f"Error enriching finding {finding_id}: {e}")
+            except Exception as e:
+                print(f"Error enriching finding {finding_id}: {e}")
+
+    print(f"Enriched {enriched}/{total} unused access findings")
+    return enriched, total
+
 def delete_item_by_finding_id(finding_id, table_name):
     print(f"Item with FindingId {finding_id} to be deleted...")
     try:
@@ -151,6 +347,22 @@ def lambda_handler(event, context):
     table_ua = dynamodb.Table('AriaIdCUnusedAAFindings')
     table_ea = dynamodb.Table('AriaIdCExternalAAFindings')
 
+    # Batch enrichment pass, invoked by the graph export state machine rather
+    # than by an Access Analyzer event.
+    if event.get('action') == 'enrich_unused_access':
+        try:
+            enriched, total = enrich_unused_access_findings(table_ua, context)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': f"Enriched {enriched}/{total} unused access findings", 'complete': enriched >= total})
+            }
+        except Exception as e:
+            print(f"Error enriching unused access findings: {e}")
+            return {
+                'statusCode': 500,
+                'body': json.dumps('Error enriching unused access findings')
+            }
+
     finding_id = event['detail']['id']
     finding_type = event['detail']['findingType']
     
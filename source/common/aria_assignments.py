@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+
+from aria_scan import scan_items
+from aria_scope import in_scope
+from aria_writer import ParallelBatchWriter
+
+# Shared by ListProvisionedPermissionSets, which plans how the account assignments
+# are enumerated, and the two assignment collectors; aria-bootstrap.sh adds
+# source/common/*.py to every Lambda zip.
+#
+# The plan is made once per collection scope, for users and groups together:
+#
+# 'principal': each collector makes one list_account_assignments_for_principal call
+#     per user (or group), plus a page per ASSIGNMENTS_PAGE_SIZE of its rows, and
+#     writes its own table.
+# 'pair': ListUserAccountAssignments makes one list_account_assignments call per
+#     provisioned (account, permission set) pair, plus a page per
+#     ASSIGNMENTS_PAGE_SIZE of its rows, and writes the USER and GROUP rows of each
+#     response to both tables. ListGroupAccountAssignments has nothing left to do.
+
+# Page size requested from both assignment listing APIs (their maximum), also
+# used to estimate how many pages each strategy needs.
+ASSIGNMENTS_PAGE_SIZE = 100
+
+# Primary keys of AriaIdCUserAccountAssignments and AriaIdCGroupAccountAssignments
+USER_ASSIGNMENT_KEY = ['AccountId', 'UserPermissionSet']
+GROUP_ASSIGNMENT_KEY = ['GroupId', 'AccountPermissionSet']
+
+
+def plan_assignment_strategy(principal_count, pair_count, previous_rows, strategy='auto'):
+    # Estimate the SSO Admin calls of both strategies and return
+    # (strategy, {strategy: estimated calls}).
+    #
+    # principal_count is users plus groups, previous_rows the rows of both
+    # assignment tables from the previous run (DynamoDB's ItemCount). Both
+    # strategies page through the same rows, so they differ in their per-principal
+    # versus per-pair calls. Without provisioned pairs the per-principal calls are
+    # the safe choice. `strategy` other than 'auto' forces one.
+    estimates = {
+        'principal': principal_count + previous_rows // ASSIGNMENTS_PAGE_SIZE,
+        'pair': pair_count + previous_rows // ASSIGNMENTS_PAGE_SIZE,
+    }
+    if strategy in estimates:
+        return strategy, estimates
+    if not pair_count:
+        return 'principal', estimates
+    return min(estimates, key=lambda name: (estimates[name], name != 'principal')), estimates
+
+
+def user_assignment_row(user_id, user_name, account_id, permset_arn, instance_arn, permset_names, account_names):
+    return {
+        'AccountId': account_id,
+        # Composite sort key that makes each (user, permission set) unique
+        # within an account. UserId and PermissionSetArn are also stored as
+        # their own attributes below for the graph export.
+        'UserPermissionSet': f"{user_id}#{permset_arn}",
+        'UserId': user_id,
+        'PrincipalType': 'USER',
+        'PrincipalName': user_name,
+        'AccountName': account_names.get(account_id, 'N/A'),
+        'PermissionSetArn': permset_arn,
+        'Name': permset_names.get(permset_arn, 'N/A'),
+        'InstanceArn': instance_arn,
+        'UpdatedAt': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def group_assignment_row(group_id, group_name, account_id, permset_arn, instance_arn, permset_names, account_names):
+    return {
+        'GroupId': group_id,
+        # Composite sort key making each (account, permission set) unique
+        # within a group. AccountId and PermissionSetArn are also stored as
+        # their own attributes below for the graph export.
+        'AccountPermissionSet': f"{account_id}#{permset_arn}",
+        'AccountId': account_id,
+        'PrincipalType': 'GROUP',
+        'PrincipalName': group_name,
+        'AccountName': account_names.get(account_id, 'N/A'),
+        'PermissionSetArn': permset_arn,
+        'Name': permset_names.get(permset_arn, 'N/A'),
+        'InstanceArn': instance_arn,
+        'UpdatedAt': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def collect_assignments_for_pair(sso_admin, pair, instance_arn, user_names, group_names, permset_names, account_names):
+    # Return the USER rows and the GROUP rows of one provisioned (account,
+    # permission set) pair, and the number of API calls made. Principals missing
+    # from AriaIdCUsers / AriaIdCGroups are skipped, as the per-principal strategy
+    # would never see them.
+    account_id, permset_arn = pair
+    user_rows = []
+    group_rows = []
+    calls = 0
+
+    paginator = sso_admin.get_paginator('list_account_assignments')
+    for page in paginator.paginate(
+        InstanceArn=instance_arn,
+        AccountId=account_id,
+        PermissionSetArn=permset_arn,
+        PaginationConfig={'PageSize': ASSIGNMENTS_PAGE_SIZE}
+    ):
+        calls += 1
+        for assignment in page['AccountAssignments']:
+            principal_id = assignment['PrincipalId']
+            if assignment['PrincipalType'] == 'USER' and principal_id in user_names:
+                user_rows.append(user_assignment_row(
+                    principal_id, user_names[principal_id], account_id, permset_arn,
+                    instance_arn, permset_names, account_names
+                ))
+            elif assignment['PrincipalType'] == 'GROUP' and principal_id in group_names:
+                group_rows.append(group_assignment_row(
+                    principal_id, group_names[principal_id], account_id, permset_arn,
+                    instance_arn, permset_names, account_names
+                ))
+    return user_rows, group_rows, calls
+
+
+def empty_assignment_rows(table, key_names, instance_arn, writers, segments):
+    # Remove the scope's existing rows before repopulating, so assignments that
+    # were revoked since the last run do not linger as stale graph edges. Rows of
+    # other instances are left alone; rows without an InstanceArn predate scoped
+    # collection and are removed by whichever scope runs first.
+    with ParallelBatchWriter(table, key_names, writers=writers) as writer:
+        for item in scan_items(
+            table,
+            attributes=key_names,
+            segments=segments,
+            FilterExpression=in_scope(instance_arn, include_untagged=True)
+        ):
+            writer.delete_item({name: item[name] for name in key_names})
+    print(f"Removed previous rows: {writer.report()}")
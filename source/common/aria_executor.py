@@ -0,0 +1,58 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Shared by the threaded collectors; aria-bootstrap.sh adds source/common/*.py to every
+# Lambda zip, so this imports as a top-level module.
+
+_EXHAUSTED = object()
+
+
+class SlidingWindowExecutor:
+    # Runs fn(item) for every item with at most max_workers calls in flight, and starts
+    # the next item as soon as any call finishes. Submitting fixed chunks and waiting
+    # for each chunk to drain leaves every other worker idle behind the slowest item
+    # of the chunk (a principal with many pages, an account being throttled).
+    #
+    # Before each submission the Lambda's remaining time is checked against
+    # safety_buffer_ms; once below it nothing new starts, and the calls in flight
+    # still complete so their results can be written. Callers read submitted,
+    # completed and out_of_time afterwards to report partial runs.
+
+    def __init__(self, max_workers, context=None, safety_buffer_ms=30_000):
+        self.max_workers = max(1, max_workers)
+        self.context = context
+        self.safety_buffer_ms = safety_buffer_ms
+        self.submitted = 0
+        self.completed = 0
+        self.out_of_time = False
+
+    def _time_left(self):
+        if self.context is None:
+            return True
+        if self.context.get_remaining_time_in_millis() < self.safety_buffer_ms:
+            self.out_of_time = True
+        return not self.out_of_time
+
+    def run(self, fn, items):
+        # Yield (item, future) in completion order. future.result() raises whatever
+        # fn raised, so callers keep their own per-item error handling.
+        pending = iter(items)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            def refill():
+                while len(in_flight) < self.max_workers and self._time_left():
+                    item = next(pending, _EXHAUSTED)
+                    if item is _EXHAUSTED:
+                        return
+                    in_flight[executor.submit(fn, item)] = item
+                    self.submitted += 1
+
+            refill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = in_flight.pop(future)
+                    self.completed += 1
+                    yield item, future
+                refill()
+
@@ -0,0 +1,101 @@
+import queue
+import threading
+
+# Shared table readers; aria-bootstrap.sh adds source/common/*.py to every Lambda zip.
+#
+# scan_items yields a table's items page by page instead of collecting the whole table
+# into one list first, reads only the attributes asked for, and can split the scan
+# into parallel segments. scan_lookup builds a {key: value} dict straight from that
+# stream, for the name lookups the collectors keep in memory.
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+def _pages(table, kwargs):
+    # Call Scan until the last page. table.meta.client is shared safely between
+    # threads and, being the resource's client, takes condition objects
+    # (FilterExpression=Attr(...)) and returns plain Python values.
+    kwargs = dict(kwargs, TableName=table.name)
+    while True:
+        response = table.meta.client.scan(**kwargs)
+        yield response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def scan_items(table, attributes=None, segments=1, **scan_kwargs):
+    # Yield every item of the table (matching FilterExpression, if given), following
+    # pagination.
+    #
+    # attributes: names to read, pushed down as a ProjectionExpression with
+    # placeholder names (so reserved words such as Name or Status work).
+    # segments: above 1, Segment/TotalSegments scans run on that many threads and
+    # their pages are yielded as they arrive, in no particular order. At most two
+    # pages per segment are held before the consumer takes them.
+    kwargs = dict(scan_kwargs)
+    if attributes:
+        names = {f"#p{i}": name for i, name in enumerate(attributes)}
+        kwargs['ProjectionExpression'] = ', '.join(names)
+        kwargs['ExpressionAttributeNames'] = {**kwargs.get('ExpressionAttributeNames', {}), **names}
+
+    if segments <= 1:
+        for page in _pages(table, kwargs):
+            yield from page
+        return
+
+    pages = queue.Queue(maxsize=segments * 2)
+    stop = threading.Event()
+
+    def put(value):
+        # Give up when the consumer has stopped reading, instead of blocking forever.
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read(segment):
+        try:
+            for page in _pages(table, dict(kwargs, Segment=segment, TotalSegments=segments)):
+                if stop.is_set():
+                    return
+                put(page)
+        except Exception as e:
+            put(_Failed(e))
+        finally:
+            put(_DONE)
+
+    threads = [
+        threading.Thread(target=read, args=(segment,), name=f"aria-scan-{segment}", daemon=True)
+        for segment in range(segments)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        finished = 0
+        while finished < segments:
+            page = pages.get()
+            if page is _DONE:
+                finished += 1
+            elif isinstance(page, _Failed):
+                raise page.error
+            else:
+                yield from page
+    finally:
+        stop.set()
+
+
+def scan_lookup(table, key, value, default='N/A', **scan_kwargs):
+    # {item[key]: item[value]} for the table's items, reading only those two
+    # attributes. Items without `value` map to `default`.
+    return {
+        item[key]: item.get(value, default)
+        for item in scan_items(table, attributes=[key, value], **scan_kwargs)
+    }
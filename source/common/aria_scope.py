@@ -0,0 +1,70 @@
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+from aria_scan import scan_items
+
+# Collection scopes, shared by the collectors; aria-bootstrap.sh adds
+# source/common/*.py to every Lambda zip.
+#
+# The state machine passes each collector a Scope ({InstanceArn, IdentityStoreId,
+# RoleArn, Region}, all optional) naming the IAM Identity Center instance to collect.
+# Every scope writes into the same tables, so rows carry their InstanceArn.
+
+
+# Open a boto3 session for a collection scope: the Lambda's own credentials, or the
+# scope's RoleArn (Identity Center administrator account of another organization)
+def scope_session(scope):
+    if not scope.get('RoleArn'):
+        return boto3.Session(region_name=scope.get('Region'))
+    credentials = boto3.client('sts').assume_role(
+        RoleArn=scope['RoleArn'],
+        RoleSessionName='AriaCollection'
+    )['Credentials']
+    return boto3.Session(
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken'],
+        region_name=scope.get('Region')
+    )
+
+
+# Resolve the Identity Center instance to collect from the scope. Without an
+# InstanceArn the first instance is used, as in single-instance deployments.
+def resolve_scope(scope, sso_admin):
+    scope = dict(scope)
+    if scope.get('InstanceArn') and scope.get('IdentityStoreId'):
+        return scope
+    instances = sso_admin.list_instances()['Instances']
+    if scope.get('InstanceArn'):
+        instances = [i for i in instances if i['InstanceArn'] == scope['InstanceArn']]
+    if not instances:
+        raise ValueError(f"No IAM Identity Center instance {scope.get('InstanceArn', '')} visible to this account")
+    scope['InstanceArn'] = instances[0]['InstanceArn']
+    scope['IdentityStoreId'] = instances[0]['IdentityStoreId']
+    return scope
+
+
+# Condition for the rows of one Identity Center instance. include_untagged adds the
+# rows written before collection was scoped, for the sweeps that replace a scope's rows.
+def in_scope(instance_arn, include_untagged=False):
+    condition = Attr('InstanceArn').eq(instance_arn)
+    if include_untagged:
+        condition = condition | Attr('InstanceArn').not_exists()
+    return condition
+
+
+# Delete the scope's rows that a complete collection run did not write, i.e. whose
+# UpdatedAt is before the run started: users, groups or memberships removed since
+# the last run. Rows the IdentityCenterEvents function writes during the run are
+# newer and kept.
+def sweep_scope(table, key_names, instance_arn, started_at):
+    stale = in_scope(instance_arn, include_untagged=True) & (
+        Attr('UpdatedAt').lt(started_at) | Attr('UpdatedAt').not_exists()
+    )
+    deleted = 0
+    with table.batch_writer() as batch:
+        for item in scan_items(table, attributes=key_names, FilterExpression=stale):
+            batch.delete_item(Key={name: item[name] for name in key_names})
+            deleted += 1
+    print(f"Removed {deleted} rows of {table.name} no longer in {instance_arn}")
+    return deleted
@@ -0,0 +1,154 @@
+import queue
+import random
+import threading
+import time
+
+# Shared by the collectors that write many rows; aria-bootstrap.sh adds
+# source/common/*.py to every Lambda zip.
+
+# BatchWriteItem accepts at most 25 requests per call.
+BATCH_SIZE = 25
+
+_STOP = object()
+
+
+class ParallelBatchWriter:
+    # Writes puts and deletes to one DynamoDB table from several writer threads.
+    #
+    # table.batch_writer() sends each 25-item BatchWriteItem from the thread that
+    # buffers the items, so a collector whose reads run on many threads ends up
+    # waiting on one serial stream of writes. Here put_item/delete_item only buffer:
+    # every full batch goes on a bounded queue that `writers` threads drain
+    # concurrently. When the queue is full, put_item blocks until a writer takes a
+    # batch, which holds producers back to the pace DynamoDB accepts.
+    #
+    # Requests in one batch are de-duplicated by primary key (the last one wins), as
+    # BatchWriteItem rejects a batch that names a key twice. UnprocessedItems are
+    # resent with exponential backoff and full jitter, up to max_attempts calls per
+    # batch. A batch that still fails, or any other error on a writer thread, is
+    # raised from the next put_item or from leaving the `with` block.
+    #
+    # Usage:
+    #     with ParallelBatchWriter(table, ['AccountId', 'UserPermissionSet']) as writer:
+    #         writer.put_item(row)
+    #     print(writer.report())
+
+    def __init__(self, table, key_names, writers=4, queued_batches=8,
+                 max_attempts=8, base_delay=0.05, max_delay=5.0):
+        self.table_name = table.name
+        # The resource's client takes and returns plain Python values, as
+        # table.batch_writer() does.
+        self.client = table.meta.client
+        self.key_names = list(key_names)
+        self.writers = max(1, writers)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max(1, queued_batches))
+        self._buffer = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._error = None
+        self._started = None
+        self._finished = None
+        # Counters, updated by the writer threads under _lock.
+        self.items = 0
+        self.batches = 0
+        self.calls = 0
+        self.retries = 0
+        self.unprocessed = 0
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        for i in range(self.writers):
+            thread = threading.Thread(target=self._drain, name=f"aria-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._flush()
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._finished = time.monotonic()
+        if exc_type is None:
+            self._raise_error()
+        return False
+
+    def put_item(self, item):
+        self._add(item, {'PutRequest': {'Item': item}})
+
+    def delete_item(self, key):
+        self._add(key, {'DeleteRequest': {'Key': key}})
+
+    def report(self):
+        # Throughput and retry counts, for the collector's closing log line.
+        seconds = ((self._finished or time.monotonic()) - (self._started or time.monotonic()))
+        return {
+            'table': self.table_name,
+            'items': self.items,
+            'batches': self.batches,
+            'calls': self.calls,
+            'retries': self.retries,
+            'unprocessed_items': self.unprocessed,
+            'seconds': round(seconds, 2),
+            'items_per_second': round(self.items / seconds, 1) if seconds > 0 else None,
+        }
+
+    def _add(self, values, request):
+        self._raise_error()
+        self._buffer[tuple(values[name] for name in self.key_names)] = request
+        if len(self._buffer) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            # Blocks while every queue slot is taken (backpressure).
+            self._queue.put(list(self._buffer.values()))
+            self._buffer = {}
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _drain(self):
+        while True:
+            batch = self._queue.get()
+            if batch is _STOP:
+                return
+            if self._error is not None:
+                # A batch already failed; drop the rest so the caller sees that error.
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+
+    def _write(self, batch):
+        requests = batch
+        for attempt in range(self.max_attempts):
+            if attempt:
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(random.uniform(0, delay))
+            response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            with self._lock:
+                self.calls += 1
+                if attempt:
+                    self.retries += 1
+                self.unprocessed += len(unprocessed)
+            if not unprocessed:
+                with self._lock:
+                    self.items += len(batch)
+                    self.batches += 1
+                return
+            requests = unprocessed
+        raise RuntimeError(
+            f"{len(requests)} writes to {self.table_name} still unprocessed after "
+            f"{self.max_attempts} BatchWriteItem calls"
+        )
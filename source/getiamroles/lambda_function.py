@@ -1,9 +1,11 @@
 import json
 import os
 import boto3
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.config import Config
 from botocore.exceptions import ClientError
+from aria_executor import SlidingWindowExecutor
+from aria_writer import ParallelBatchWriter
+from aria_scan import scan_items, scan_lookup
 
 # Role to assume in member accounts (created via StackSet, must exist in all accounts)
 ROLE_TO_ASSUME = 'AriaIdCInventoryAccessRole-LimitedReadOnly'
@@ -25,28 +27,18 @@ MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '10'))
 # in-flight results can still be flushed to DynamoDB before the Lambda timeout.
 RUNTIME_SAFETY_BUFFER_MS = 30_000
 
+# Threads sending BatchWriteItem calls (see ParallelBatchWriter). Rows are written
+# while the lookups continue, instead of behind them on the main thread.
+WRITE_WORKERS = int(os.environ.get('WRITE_WORKERS', '4'))
+
+# Parallel segments for scans of the larger tables (see aria_scan.scan_items).
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
+
 # Length of the trailing "_<random-suffix>" that IAM Identity Center appends to
 # AWSReservedSSO_<PermissionSetName> role names.
 SSO_ROLE_SUFFIX_LEN = 17
 
 
-def _scan_all(table, **kwargs):
-    # Scan a table fully, following pagination. A plain table.scan() only returns
-    # the first 1 MB page, which silently drops data on larger tables.
-    items = []
-    response = table.scan(**kwargs)
-    items.extend(response.get('Items', []))
-    while 'LastEvaluatedKey' in response:
-        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **kwargs)
-        items.extend(response.get('Items', []))
-    return items
-
-
-def _chunk(items, size):
-    for i in range(0, len(items), size):
-        yield items[i:i + size]
-
-
 def assume_role(account_id, role_name):
     # Assume a role in the target account
     try:
@@ -105,7 +97,11 @@ def build_provisioned_permission_set_index():
     # turns the per-role lookup into O(1).
     table = dynamodb.Table('AriaIdCProvisionedPermissionSets')
     index = {}
-    for item in _scan_all(table):
+    for item in scan_items(
+        table,
+        attributes=['AccountId', 'PermissionSetName', 'PermissionSetArn'],
+        segments=SCAN_SEGMENTS
+    ):
         account_id = item.get('AccountId')
         if account_id is None:
             continue
@@ -113,9 +109,11 @@ def build_provisioned_permission_set_index():
     return index
 
 
-def collect_roles_for_account(account_id, permset_index):
+def collect_roles_for_account(account_id, instance_arn, permset_index):
     # Assume into the account, list its Identity Center roles, and build the rows
-    # to write. Runs inside a worker thread; performs only reads.
+    # to write. Runs inside a worker thread; performs only reads. instance_arn is
+    # the Identity Center instance of the account's organization, copied onto
+    # each row like the other collectors do.
     credentials = assume_role(account_id, ROLE_TO_ASSUME)
     idc_roles = list_idc_roles_in_account(credentials, account_id)
     account_permsets = permset_index.get(account_id, {})
@@ -136,7 +134,8 @@ def collect_roles_for_account(account_id, permset_index):
             'AttachedPolicies': role['AttachedPolicies'],
             'PermissionSetName': permsetname,
             'PermissionSetArn': permsetarn,
-            'CreateDate': role['CreateDate'].isoformat()
+            'CreateDate': role['CreateDate'].isoformat(),
+            'InstanceArn': instance_arn
         })
     return items
 
@@ -144,9 +143,9 @@ def collect_roles_for_account(account_id, permset_index):
 def empty_iam_roles_table():
     # Empty the IAM roles table before repopulating it.
     table = dynamodb.Table('AriaIdCIAMRoles')
-    with table.batch_writer() as batch:
-        for item in _scan_all(table, ProjectionExpression='IamRoleArn'):
-            batch.delete_item(Key={'IamRoleArn': item['IamRoleArn']})
+    with ParallelBatchWriter(table, ['IamRoleArn'], writers=WRITE_WORKERS) as writer:
+        for item in scan_items(table, attributes=['IamRoleArn'], segments=SCAN_SEGMENTS):
+            writer.delete_item({'IamRoleArn': item['IamRoleArn']})
 
 
 def lambda_handler(event, context):
@@ -158,37 +157,36 @@ def lambda_handler(event, context):
     permset_index = build_provisioned_permission_set_index()
     empty_iam_roles_table()
 
-    account_ids = [item['AccountId'] for item in _scan_all(accounts_table, ProjectionExpression='AccountId')]
+    # Accounts of every collected organization; the role named by ROLE_TO_ASSUME
+    # must trust this account in each of them.
+    accounts = scan_lookup(accounts_table, 'AccountId', 'InstanceArn', default='')
+    account_ids = sorted(accounts)
     total = len(account_ids)
-    processed = 0
     written = 0
     print(f"Processing {total} accounts with up to {MAX_WORKERS} workers")
 
-    # batch_writer is driven only from this main thread (thread-safe); worker
-    # threads perform the read-only assume-role/list-roles calls in parallel.
-    with iamroles_table.batch_writer() as batch:
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            for chunk in _chunk(account_ids, MAX_WORKERS):
-                if context is not None and context.get_remaining_time_in_millis() < RUNTIME_SAFETY_BUFFER_MS:
-                    print(f"Approaching Lambda timeout; stopping after {processed}/{total} accounts")
-                    break
-
-                future_to_account = {
-                    executor.submit(collect_roles_for_account, account_id, permset_index): account_id
-                    for account_id in chunk
-                }
-                for future in as_completed(future_to_account):
-                    account_id = future_to_account[future]
-                    try:
-                        for item in future.result():
-                            batch.put_item(Item=item)
-                            written += 1
-                    except Exception as e:
-                        print(f"Error processing account {account_id}: {e}")
-                processed += len(chunk)
+    # Worker threads perform the read-only assume-role/list-roles calls in parallel;
+    # the main thread hands their rows to the writer, whose own threads send the
+    # batches. The executor refills a worker slot as soon as any account finishes,
+    # so one slow account does not hold up the others.
+    window = SlidingWindowExecutor(MAX_WORKERS, context, RUNTIME_SAFETY_BUFFER_MS)
+    collect = lambda account_id: collect_roles_for_account(account_id, accounts[account_id], permset_index)
+    with ParallelBatchWriter(iamroles_table, ['IamRoleArn'], writers=WRITE_WORKERS) as writer:
+        for account_id, future in window.run(collect, account_ids):
+            try:
+                for item in future.result():
+                    writer.put_item(item)
+                    written += 1
+            except Exception as e:
+                print(f"Error processing account {account_id}: {e}")
+
+    processed = window.completed
+    if window.out_of_time:
+        print(f"Approaching Lambda timeout; stopped after {processed}/{total} accounts")
 
     message = f"Wrote {written} IAM roles across {processed}/{total} accounts"
     print(message)
+    print(f"Writes: {writer.report()}")
     return {
         'statusCode': 200,
         'body': json.dumps({'message': message, 'complete': processed >= total})
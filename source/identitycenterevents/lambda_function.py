@@ -0,0 +1,284 @@
+import json
+import os
+import boto3
+from datetime import datetime, timezone
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.config import Config
+from aria_scan import scan_items
+
+# Applies IAM Identity Center and Identity Store management events (CloudTrail, delivered
+# by EventBridge) to the AriaIdC* tables as they happen, instead of waiting for the next
+# scheduled collection. The scheduled run still rebuilds every table and corrects anything
+# an event could not express (for example an assignment whose asynchronous creation failed).
+BOTO_CONFIG = Config(retries={'max_attempts': 10, 'mode': 'adaptive'})
+sso_admin = boto3.client('sso-admin', config=BOTO_CONFIG)
+identitystore = boto3.client('identitystore', config=BOTO_CONFIG)
+dynamodb = boto3.resource('dynamodb')
+
+# Parallel segments for the membership table scans (see aria_scan.scan_items).
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# IdentityStoreId -> InstanceArn of this account's instances. Identity Store events do
+# not carry the instance ARN that the collectors tag every row with.
+_instances = {}
+
+
+def _instance_for_store(identity_store_id):
+    if identity_store_id not in _instances:
+        for instance in sso_admin.list_instances()['Instances']:
+            _instances[instance['IdentityStoreId']] = instance['InstanceArn']
+    if identity_store_id not in _instances:
+        # Rows without the instance would be invisible to every scope's reads.
+        raise ValueError(f"No IAM Identity Center instance with Identity Store {identity_store_id} in this account")
+    return _instances[identity_store_id]
+
+
+def _name(table_name, key, attribute):
+    # Look up a display name stored by the collectors ('N/A' when the row is missing).
+    item = dynamodb.Table(table_name).get_item(Key=key).get('Item') or {}
+    return item.get(attribute, 'N/A')
+
+
+def _delete_matching(table_name, key_names, filter_expression):
+    # Delete every row matching a scan filter, reading only the keys. Used for lookups
+    # on non-key attributes (MembershipId, UserId in the membership table).
+    table = dynamodb.Table(table_name)
+    deleted = 0
+    with table.batch_writer() as batch:
+        for item in scan_items(table, attributes=key_names, segments=SCAN_SEGMENTS, FilterExpression=filter_expression):
+            batch.delete_item(Key={name: item[name] for name in key_names})
+            deleted += 1
+    return deleted
+
+
+# -- Identity Store: users, groups and memberships --------------------------------------
+
+def put_user(identity_store_id, user_id):
+    user = identitystore.describe_user(IdentityStoreId=identity_store_id, UserId=user_id)
+    dynamodb.Table('AriaIdCUsers').put_item(Item={
+        'UserId': user['UserId'],
+        'UserName': user['UserName'],
+        'Email': user.get('Emails', [{}])[0].get('Value', ''),
+        'InstanceArn': _instance_for_store(identity_store_id),
+        'UpdatedAt': _now()
+    })
+
+
+def delete_user(user_id):
+    dynamodb.Table('AriaIdCUsers').delete_item(Key={'UserId': user_id})
+    _delete_matching('AriaIdCGroupMembership', ['GroupId', 'UserId'], Attr('UserId').eq(user_id))
+
+
+def put_group(identity_store_id, group_id):
+    group = identitystore.describe_group(IdentityStoreId=identity_store_id, GroupId=group_id)
+    dynamodb.Table('AriaIdCGroups').put_item(Item={
+        'GroupId': group['GroupId'],
+        'GroupName': group['DisplayName'],
+        'InstanceArn': _instance_for_store(identity_store_id),
+        'UpdatedAt': _now()
+    })
+
+
+def delete_group(group_id):
+    dynamodb.Table('AriaIdCGroups').delete_item(Key={'GroupId': group_id})
+    table = dynamodb.Table('AriaIdCGroupMembership')
+    kwargs = {'KeyConditionExpression': Key('GroupId').eq(group_id)}
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get('Items', []):
+            table.delete_item(Key={'GroupId': item['GroupId'], 'UserId': item['UserId']})
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def put_group_membership(identity_store_id, group_id, user_id, membership_id):
+    # MembershipId is stored because DeleteGroupMembership events carry nothing else.
+    dynamodb.Table('AriaIdCGroupMembership').put_item(Item={
+        'GroupId': group_id,
+        'UserId': user_id,
+        'MembershipId': membership_id,
+        'InstanceArn': _instance_for_store(identity_store_id),
+        'UpdatedAt': _now()
+    })
+
+
+def delete_group_membership(membership_id):
+    deleted = _delete_matching(
+        'AriaIdCGroupMembership', ['GroupId', 'UserId'], Attr('MembershipId').eq(membership_id)
+    )
+    if not deleted:
+        # Rows written before MembershipId was recorded; the next scheduled
+        # ListGroupMembership run sweeps the rows it no longer lists.
+        print(f"No stored membership {membership_id}; left to the scheduled collection")
+
+
+# -- IAM Identity Center: permission sets and account assignments -----------------------
+
+def put_permission_set(instance_arn, permission_set_arn):
+    details = sso_admin.describe_permission_set(
+        InstanceArn=instance_arn,
+        PermissionSetArn=permission_set_arn
+    )['PermissionSet']
+    dynamodb.Table('AriaIdCPermissionSets').put_item(Item={
+        'PermissionSetArn': permission_set_arn,
+        'Name': details['Name'],
+        'Description': details.get('Description', ''),
+        'InstanceArn': instance_arn,
+        'UpdatedAt': _now()
+    })
+
+
+def delete_permission_set(permission_set_arn):
+    dynamodb.Table('AriaIdCPermissionSets').delete_item(Key={'PermissionSetArn': permission_set_arn})
+
+
+def put_provisioned_permission_set(instance_arn, permission_set_arn, account_id):
+    dynamodb.Table('AriaIdCProvisionedPermissionSets').put_item(Item={
+        'PermissionSetArn': permission_set_arn,
+        'PermissionSetName': _name('AriaIdCPermissionSets', {'PermissionSetArn': permission_set_arn}, 'Name'),
+        'AccountId': account_id,
+        'AccountName': _name('AriaIdCAccounts', {'AccountId': account_id}, 'Name'),
+        'InstanceArn': instance_arn,
+        'UpdatedAt': _now()
+    })
+
+
+def assignment_key(principal_type, principal_id, account_id, permission_set_arn):
+    # (table name, primary key) of an assignment row, as the collectors write it.
+    if principal_type == 'USER':
+        return 'AriaIdCUserAccountAssignments', {
+            'AccountId': account_id,
+            'UserPermissionSet': f"{principal_id}#{permission_set_arn}"
+        }
+    return 'AriaIdCGroupAccountAssignments', {
+        'GroupId': principal_id,
+        'AccountPermissionSet': f"{account_id}#{permission_set_arn}"
+    }
+
+
+def put_account_assignment(instance_arn, principal_type, principal_id, account_id, permission_set_arn):
+    table_name, key = assignment_key(principal_type, principal_id, account_id, permission_set_arn)
+    if principal_type == 'USER':
+        attributes = {'UserId': principal_id}
+        principal_name = _name('AriaIdCUsers', {'UserId': principal_id}, 'UserName')
+    else:
+        attributes = {'AccountId': account_id}
+        principal_name = _name('AriaIdCGroups', {'GroupId': principal_id}, 'GroupName')
+    dynamodb.Table(table_name).put_item(Item={
+        **key,
+        **attributes,
+        'PrincipalType': principal_type,
+        'PrincipalName': principal_name,
+        'AccountName': _name('AriaIdCAccounts', {'AccountId': account_id}, 'Name'),
+        'PermissionSetArn': permission_set_arn,
+        'Name': _name('AriaIdCPermissionSets', {'PermissionSetArn': permission_set_arn}, 'Name'),
+        'InstanceArn': instance_arn,
+        'UpdatedAt': _now()
+    })
+    # Creating an assignment provisions the permission set into the account.
+    put_provisioned_permission_set(instance_arn, permission_set_arn, account_id)
+
+
+def delete_account_assignment(principal_type, principal_id, account_id, permission_set_arn):
+    table_name, key = assignment_key(principal_type, principal_id, account_id, permission_set_arn)
+    dynamodb.Table(table_name).delete_item(Key=key)
+
+
+# -- dispatch ---------------------------------------------------------------------------
+
+def apply_event(detail):
+    # Apply one CloudTrail event. Returns a short description of what was patched, or
+    # None when the event is not one this function handles.
+    name = detail.get('eventName')
+    request = detail.get('requestParameters') or {}
+    response = detail.get('responseElements') or {}
+
+    if name in ('CreateAccountAssignment', 'DeleteAccountAssignment'):
+        if request.get('targetType', 'AWS_ACCOUNT') != 'AWS_ACCOUNT':
+            return None
+        args = (request['principalType'], request['principalId'], request['targetId'], request['permissionSetArn'])
+        if name == 'CreateAccountAssignment':
+            put_account_assignment(request['instanceArn'], *args)
+        else:
+            delete_account_assignment(*args)
+        return f"{name} {args[0]} {args[1]} in {args[2]}"
+
+    if name == 'ProvisionPermissionSet':
+        # ALL_PROVISIONED_ACCOUNTS re-provisions into accounts that are already recorded.
+        if request.get('targetType') != 'AWS_ACCOUNT':
+            return None
+        put_provisioned_permission_set(request['instanceArn'], request['permissionSetArn'], request['targetId'])
+        return f"{name} {request['permissionSetArn']} into {request['targetId']}"
+
+    if name in ('CreatePermissionSet', 'UpdatePermissionSet'):
+        permission_set_arn = (response.get('permissionSet') or {}).get('permissionSetArn') or request['permissionSetArn']
+        put_permission_set(request['instanceArn'], permission_set_arn)
+        return f"{name} {permission_set_arn}"
+
+    if name == 'DeletePermissionSet':
+        delete_permission_set(request['permissionSetArn'])
+        return f"{name} {request['permissionSetArn']}"
+
+    if name in ('CreateUser', 'UpdateUser'):
+        user_id = response.get('userId') or request['userId']
+        put_user(request['identityStoreId'], user_id)
+        return f"{name} {user_id}"
+
+    if name == 'DeleteUser':
+        delete_user(request['userId'])
+        return f"{name} {request['userId']}"
+
+    if name in ('CreateGroup', 'UpdateGroup'):
+        group_id = response.get('groupId') or request['groupId']
+        put_group(request['identityStoreId'], group_id)
+        return f"{name} {group_id}"
+
+    if name == 'DeleteGroup':
+        delete_group(request['groupId'])
+        return f"{name} {request['groupId']}"
+
+    if name == 'CreateGroupMembership':
+        user_id = (request.get('memberId') or {}).get('userId')
+        if not user_id:
+            return None
+        put_group_membership(request['identityStoreId'], request['groupId'], user_id, response.get('membershipId', ''))
+        return f"{name} {user_id} in {request['groupId']}"
+
+    if name == 'DeleteGroupMembership':
+        delete_group_membership(request['membershipId'])
+        return f"{name} {request['membershipId']}"
+
+    return None
+
+
+def lambda_handler(event, context):
+    detail = event.get('detail') or {}
+    name = detail.get('eventName')
+
+    # Failed API calls are recorded by CloudTrail as well and changed nothing.
+    if detail.get('errorCode'):
+        print(f"Ignoring failed {name}: {detail.get('errorCode')}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(f"Ignored failed {name}")
+        }
+
+    try:
+        applied = apply_event(detail)
+        message = f"Applied {applied}" if applied else f"Ignored {name}"
+        print(message)
+        return {
+            'statusCode': 200,
+            'body': json.dumps(message)
+        }
+    except Exception as e:
+        # Raised so that Lambda retries the event and, after the last attempt, sends
+        # it to the function's dead-letter queue.
+        print(f"Error applying {name}: {e}")
+        raise
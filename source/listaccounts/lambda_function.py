@@ -2,14 +2,14 @@ import json
 import boto3
 import time
 from datetime import datetime
+from aria_scope import scope_session, resolve_scope
 
-# List all permission sets and store in DynamoDB
-def list_accounts(dynamodb):
+# List all accounts of the scope's organization and store in DynamoDB
+def list_accounts(organizations, dynamodb, instance_arn):
     
     table = dynamodb.Table('AriaIdCAccounts')
 
     # Get a list of all accounts in the organization
-    organizations = boto3.client('organizations')
     accounts = []
     paginator = organizations.get_paginator('list_accounts')
     for page in paginator.paginate():
@@ -22,25 +22,33 @@ def list_accounts(dynamodb):
                 'AccountId': account['Id'],
                 'Name': account['Name'],
                 'Status': account['Status'],
+                # Identity Center instance of the organization, so per-instance
+                # collectors only visit their own accounts
+                'InstanceArn': instance_arn,
                 'UpdatedAt': datetime.now().isoformat()
             })
         except Exception as e:
             print(f"Error processing accounts")
 
 # Initialize clients
-def initialize_clients():
-    # Initialize required AWS clients
+def initialize_clients(event):
+    # Initialize required AWS clients; Organizations calls go to the scope's account
+    session = scope_session((event or {}).get('Scope') or {})
+    organizations = session.client('organizations')
     dynamodb = boto3.resource('dynamodb')
     
-    return dynamodb
+    # Get the instance ARN
+    instance_arn = resolve_scope((event or {}).get('Scope') or {}, session.client('sso-admin'))['InstanceArn']
+    
+    return organizations, dynamodb, instance_arn
 
 def lambda_handler(event, context):
 
-    dynamodb = initialize_clients()
+    organizations, dynamodb, instance_arn = initialize_clients(event)
 
     # List accounts
     try:
-        list_accounts(dynamodb)
+        list_accounts(organizations, dynamodb, instance_arn)
         print("Listed accounts successfully")
         return {
             'statusCode': 200,
@@ -1,10 +1,15 @@
 import json
 import os
 import boto3
-from datetime import datetime, timezone
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.config import Config
 from botocore.exceptions import ClientError
+from aria_executor import SlidingWindowExecutor
+from aria_writer import ParallelBatchWriter
+from aria_scope import scope_session, resolve_scope, in_scope
+from aria_scan import scan_lookup
+from aria_assignments import (
+    ASSIGNMENTS_PAGE_SIZE, GROUP_ASSIGNMENT_KEY, empty_assignment_rows, group_assignment_row
+)
 
 # Reuse clients/resources across warm invocations. Adaptive retries absorb the
 # throttling that comes with running many SSO Admin calls concurrently, and a
@@ -17,7 +22,7 @@ BOTO_CONFIG = Config(
 sso_admin = boto3.client('sso-admin', config=BOTO_CONFIG)
 dynamodb = boto3.resource('dynamodb')
 
-# Number of principals processed concurrently. list_account_assignments_for_principal
+# Number of groups processed concurrently. list_account_assignments_for_principal
 # is I/O bound, so threading gives a near-linear speedup despite the GIL.
 MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '15'))
 
@@ -25,156 +30,137 @@ MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '15'))
 # in-flight results can still be flushed to DynamoDB before the Lambda timeout.
 RUNTIME_SAFETY_BUFFER_MS = 30_000
 
+# Threads sending BatchWriteItem calls (see ParallelBatchWriter). Rows are written
+# while the lookups continue, instead of behind them on the main thread.
+WRITE_WORKERS = int(os.environ.get('WRITE_WORKERS', '4'))
 
-def _scan_all(table, **kwargs):
-    # Scan a table fully, following pagination. A plain table.scan() only returns
-    # the first 1 MB page, which silently drops data on larger tables.
-    items = []
-    response = table.scan(**kwargs)
-    items.extend(response.get('Items', []))
-    while 'LastEvaluatedKey' in response:
-        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **kwargs)
-        items.extend(response.get('Items', []))
-    return items
-
-
-def _chunk(items, size):
-    for i in range(0, len(items), size):
-        yield items[i:i + size]
+# Parallel segments for scans of the larger tables (see aria_scan.scan_items).
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
 
 
-def get_instance_arn():
-    # Get the IAM Identity Center instance ARN
-    return sso_admin.list_instances()['Instances'][0]['InstanceArn']
+def scope_client(scope):
+    # SSO Admin client for a collection scope (see aria_scope): the module client
+    # for this account, or one from the scope's session (its RoleArn or Region).
+    if not scope.get('RoleArn') and not scope.get('Region'):
+        return sso_admin
+    return scope_session(scope).client('sso-admin', config=BOTO_CONFIG)
 
 
-def load_permission_set_names():
+def load_permission_set_names(instance_arn):
     # Load PermissionSetArn -> Name once so we never call get_item per assignment.
     permset_table = dynamodb.Table('AriaIdCPermissionSets')
-    return {
-        item['PermissionSetArn']: item.get('Name', 'N/A')
-        for item in _scan_all(permset_table)
-    }
+    return scan_lookup(permset_table, 'PermissionSetArn', 'Name', FilterExpression=in_scope(instance_arn))
 
 
-def load_account_names():
+def load_account_names(instance_arn):
     # Load AccountId -> Name once. This replaces the per-account API/scan work and
     # lets us resolve account names from the assignment response instead.
     accounts_table = dynamodb.Table('AriaIdCAccounts')
-    return {
-        item['AccountId']: item.get('Name', 'N/A')
-        for item in _scan_all(accounts_table)
-    }
+    return scan_lookup(accounts_table, 'AccountId', 'Name', FilterExpression=in_scope(instance_arn))
 
 
-def collect_assignments_for_group(group, instance_arn, permset_names, account_names):
-    # Return all assignment rows for a single group across every account.
+def collect_assignments_for_group(sso_admin, group, instance_arn, permset_names, account_names):
+    # Return all assignment rows for a single group across every account, and the
+    # number of API calls made.
     #
     # The AccountId filter is intentionally omitted: a single paginated call to
     # list_account_assignments_for_principal returns the group's assignments in all
     # accounts. This collapses the previous groups x accounts API explosion down to
     # one call per group, and the response already carries the AccountId.
-    group_id = group['GroupId']
-    group_name = group.get('GroupName', 'N/A')
+    group_id, group_name = group
     rows = []
+    calls = 0
 
     paginator = sso_admin.get_paginator('list_account_assignments_for_principal')
     for page in paginator.paginate(
         InstanceArn=instance_arn,
         PrincipalType='GROUP',
-        PrincipalId=group_id
+        PrincipalId=group_id,
+        PaginationConfig={'PageSize': ASSIGNMENTS_PAGE_SIZE}
     ):
+        calls += 1
         for assignment in page['AccountAssignments']:
-            account_id = assignment['AccountId']
-            permset_arn = assignment['PermissionSetArn']
-            rows.append({
-                'GroupId': group_id,
-                # Composite sort key making each (account, permission set) unique
-                # within a group. AccountId and PermissionSetArn are also stored as
-                # their own attributes below for the graph export.
-                'AccountPermissionSet': f"{account_id}#{permset_arn}",
-                'AccountId': account_id,
-                'PrincipalType': 'GROUP',
-                'PrincipalName': group_name,
-                'AccountName': account_names.get(account_id, 'N/A'),
-                'PermissionSetArn': permset_arn,
-                'Name': permset_names.get(permset_arn, 'N/A'),
-                'UpdatedAt': datetime.now(timezone.utc).isoformat()
-            })
-    return rows
-
-
-def empty_group_account_assignments_table(table):
-    # Remove all existing rows before repopulating, so assignments that were
-    # revoked since the last run do not linger as stale graph edges. The table is
-    # fully rebuilt on every run.
-    with table.batch_writer() as batch:
-        for item in _scan_all(table, ProjectionExpression='GroupId, AccountPermissionSet'):
-            batch.delete_item(Key={
-                'GroupId': item['GroupId'],
-                'AccountPermissionSet': item['AccountPermissionSet']
-            })
-
-
-def list_account_assignments_for_groups(instance_arn, context):
+            rows.append(group_assignment_row(
+                group_id, group_name, assignment['AccountId'], assignment['PermissionSetArn'],
+                instance_arn, permset_names, account_names
+            ))
+    return rows, calls
+
+
+def list_account_assignments_for_groups(sso_admin, instance_arn, context):
     # List all account assignments for groups and store them in DynamoDB.
     print("Listing all account assignments for GROUP principals")
 
     table = dynamodb.Table('AriaIdCGroupAccountAssignments')
-    groups = _scan_all(dynamodb.Table('AriaIdCGroups'))
-    permset_names = load_permission_set_names()
-    account_names = load_account_names()
+    # Only the two attributes the lookups use, not the whole group item.
+    groups = sorted(scan_lookup(
+        dynamodb.Table('AriaIdCGroups'), 'GroupId', 'GroupName',
+        segments=SCAN_SEGMENTS, FilterExpression=in_scope(instance_arn)
+    ).items())
+    permset_names = load_permission_set_names(instance_arn)
+    account_names = load_account_names(instance_arn)
 
-    empty_group_account_assignments_table(table)
+    empty_assignment_rows(table, GROUP_ASSIGNMENT_KEY, instance_arn, WRITE_WORKERS, SCAN_SEGMENTS)
 
     total = len(groups)
-    processed = 0
     written = 0
+    calls = 0
     print(f"Processing {total} groups with up to {MAX_WORKERS} workers")
 
-    # batch_writer batches up to 25 writes per request and handles retries. It is
-    # driven only from this main thread, so it stays thread-safe while worker
-    # threads perform the (read-only) API lookups.
+    # The main thread hands the rows of each finished group to the writer, whose
+    # threads send the 25-row batches while the lookups go on. The writer
+    # de-duplicates each batch on the full primary key, so a repeated
+    # (GroupId, AccountPermissionSet) cannot trigger the "list of item keys
+    # contains duplicates" BatchWriteItem error.
     #
-    # overwrite_by_pkeys de-duplicates the buffer on the full primary key so that
-    # any repeated (GroupId, AccountPermissionSet) within a flush window cannot
-    # trigger the "list of item keys contains duplicates" BatchWriteItem error.
-    with table.batch_writer(overwrite_by_pkeys=['GroupId', 'AccountPermissionSet']) as batch:
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            for chunk in _chunk(groups, MAX_WORKERS):
-                if context is not None and context.get_remaining_time_in_millis() < RUNTIME_SAFETY_BUFFER_MS:
-                    print(f"Approaching Lambda timeout; stopping after {processed}/{total} groups")
-                    break
-
-                future_to_group = {
-                    executor.submit(
-                        collect_assignments_for_group, group, instance_arn, permset_names, account_names
-                    ): group
-                    for group in chunk
-                }
-                for future in as_completed(future_to_group):
-                    group = future_to_group[future]
-                    try:
-                        for row in future.result():
-                            batch.put_item(Item=row)
-                            written += 1
-                    except Exception as e:
-                        print(f"Error processing assignments for group {group.get('GroupId')}: {e}")
-                processed += len(chunk)
-
+    # The executor keeps MAX_WORKERS lookups in flight, refilling a slot as soon as
+    # any group finishes, and stops starting new groups near the Lambda timeout.
+    collect = lambda group: collect_assignments_for_group(
+        sso_admin, group, instance_arn, permset_names, account_names
+    )
+    window = SlidingWindowExecutor(MAX_WORKERS, context, RUNTIME_SAFETY_BUFFER_MS)
+    with ParallelBatchWriter(table, GROUP_ASSIGNMENT_KEY, writers=WRITE_WORKERS) as writer:
+        for group, future in window.run(collect, groups):
+            try:
+                rows, group_calls = future.result()
+                calls += group_calls
+                for row in rows:
+                    writer.put_item(row)
+                    written += 1
+            except Exception as e:
+                print(f"Error processing assignments for {group[0]}: {e}")
+
+    processed = window.completed
+    if window.out_of_time:
+        print(f"Approaching Lambda timeout; stopped after {processed}/{total} groups")
     print(f"Wrote {written} assignment rows for {processed}/{total} groups")
+    print(f"Writes: {writer.report()}")
+    print(f"Assignment plan: principal strategy, made {calls} calls")
     return processed, total
 
 
 def lambda_handler(event, context):
 
-    instance_arn = get_instance_arn()
+    # The Identity Center instance to collect, from the state machine's Scope, and
+    # the enumeration strategy ListProvisionedPermissionSets planned for it
+    event = event or {}
+    scope = event.get('Scope') or {}
+    if event.get('AssignmentStrategy') == 'pair':
+        # ListUserAccountAssignments writes the group rows of every provisioned pair
+        message = "GROUP account assignments are collected per provisioned pair by ListUserAccountAssignments"
+        print(message)
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': message, 'complete': True})
+        }
+    client = scope_client(scope)
+    instance_arn = resolve_scope(scope, client)['InstanceArn']
 
     # List account assignments for all groups
     try:
-        processed, total = list_account_assignments_for_groups(instance_arn, context)
+        processed, total = list_account_assignments_for_groups(client, instance_arn, context)
         complete = processed >= total
-        message = f"Listed account assignments for {processed}/{total} GROUP principals"
+        message = f"Listed account assignments for GROUP principals ({processed}/{total} groups)"
         print(message)
         return {
             'statusCode': 200,
@@ -2,50 +2,64 @@ import json
 import boto3
 import time
 from datetime import datetime
+from aria_scan import scan_items
+from aria_scope import scope_session, resolve_scope, in_scope, sweep_scope
 
 # List all group memberships and store in DynamoDB
-def list_group_memberships(identitystore, dynamodb, identity_store_id):
+def list_group_memberships(identitystore, dynamodb, scope):
     # List all group memberships and store in DynamoDB
-    print(f"Listing all group memberships")
+    print(f"Listing all group memberships of {scope['InstanceArn']}")
+    started_at = datetime.now().isoformat()
     table = dynamodb.Table('AriaIdCGroupMembership')
     groups_table = dynamodb.Table('AriaIdCGroups')
-    groups = groups_table.scan()['Items']
+    # Only the groups of this scope; other instances' groups share the table
+    groups = scan_items(
+        groups_table,
+        attributes=['GroupId'],
+        FilterExpression=in_scope(scope['InstanceArn'])
+    )
     
     for group in groups:
         paginator = identitystore.get_paginator('list_group_memberships')
         for page in paginator.paginate(
-            IdentityStoreId=identity_store_id,
+            IdentityStoreId=scope['IdentityStoreId'],
             GroupId=group['GroupId']
         ):
             for membership in page['GroupMemberships']:
                 table.put_item(Item={
                     'GroupId': group['GroupId'],
                     'UserId': membership['MemberId']['UserId'],
+                    # Lets the IdentityCenterEvents function resolve DeleteGroupMembership
+                    # events, which only carry the MembershipId.
+                    'MembershipId': membership['MembershipId'],
+                    'InstanceArn': scope['InstanceArn'],
                     'UpdatedAt': datetime.now().isoformat()
                 })
 
+    # Every membership was listed; remove the ones deleted since the last run
+    sweep_scope(table, ['GroupId', 'UserId'], scope['InstanceArn'], started_at)
+
 
 # Initialize clients
-def initialize_clients():
-    # Initialize required AWS clients
-    identitystore = boto3.client('identitystore')
-    sso_admin = boto3.client('sso-admin')
+def initialize_clients(event):
+    # Initialize required AWS clients; Identity Center calls go to the scope's account
+    session = scope_session((event or {}).get('Scope') or {})
+    identitystore = session.client('identitystore')
+    sso_admin = session.client('sso-admin')
     dynamodb = boto3.resource('dynamodb')
     
-    # Get Identity Store ID
-    sso = boto3.client('sso-admin')
-    identity_store_id = sso.list_instances()['Instances'][0]['IdentityStoreId']
-    instance_arn = sso.list_instances()['Instances'][0]['InstanceArn']
+    # Get Identity Store ID and instance ARN
+    scope = resolve_scope((event or {}).get('Scope') or {}, sso_admin)
     
-    return identitystore, sso_admin, dynamodb, identity_store_id, instance_arn
+    return identitystore, sso_admin, dynamodb, scope
 
 def lambda_handler(event, context):
 
-    identitystore, sso_admin, dynamodb, identity_store_id, instance_arn = initialize_clients()
+    identitystore, sso_admin, dynamodb, scope = initialize_clients(event)
 
     # List group memberships
     try:
-        list_group_memberships(identitystore, dynamodb, identity_store_id)
+        list_group_memberships(identitystore, dynamodb, scope)
         print("Listed group memberships successfully")
         return {
             'statusCode': 200,
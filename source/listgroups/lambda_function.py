@@ -2,44 +2,49 @@ import json
 import boto3
 import time
 from datetime import datetime
+from aria_scope import scope_session, resolve_scope, sweep_scope
 
 # List all groups and store in DynamoDB
-def list_groups(identitystore, dynamodb, identity_store_id):
+def list_groups(identitystore, dynamodb, scope):
     # List all groups and store in DynamoDB
-    print(f"Listing all groups")
+    print(f"Listing all groups of {scope['InstanceArn']}")
+    started_at = datetime.now().isoformat()
     table = dynamodb.Table('AriaIdCGroups')
     paginator = identitystore.get_paginator('list_groups')
     
-    for page in paginator.paginate(IdentityStoreId=identity_store_id):
+    for page in paginator.paginate(IdentityStoreId=scope['IdentityStoreId']):
         for group in page['Groups']:
             table.put_item(Item={
                 'GroupId': group['GroupId'],
                 'GroupName': group['DisplayName'],
+                'InstanceArn': scope['InstanceArn'],
                 'UpdatedAt': datetime.now().isoformat()
             })
 
+    # Every group was listed; remove the ones deleted since the last run
+    sweep_scope(table, ['GroupId'], scope['InstanceArn'], started_at)
+
 
 # Initialize clients
-def initialize_clients():
-    # Initialize required AWS clients
-    identitystore = boto3.client('identitystore')
-    sso_admin = boto3.client('sso-admin')
+def initialize_clients(event):
+    # Initialize required AWS clients; Identity Center calls go to the scope's account
+    session = scope_session((event or {}).get('Scope') or {})
+    identitystore = session.client('identitystore')
+    sso_admin = session.client('sso-admin')
     dynamodb = boto3.resource('dynamodb')
     
-    # Get Identity Store ID
-    sso = boto3.client('sso-admin')
-    identity_store_id = sso.list_instances()['Instances'][0]['IdentityStoreId']
-    instance_arn = sso.list_instances()['Instances'][0]['InstanceArn']
+    # Get Identity Store ID and instance ARN
+    scope = resolve_scope((event or {}).get('Scope') or {}, sso_admin)
     
-    return identitystore, sso_admin, dynamodb, identity_store_id, instance_arn
+    return identitystore, sso_admin, dynamodb, scope
 
 def lambda_handler(event, context):
 
-    identitystore, sso_admin, dynamodb, identity_store_id, instance_arn = initialize_clients()
+    identitystore, sso_admin, dynamodb, scope = initialize_clients(event)
 
     # List groups
     try:
-        list_groups(identitystore, dynamodb, identity_store_id)
+        list_groups(identitystore, dynamodb, scope)
         print("Listed groups successfully")
         return {
             'statusCode': 200,
@@ -2,11 +2,12 @@ import json
 import boto3
 import time
 from datetime import datetime
+from aria_scope import scope_session, resolve_scope
 
 # List all permission sets and store in DynamoDB
 def list_permission_sets(sso_admin, dynamodb, instance_arn):
     # List all permission sets and store in DynamoDB
-    print(f"Listing all permission sets")
+    print(f"Listing all permission sets of {instance_arn}")
     table = dynamodb.Table('AriaIdCPermissionSets')
     paginator = sso_admin.get_paginator('list_permission_sets')
     
@@ -21,24 +22,25 @@ def list_permission_sets(sso_admin, dynamodb, instance_arn):
                 'PermissionSetArn': permission_set_arn,
                 'Name': details['Name'],
                 'Description': details.get('Description', ''),
+                'InstanceArn': instance_arn,
                 'UpdatedAt': datetime.now().isoformat()
             })
 
 # Initialize clients
-def initialize_clients():
-    # Initialize required AWS clients
-    sso_admin = boto3.client('sso-admin')
+def initialize_clients(event):
+    # Initialize required AWS clients; Identity Center calls go to the scope's account
+    session = scope_session((event or {}).get('Scope') or {})
+    sso_admin = session.client('sso-admin')
     dynamodb = boto3.resource('dynamodb')
     
-    # Get Identity Store ID
-    sso = boto3.client('sso-admin')
-    instance_arn = sso.list_instances()['Instances'][0]['InstanceArn']
+    # Get the instance ARN
+    instance_arn = resolve_scope((event or {}).get('Scope') or {}, sso_admin)['InstanceArn']
     
     return sso_admin, dynamodb, instance_arn
 
 def lambda_handler(event, context):
 
-    sso_admin, dynamodb, instance_arn = initialize_clients()
+    sso_admin, dynamodb, instance_arn = initialize_clients(event)
 
     # List permission sets
     try:
@@ -3,38 +3,36 @@ import boto3
 import time
 import os
 from datetime import datetime
+from aria_scan import scan_items, scan_lookup
+from aria_assignments import plan_assignment_strategy
+from aria_scope import scope_session, resolve_scope, in_scope
 
-# Get all accounts in the AriaIdCAccounts table
-def get_all_accounts():
-    # List all accounts in AriaIdCAccounts
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('AriaIdCAccounts')
-    response = table.scan()
-    accounts = response['Items']
-    return accounts
-
-# Get all permission sets in the AriaIdCPermissionSets table
-def get_all_permission_sets():
-    # List all permission sets in AriaIdCPermissionSets
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('AriaIdCPermissionSets')
-    response = table.scan()
-    permission_sets = response['Items']
-    return permission_sets
+# 'auto' lets plan_assignments pick the cheaper way to enumerate the account
+# assignments (see aria_assignments); 'principal' or 'pair' forces one.
+ASSIGNMENT_STRATEGY = os.environ.get('ASSIGNMENT_STRATEGY', 'auto')
+
+# Stream the scope's accounts from the AriaIdCAccounts table
+def get_all_accounts(instance_arn):
+    table = boto3.resource('dynamodb').Table('AriaIdCAccounts')
+    return scan_items(table, attributes=['AccountId', 'Name', 'Status'], FilterExpression=in_scope(instance_arn))
+
+# Map the scope's permission set ARNs to their names (AriaIdCPermissionSets)
+def get_permission_set_names(instance_arn):
+    table = boto3.resource('dynamodb').Table('AriaIdCPermissionSets')
+    return scan_lookup(table, 'PermissionSetArn', 'Name', default=None, FilterExpression=in_scope(instance_arn))
 
 # List all provisioned permission sets and store in DynamoDB
 def list_provisioned_permission_sets(sso_admin, dynamodb, instance_arn):
     # List all provisioned permission sets by account and store in DynamoDB
-    print(f"Listing all provisioned permission sets")
+    print(f"Listing all provisioned permission sets of {instance_arn}")
     
     table = dynamodb.Table('AriaIdCProvisionedPermissionSets')
-    organizations = boto3.client('organizations')
-    management_account_id = organizations.describe_organization()["Organization"]["MasterAccountId"]
-    # print(f"Management account ID: {management_account_id}")
 
-    accounts = get_all_accounts()
-    permission_sets = get_all_permission_sets()
-    # print(f"Permission sets from AriaIdCPermissionSets table: {permission_sets}")
+    accounts = get_all_accounts(instance_arn)
+    permission_set_names = get_permission_set_names(instance_arn)
+    pair_count = 0
+    failed = 0
+    skipped = 0
 
     for account in accounts:
         try:
@@ -45,49 +43,94 @@ def list_provisioned_permission_sets(sso_admin, dynamodb, instance_arn):
                 # Skip Management account
             if account['Status'] != 'ACTIVE':
                 print(f"Skipping inactive account {account['AccountId']}")
+                skipped += 1
                 continue
                 # Skip inactive accounts
             else:
-                response = sso_admin.list_permission_sets_provisioned_to_account(
+                # Follow every page: the assignment collectors enumerate assignments per
+                # provisioned pair from this table, so a missing page would drop assignments.
+                provisioned_permission_sets = []
+                paginator = sso_admin.get_paginator('list_permission_sets_provisioned_to_account')
+                for page in paginator.paginate(
                     InstanceArn=instance_arn,
                     AccountId=account['AccountId']
-                )
-                provisioned_permission_sets = response['PermissionSets']
+                ):
+                    provisioned_permission_sets.extend(page.get('PermissionSets', []))
                 # print(f"Provisioned permission sets for account {account['AccountId']}: {provisioned_permission_sets}")
 
                 for permission_set_arn in provisioned_permission_sets:
-                    # Find Name in permission_sets where PermissionSetArn = permission_set_arn
-                    permission_set_name = next((item['Name'] for item in permission_sets if item['PermissionSetArn'] == permission_set_arn), None)
+                    permission_set_name = permission_set_names.get(permission_set_arn)
 
                     table.put_item(Item={
                         'PermissionSetArn': permission_set_arn,
                         'PermissionSetName': permission_set_name,
                         'AccountId': account['AccountId'],
                         'AccountName': account['Name'],
+                        'InstanceArn': instance_arn,
                         'UpdatedAt': datetime.now().isoformat()
                     })
+                    pair_count += 1
         except Exception as e:
             print(f"Error processing account {account['AccountId']}: {str(e)}")
+            failed += 1
+
+    # Accounts that were skipped or failed have no pairs in the table
+    return pair_count, failed, skipped
+
+# Count the scope's rows of a table, reading only its key
+def count_in_scope(dynamodb, table_name, key, instance_arn):
+    table = dynamodb.Table(table_name)
+    return sum(1 for _ in scan_items(table, attributes=[key], FilterExpression=in_scope(instance_arn)))
+
+# Plan how both assignment collectors enumerate the scope's account assignments.
+# They run next, side by side, so the plan is made once here, where the provisioned
+# pairs have just been written, and passed to both by the state machine.
+def plan_assignments(dynamodb, instance_arn, pair_count, failed=0, skipped=0):
+    # The pairs miss the assignments of any account that was skipped or failed,
+    # which the per-principal calls still return
+    if failed or skipped:
+        print(f"Assignment plan: principal strategy, the provisioned pairs are incomplete "
+              f"({failed} accounts failed, {skipped} inactive accounts skipped)")
+        return 'principal'
+    principal_count = (
+        count_in_scope(dynamodb, 'AriaIdCUsers', 'UserId', instance_arn)
+        + count_in_scope(dynamodb, 'AriaIdCGroups', 'GroupId', instance_arn)
+    )
+    # ItemCount is refreshed by DynamoDB about every six hours, so it reflects the
+    # previous run. It covers every scope in the tables, which overstates both
+    # estimates alike.
+    previous_rows = sum(
+        dynamodb.Table(table_name).item_count
+        for table_name in ('AriaIdCUserAccountAssignments', 'AriaIdCGroupAccountAssignments')
+    )
+    strategy, estimates = plan_assignment_strategy(principal_count, pair_count, previous_rows, ASSIGNMENT_STRATEGY)
+    print(f"Assignment plan: {strategy} strategy, estimated calls {estimates} "
+          f"({principal_count} users and groups, {pair_count} provisioned pairs, {previous_rows} previous rows)")
+    return strategy
 
 # Initialize clients
-def initialize_clients():
-    # Initialize required AWS clients
-    sso_admin = boto3.client('sso-admin')
+def initialize_clients(event):
+    # Initialize required AWS clients; Identity Center calls go to the scope's account
+    session = scope_session((event or {}).get('Scope') or {})
+    sso_admin = session.client('sso-admin')
     dynamodb = boto3.resource('dynamodb')
     
-    # Get Identity Store ID
-    sso = boto3.client('sso-admin')
-    instance_arn = sso.list_instances()['Instances'][0]['InstanceArn']
+    # Get the instance ARN
+    instance_arn = resolve_scope((event or {}).get('Scope') or {}, sso_admin)['InstanceArn']
     
     return sso_admin, dynamodb, instance_arn
 
-def empty_provisioned_permission_sets_table():
-    # Empty the provisioned permission sets table
+def empty_provisioned_permission_sets_table(instance_arn):
+    # Empty the scope's rows of the provisioned permission sets table; other
+    # instances collected concurrently keep theirs
     dynamodb = boto3.resource('dynamodb')
     table = dynamodb.Table('AriaIdCProvisionedPermissionSets')
-    scan = table.scan()
     with table.batch_writer() as batch:
-        for each in scan['Items']:
+        for each in scan_items(
+            table,
+            attributes=['PermissionSetArn', 'AccountId'],
+            FilterExpression=in_scope(instance_arn, include_untagged=True)
+        ):
             batch.delete_item(
                 Key={
                     'PermissionSetArn': each['PermissionSetArn'],
@@ -97,21 +140,24 @@ def empty_provisioned_permission_sets_table():
 
 def lambda_handler(event, context):
 
-    sso_admin, dynamodb, instance_arn = initialize_clients()
+    sso_admin, dynamodb, instance_arn = initialize_clients(event)
 
     # List permission sets
     try:
-        empty_provisioned_permission_sets_table()
-        list_provisioned_permission_sets(sso_admin, dynamodb, instance_arn)
+        empty_provisioned_permission_sets_table(instance_arn)
+        pair_count, failed, skipped = list_provisioned_permission_sets(sso_admin, dynamodb, instance_arn)
         print("Listed provisioned permission sets successfully")
         return {
             'statusCode': 200,
-            'body': json.dumps('Listed provisioned permission sets successfully')
+            'body': json.dumps('Listed provisioned permission sets successfully'),
+            'AssignmentStrategy': plan_assignments(dynamodb, instance_arn, pair_count, failed, skipped)
         }
         # Return success response
     except Exception as e:
         print(f"Error listing provisioned permission sets: {e}")
+        # Without the pairs, each assignment collector enumerates its own principals
         return {
             'statusCode': 500,
-            'body': json.dumps('Error listing provisioned permission sets')
+            'body': json.dumps('Error listing provisioned permission sets'),
+            'AssignmentStrategy': 'principal'
         }
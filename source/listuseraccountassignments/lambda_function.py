@@ -1,10 +1,17 @@
+import contextlib
 import json
 import os
 import boto3
-from datetime import datetime, timezone
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.config import Config
 from botocore.exceptions import ClientError
+from aria_executor import SlidingWindowExecutor
+from aria_writer import ParallelBatchWriter
+from aria_scope import scope_session, resolve_scope, in_scope
+from aria_scan import scan_items, scan_lookup
+from aria_assignments import (
+    ASSIGNMENTS_PAGE_SIZE, GROUP_ASSIGNMENT_KEY, USER_ASSIGNMENT_KEY,
+    collect_assignments_for_pair, empty_assignment_rows, user_assignment_row
+)
 
 # Reuse clients/resources across warm invocations. Adaptive retries absorb the
 # throttling that comes with running many SSO Admin calls concurrently, and a
@@ -17,7 +24,7 @@ BOTO_CONFIG = Config(
 sso_admin = boto3.client('sso-admin', config=BOTO_CONFIG)
 dynamodb = boto3.resource('dynamodb')
 
-# Number of principals processed concurrently. list_account_assignments_for_principal
+# Number of principals (or provisioned pairs) processed concurrently. list_account_assignments_for_principal
 # is I/O bound, so threading gives a near-linear speedup despite the GIL.
 MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '15'))
 
@@ -25,156 +32,173 @@ MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '15'))
 # in-flight results can still be flushed to DynamoDB before the Lambda timeout.
 RUNTIME_SAFETY_BUFFER_MS = 30_000
 
+# Threads sending BatchWriteItem calls (see ParallelBatchWriter). Rows are written
+# while the lookups continue, instead of behind them on the main thread.
+WRITE_WORKERS = int(os.environ.get('WRITE_WORKERS', '4'))
 
-def _scan_all(table, **kwargs):
-    # Scan a table fully, following pagination. A plain table.scan() only returns
-    # the first 1 MB page, which silently drops data on larger tables.
-    items = []
-    response = table.scan(**kwargs)
-    items.extend(response.get('Items', []))
-    while 'LastEvaluatedKey' in response:
-        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **kwargs)
-        items.extend(response.get('Items', []))
-    return items
-
+# Parallel segments for scans of the larger tables (see aria_scan.scan_items).
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
 
-def _chunk(items, size):
-    for i in range(0, len(items), size):
-        yield items[i:i + size]
 
+def scope_client(scope):
+    # SSO Admin client for a collection scope (see aria_scope): the module client
+    # for this account, or one from the scope's session (its RoleArn or Region).
+    if not scope.get('RoleArn') and not scope.get('Region'):
+        return sso_admin
+    return scope_session(scope).client('sso-admin', config=BOTO_CONFIG)
 
-def get_instance_arn():
-    # Get the IAM Identity Center instance ARN
-    return sso_admin.list_instances()['Instances'][0]['InstanceArn']
 
-
-def load_permission_set_names():
+def load_permission_set_names(instance_arn):
     # Load PermissionSetArn -> Name once so we never call get_item per assignment.
     permset_table = dynamodb.Table('AriaIdCPermissionSets')
-    return {
-        item['PermissionSetArn']: item.get('Name', 'N/A')
-        for item in _scan_all(permset_table)
-    }
+    return scan_lookup(permset_table, 'PermissionSetArn', 'Name', FilterExpression=in_scope(instance_arn))
 
 
-def load_account_names():
+def load_account_names(instance_arn):
     # Load AccountId -> Name once. This replaces the per-account API/scan work and
     # lets us resolve account names from the assignment response instead.
     accounts_table = dynamodb.Table('AriaIdCAccounts')
-    return {
-        item['AccountId']: item.get('Name', 'N/A')
-        for item in _scan_all(accounts_table)
-    }
-
-
-def collect_assignments_for_user(user, instance_arn, permset_names, account_names):
-    # Return all assignment rows for a single user across every account.
+    return scan_lookup(accounts_table, 'AccountId', 'Name', FilterExpression=in_scope(instance_arn))
+
+
+def load_provisioned_pairs(instance_arn):
+    # (AccountId, PermissionSetArn) pairs written by ListProvisionedPermissionSets,
+    # which the state machine runs before this function.
+    table = dynamodb.Table('AriaIdCProvisionedPermissionSets')
+    return sorted({
+        (item['AccountId'], item['PermissionSetArn'])
+        for item in scan_items(
+            table,
+            attributes=['AccountId', 'PermissionSetArn'],
+            segments=SCAN_SEGMENTS,
+            FilterExpression=in_scope(instance_arn)
+        )
+    })
+
+
+def load_names(table_name, key, value, instance_arn):
+    # Only the two attributes the lookups use, not the whole user or group item.
+    return scan_lookup(
+        dynamodb.Table(table_name), key, value,
+        segments=SCAN_SEGMENTS, FilterExpression=in_scope(instance_arn)
+    )
+
+
+def collect_assignments_for_user(sso_admin, user, instance_arn, permset_names, account_names):
+    # Return all assignment rows for a single user across every account, and the
+    # number of API calls made.
     #
     # The AccountId filter is intentionally omitted: a single paginated call to
     # list_account_assignments_for_principal returns the user's assignments in all
     # accounts. This collapses the previous users x accounts API explosion down to
     # one call per user, and the response already carries the AccountId.
-    user_id = user['UserId']
-    user_name = user.get('UserName', 'N/A')
+    user_id, user_name = user
     rows = []
+    calls = 0
 
     paginator = sso_admin.get_paginator('list_account_assignments_for_principal')
     for page in paginator.paginate(
         InstanceArn=instance_arn,
         PrincipalType='USER',
-        PrincipalId=user_id
+        PrincipalId=user_id,
+        PaginationConfig={'PageSize': ASSIGNMENTS_PAGE_SIZE}
     ):
+        calls += 1
         for assignment in page['AccountAssignments']:
-            account_id = assignment['AccountId']
-            permset_arn = assignment['PermissionSetArn']
-            rows.append({
-                'AccountId': account_id,
-                # Composite sort key that makes each (user, permission set) unique
-                # within an account. UserId and PermissionSetArn are also stored as
-                # their own attributes below for the graph export.
-                'UserPermissionSet': f"{user_id}#{permset_arn}",
-                'UserId': user_id,
-                'PrincipalType': 'USER',
-                'PrincipalName': user_name,
-                'AccountName': account_names.get(account_id, 'N/A'),
-                'PermissionSetArn': permset_arn,
-                'Name': permset_names.get(permset_arn, 'N/A'),
-                'UpdatedAt': datetime.now(timezone.utc).isoformat()
-            })
-    return rows
-
-
-def empty_user_account_assignments_table(table):
-    # Remove all existing rows before repopulating, so assignments that were
-    # revoked since the last run do not linger as stale graph edges. The table is
-    # fully rebuilt on every run.
-    with table.batch_writer() as batch:
-        for item in _scan_all(table, ProjectionExpression='AccountId, UserPermissionSet'):
-            batch.delete_item(Key={
-                'AccountId': item['AccountId'],
-                'UserPermissionSet': item['UserPermissionSet']
-            })
-
-
-def list_account_assignments_for_users(instance_arn, context):
-    # List all account assignments for users and store them in DynamoDB.
-    print("Listing all account assignments for USER principals")
-
-    table = dynamodb.Table('AriaIdCUserAccountAssignments')
-    users = _scan_all(dynamodb.Table('AriaIdCUsers'))
-    permset_names = load_permission_set_names()
-    account_names = load_account_names()
-
-    empty_user_account_assignments_table(table)
-
-    total = len(users)
-    processed = 0
+            rows.append(user_assignment_row(
+                user_id, user_name, assignment['AccountId'], assignment['PermissionSetArn'],
+                instance_arn, permset_names, account_names
+            ))
+    return rows, calls
+
+
+def list_account_assignments_for_users(sso_admin, instance_arn, context, strategy):
+    # List all account assignments for users and store them in DynamoDB. With the
+    # 'pair' strategy (planned by ListProvisionedPermissionSets, see
+    # aria_assignments) the group assignments of the same responses are written
+    # to AriaIdCGroupAccountAssignments too.
+    print(f"Listing all account assignments for USER principals ({strategy} strategy)")
+
+    user_table = dynamodb.Table('AriaIdCUserAccountAssignments')
+    group_table = dynamodb.Table('AriaIdCGroupAccountAssignments')
+    user_names = load_names('AriaIdCUsers', 'UserId', 'UserName', instance_arn)
+    permset_names = load_permission_set_names(instance_arn)
+    account_names = load_account_names(instance_arn)
+
+    if strategy == 'pair':
+        group_names = load_names('AriaIdCGroups', 'GroupId', 'GroupName', instance_arn)
+        work = load_provisioned_pairs(instance_arn)
+        collect = lambda pair: collect_assignments_for_pair(
+            sso_admin, pair, instance_arn, user_names, group_names, permset_names, account_names
+        )
+        tables = [(user_table, USER_ASSIGNMENT_KEY), (group_table, GROUP_ASSIGNMENT_KEY)]
+    else:
+        work = sorted(user_names.items())
+        collect = lambda user: collect_assignments_for_user(
+            sso_admin, user, instance_arn, permset_names, account_names
+        )
+        tables = [(user_table, USER_ASSIGNMENT_KEY)]
+
+    for table, key_names in tables:
+        empty_assignment_rows(table, key_names, instance_arn, WRITE_WORKERS, SCAN_SEGMENTS)
+
+    total = len(work)
     written = 0
-    print(f"Processing {total} users with up to {MAX_WORKERS} workers")
+    calls = 0
+    print(f"Processing {total} {'provisioned pairs' if strategy == 'pair' else 'users'} with up to {MAX_WORKERS} workers")
 
-    # batch_writer batches up to 25 writes per request and handles retries. It is
-    # driven only from this main thread, so it stays thread-safe while worker
-    # threads perform the (read-only) API lookups.
-    #
-    # overwrite_by_pkeys de-duplicates the buffer on the full primary key so that
-    # any repeated (AccountId, UserPermissionSet) within a flush window cannot
+    # The main thread hands the rows of each finished item to the writers, whose
+    # threads send the 25-row batches while the lookups go on. The writers
+    # de-duplicate each batch on the full primary key, so a repeated key cannot
     # trigger the "list of item keys contains duplicates" BatchWriteItem error.
-    with table.batch_writer(overwrite_by_pkeys=['AccountId', 'UserPermissionSet']) as batch:
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            for chunk in _chunk(users, MAX_WORKERS):
-                if context is not None and context.get_remaining_time_in_millis() < RUNTIME_SAFETY_BUFFER_MS:
-                    print(f"Approaching Lambda timeout; stopping after {processed}/{total} users")
-                    break
-
-                future_to_user = {
-                    executor.submit(
-                        collect_assignments_for_user, user, instance_arn, permset_names, account_names
-                    ): user
-                    for user in chunk
-                }
-                for future in as_completed(future_to_user):
-                    user = future_to_user[future]
-                    try:
-                        for row in future.result():
-                            batch.put_item(Item=row)
-                            written += 1
-                    except Exception as e:
-                        print(f"Error processing assignments for user {user.get('UserId')}: {e}")
-                processed += len(chunk)
-
-    print(f"Wrote {written} assignment rows for {processed}/{total} users")
+    #
+    # The executor keeps MAX_WORKERS lookups in flight, refilling a slot as soon as
+    # any item finishes, and stops starting new items near the Lambda timeout.
+    window = SlidingWindowExecutor(MAX_WORKERS, context, RUNTIME_SAFETY_BUFFER_MS)
+    writers = [
+        ParallelBatchWriter(table, key_names, writers=WRITE_WORKERS)
+        for table, key_names in tables
+    ]
+    with contextlib.ExitStack() as stack:
+        for writer in writers:
+            stack.enter_context(writer)
+        for item, future in window.run(collect, work):
+            try:
+                *row_sets, item_calls = future.result()
+                calls += item_calls
+                for writer, rows in zip(writers, row_sets):
+                    for row in rows:
+                        writer.put_item(row)
+                        written += 1
+            except Exception as e:
+                label = item[0] if strategy == 'principal' else item
+                print(f"Error processing assignments for {label}: {e}")
+
+    processed = window.completed
+    if window.out_of_time:
+        print(f"Approaching Lambda timeout; stopped after {processed}/{total} items")
+    print(f"Wrote {written} assignment rows for {processed}/{total} items")
+    for writer in writers:
+        print(f"Writes: {writer.report()}")
+    print(f"Assignment plan: {strategy} strategy, made {calls} calls")
     return processed, total
 
 
 def lambda_handler(event, context):
 
-    instance_arn = get_instance_arn()
+    # The Identity Center instance to collect, from the state machine's Scope, and
+    # the enumeration strategy ListProvisionedPermissionSets planned for it
+    event = event or {}
+    scope = event.get('Scope') or {}
+    strategy = event.get('AssignmentStrategy') or 'principal'
+    client = scope_client(scope)
+    instance_arn = resolve_scope(scope, client)['InstanceArn']
 
     # List account assignments for all users
     try:
-        processed, total = list_account_assignments_for_users(instance_arn, context)
+        processed, total = list_account_assignments_for_users(client, instance_arn, context, strategy)
         complete = processed >= total
-        message = f"Listed account assignments for {processed}/{total} USER principals"
+        message = f"Listed account assignments for USER principals ({processed}/{total} items)"
         print(message)
         return {
             'statusCode': 200,
@@ -2,41 +2,48 @@ import json
 import boto3
 import time
 from datetime import datetime
+from aria_scope import scope_session, resolve_scope, sweep_scope
 
 # List all users and store in DynamoDB
-def list_users(identitystore, dynamodb, identity_store_id):
-    print(f"Listing all users")
+def list_users(identitystore, dynamodb, scope):
+    print(f"Listing all users of {scope['InstanceArn']}")
+    started_at = datetime.now().isoformat()
     table = dynamodb.Table('AriaIdCUsers')
     paginator = identitystore.get_paginator('list_users')
     
-    for page in paginator.paginate(IdentityStoreId=identity_store_id):
+    for page in paginator.paginate(IdentityStoreId=scope['IdentityStoreId']):
         for user in page['Users']:
             table.put_item(Item={
                 'UserId': user['UserId'],
                 'UserName': user['UserName'],
                 'Email': user.get('Emails', [{}])[0].get('Value', ''),
+                'InstanceArn': scope['InstanceArn'],
                 'UpdatedAt': datetime.now().isoformat()
             })
 
-# Initialize clients and get Identity Store ID
-def initialize_clients():
-    # Initialize required AWS clients
-    identitystore = boto3.client('identitystore')
+    # Every user was listed; remove the ones deleted since the last run
+    sweep_scope(table, ['UserId'], scope['InstanceArn'], started_at)
+
+# Initialize clients and resolve the instance to collect
+def initialize_clients(event):
+    # Initialize required AWS clients; Identity Center calls go to the scope's account
+    session = scope_session((event or {}).get('Scope') or {})
+    identitystore = session.client('identitystore')
     dynamodb = boto3.resource('dynamodb')
     
-    # Get Identity Store ID
-    sso = boto3.client('sso-admin')
-    identity_store_id = sso.list_instances()['Instances'][0]['IdentityStoreId']
+    # Get Identity Store ID and instance ARN
+    sso = session.client('sso-admin')
+    scope = resolve_scope((event or {}).get('Scope') or {}, sso)
     
-    return identitystore, dynamodb, identity_store_id
+    return identitystore, dynamodb, scope
 
 def lambda_handler(event, context):
 
-    identitystore, dynamodb, identity_store_id = initialize_clients()
+    identitystore, dynamodb, scope = initialize_clients(event)
 
     # List users
     try:
-        list_users(identitystore, dynamodb, identity_store_id)
+        list_users(identitystore, dynamodb, scope)
         print("Listed users successfully")
         return {
             'statusCode': 200,
@@ -2,8 +2,116 @@ import boto3
 import csv
 import io
 import json
+import os
+from datetime import datetime, timezone
+import struct
+import sys
 import uuid
+from array import array
+from itertools import chain
 from botocore.exceptions import ClientError
+from aria_scan import scan_items
+
+# Neptune imports every object under GRAPH_PREFIX, so only the bulk-load CSVs may
+# be written there. Other artifacts built from the export go under their own prefix.
+GRAPH_PREFIX = 'graph/'
+SNAPSHOT_KEY = 'snapshot/aria-graph.snap'
+STATS_KEY = 'stats/aria-graph-stats.json'
+
+# Parallel segments for the table scans (see aria_scan.scan_items).
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
+
+# Binary graph snapshot, written next to the CSVs so tools can mmap the graph and
+# traverse it without parsing. All integers are little-endian.
+#   header     8s magic, u32 version, u32 section count
+#   directory  per section: 64s name (NUL padded), u64 offset, u64 length in bytes
+#   sections   each starts on an 8-byte boundary
+# Sections:
+#   strings.data, strings.offsets   UTF-8 string pool and u32[S+1] offsets into it
+#   nodes.id, nodes.label           u32[N] string indexes, nodes sorted by ~id
+#   labels                          u32 string indexes of the node labels present
+#   label.<Label>                   u32 indexes of the nodes with that label
+#   prop.<name>                     u32[N] string index per node, SNAPSHOT_NONE if unset
+#   out.<EDGE>.offsets, .targets    CSR adjacency: u32[N+1] offsets, u32[E] targets
+#   in.<EDGE>.offsets, .targets     the same for the reverse direction
+SNAPSHOT_MAGIC = b'ARIAGRPH'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_NONE = 0xFFFFFFFF
+
+# Access Analyzer action names are classified by verb, roughly along IAM access levels.
+# Anything that is not a read is a write; deletes and permission changes are writes too.
+READ_VERB_PREFIXES = ('Get', 'List', 'Describe', 'Head', 'Select', 'Scan', 'Query', 'BatchGet', 'Lookup', 'Search', 'View', 'Read', 'Check', 'Download')
+DELETE_VERB_PREFIXES = ('Delete', 'BatchDelete', 'Remove', 'Terminate', 'Purge', 'Destroy')
+PERMISSIONS_VERB_WORDS = ('Policy', 'Permission', 'Acl', 'Grant', 'Revoke', 'PassRole')
+
+# Parses a finding's comma-joined Action string ("s3:GetObject, s3:PutObject") once, into
+# the IsRead/IsWrite/IsDelete/IsPermissionsMgmt flags and the Services it touches.
+# A "*" verb (or a bare "*") sets every flag.
+def classify_actions(item):
+    flags = {'IsRead': False, 'IsWrite': False, 'IsDelete': False, 'IsPermissionsMgmt': False}
+    services = set()
+    for action in (item.get('Action') or '').split(','):
+        action = action.strip()
+        if not action:
+            continue
+        service, _, verb = action.rpartition(':')
+        if service:
+            services.add(service.lower())
+        if verb in ('', '*'):
+            flags = dict.fromkeys(flags, True)
+            continue
+        if verb.startswith(READ_VERB_PREFIXES):
+            flags['IsRead'] = True
+            continue
+        flags['IsWrite'] = True
+        if verb.startswith(DELETE_VERB_PREFIXES):
+            flags['IsDelete'] = True
+        if any(word in verb for word in PERMISSIONS_VERB_WORDS):
+            flags['IsPermissionsMgmt'] = True
+    enriched = dict(item)
+    enriched.update({name: 'true' if value else 'false' for name, value in flags.items()})
+    enriched['Services'] = ';'.join(sorted(services))
+    return enriched
+
+# Lower-cased copy of a node's name, stored as name_lc so the MCP server can compare names
+# with equality or STARTS WITH instead of toLower(...) CONTAINS on every node.
+def add_name_key(field):
+    def enrich(item):
+        enriched = dict(item)
+        enriched['NameLc'] = (item.get(field) or '').lower()
+        return enriched
+    return enrich
+
+# Splits an ARN (arn:partition:service:region:account:resource) into the components stored
+# on CriticalResources. The resource part is "type/name", "type:name" or just "name";
+# S3 ARNs carry no type (the bucket, or bucket/key, is the name) and IAM names drop the path.
+# Returns None when the value is not an ARN.
+def parse_arn(arn):
+    parts = (arn or '').split(':', 5)
+    if len(parts) != 6 or parts[0] != 'arn':
+        return None
+    _, partition, service, region, account, resource = parts
+    resource_type, resource_name = '', resource
+    if service != 's3':
+        cut = min((i for i in (resource.find('/'), resource.find(':')) if i >= 0), default=-1)
+        if cut >= 0:
+            resource_type, resource_name = resource[:cut], resource[cut + 1:]
+        if service == 'iam':
+            resource_name = resource_name.rsplit('/', 1)[-1]
+    return {
+        'ArnPartition': partition,
+        'ArnService': service,
+        'ArnRegion': region,
+        'ArnAccount': account,
+        'ArnResourceType': resource_type,
+        'ArnResourceName': resource_name,
+    }
+
+def add_arn_components(item):
+    enriched = dict(item)
+    enriched.update(parse_arn(item.get('ResourceARN')) or {})
+    enriched['NameLc'] = enriched.get('ArnResourceName', '').lower()
+    return enriched
 
 # This function uses the standard python csv library, semgrep may flag this as a potential for a malicious csv to be
 # created, however all csv generation is programmatic with no user input so the risk is low
@@ -47,20 +155,326 @@ def remove_duplicates_from_items(items, unique_key_fields):
     
     return list(unique_items.values())
 
-def export_dynamodb_to_s3(dynamodb_table, s3_bucket, s3_key, table_headers, csv_headers, generate_uuid=False, label=None, dedup_fields=None):
+# Collects the rows of every exported CSV and lays them out in the binary snapshot
+# format described at the top of this file. Rows of the same node ~id are merged,
+# as in the Neptune import. Edges are kept per (src, dst) pair with the number of rows
+# that named it: the snapshot's adjacency lists hold each pair once, while the stats
+# count every loaded edge (e.g. one EFFECTIVELY_ASSIGNED row per permission set
+# between the same user and account).
+class GraphSnapshotBuilder:
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+
+    def add_csv(self, csv_data):
+        rows = csv.reader(io.StringIO(csv_data))
+        header = next(rows, None)
+        if not header:
+            return
+        if '~from' in header:
+            src, dst, label = header.index('~from'), header.index('~to'), header.index('~label')
+            for row in rows:
+                if row and row[src] and row[dst]:
+                    pairs = self.edges.setdefault(row[label], {})
+                    pairs[(row[src], row[dst])] = pairs.get((row[src], row[dst]), 0) + 1
+            return
+        id_col, label_col = header.index('~id'), header.index('~label')
+        # "username:String" -> "username"
+        props = [(i, h.split(':', 1)[0]) for i, h in enumerate(header) if not h.startswith('~')]
+        # A node id in several files (e.g. the rollups) has its properties merged,
+        # as in the Neptune import; the first label and first value of each win.
+        for row in rows:
+            if not row or not row[id_col]:
+                continue
+            label, values = self.nodes.setdefault(row[id_col], (row[label_col], {}))
+            if not label and row[label_col]:
+                self.nodes[row[id_col]] = (row[label_col], values)
+            for i, name in props:
+                if row[i] != '':
+                    values.setdefault(name, row[i])
+
+    # Properties computed after the CSVs were read (the rollups). They do not
+    # replace values the node already has.
+    def add_properties(self, node_id, values):
+        if node_id in self.nodes:
+            props = self.nodes[node_id][1]
+            for name, value in values.items():
+                props.setdefault(name, str(value))
+
+    def build(self):
+        strings = {}
+
+        def intern(value):
+            return strings.setdefault(value, len(strings))
+
+        # Edge endpoints without a node row still get an index, as Neptune creates them.
+        ids = set(self.nodes)
+        for pairs in self.edges.values():
+            for src, dst in pairs:
+                ids.add(src)
+                ids.add(dst)
+        ids = sorted(ids)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        node_count = len(ids)
+
+        node_ids = array('I', (intern(node_id) for node_id in ids))
+        node_labels = array('I', [SNAPSHOT_NONE]) * node_count
+        by_label = {}
+        props = {}
+        for node_id, (label, values) in self.nodes.items():
+            i = index[node_id]
+            if label:
+                node_labels[i] = intern(label)
+                by_label.setdefault(label, []).append(i)
+            for name, value in values.items():
+                if name not in props:
+                    props[name] = array('I', [SNAPSHOT_NONE]) * node_count
+                props[name][i] = intern(value)
+
+        sections = [
+            ('nodes.id', node_ids),
+            ('nodes.label', node_labels),
+            ('labels', array('I', (intern(label) for label in sorted(by_label)))),
+        ]
+        for label in sorted(by_label):
+            sections.append((f'label.{label}', array('I', sorted(by_label[label]))))
+        for name in sorted(props):
+            sections.append((f'prop.{name}', props[name]))
+        for label in sorted(self.edges):
+            pairs = [(index[src], index[dst]) for src, dst in self.edges[label]]
+            for direction, directed in (('out', pairs), ('in', [(d, s) for s, d in pairs])):
+                offsets, targets = build_csr(node_count, directed)
+                sections.append((f'{direction}.{label}.offsets', offsets))
+                sections.append((f'{direction}.{label}.targets', targets))
+
+        # dicts keep insertion order, so the pool lines up with the interned indexes
+        pool = [value.encode('utf-8') for value in strings]
+        string_offsets = array('I', [0])
+        for data in pool:
+            string_offsets.append(string_offsets[-1] + len(data))
+        sections = [('strings.data', b''.join(pool)), ('strings.offsets', string_offsets)] + sections
+        return pack_snapshot(sections)
+
+def build_csr(node_count, pairs):
+    pairs = sorted(pairs)
+    offsets = array('I', [0]) * (node_count + 1)
+    for src, _ in pairs:
+        offsets[src + 1] += 1
+    for i in range(node_count):
+        offsets[i + 1] += offsets[i]
+    targets = array('I', (dst for _, dst in pairs))
+    return offsets, targets
+
+def pack_snapshot(sections):
+    start = 16 + 80 * len(sections)
+    start += -start % 8
+    directory = []
+    body = bytearray()
+    for name, data in sections:
+        if isinstance(data, array):
+            if sys.byteorder == 'big':
+                data = array(data.typecode, data)
+                data.byteswap()
+            data = data.tobytes()
+        directory.append(struct.pack('<64sQQ', name.encode('utf-8'), start + len(body), len(data)))
+        body += data
+        body += b'\0' * (-len(body) % 8)
+    head = struct.pack('<8sII', SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections)) + b''.join(directory)
+    return head + b'\0' * (start - len(head)) + bytes(body)
+
+def export_dynamodb_to_s3(dynamodb_table, s3_bucket, s3_key, table_headers, csv_headers, generate_uuid=False, label=None, dedup_fields=None, snapshot=None, enrich=None):
+    s3_key = f"{GRAPH_PREFIX}{s3_key}"
     print(f"Exporting {dynamodb_table} to {s3_bucket}/{s3_key}")
-    dynamodb = boto3.resource('dynamodb')
     s3 = boto3.client('s3')
     s3.delete_object(Bucket=s3_bucket, Key=s3_key)
-    table = dynamodb.Table(dynamodb_table)
-    response = table.scan()
-    items = response['Items']
-    if items:
+    # Every page, so the node and edge files see the same rows as the
+    # effective assignments built from scan_table. Only the exported columns
+    # are read, and rows are streamed into the CSV.
+    items = scan_table(dynamodb_table, table_headers + (dedup_fields or []))
+    first = next(items, None)
+    if first is not None:
+        items = chain([first], items)
         if dedup_fields:
             items = remove_duplicates_from_items(items, dedup_fields)
+        if enrich:
+            items = (enrich(item) for item in items)
         csv_data = convert_to_csv(items, table_headers, csv_headers, generate_uuid, label)
         s3.put_object(Bucket=s3_bucket, Key=s3_key, Body=csv_data)
         print(f"Data exported to S3: {s3_bucket}/{s3_key}")
+        if snapshot is not None:
+            snapshot.add_csv(csv_data)
+
+# Stream a table's items, reading only `attributes` (names the table lacks, such as
+# the computed columns, are simply absent from the items)
+def scan_table(dynamodb_table, attributes):
+    table = boto3.resource('dynamodb').Table(dynamodb_table)
+    return scan_items(table, attributes=list(dict.fromkeys(attributes)), segments=SCAN_SEGMENTS)
+
+# Flattens group membership into one EFFECTIVELY_ASSIGNED row per (user, permission set,
+# account), so principal queries need a single hop instead of expanding
+# (User)<-[:HAS_MEMBERS]-(Group)-[:ASSIGNED_PERMISSIONSET]->(PermissionSet) at query time.
+# Hash join: the membership table is built into GroupId -> users, and each group
+# assignment row probes it. ViaGroups lists the groups the assignment comes through
+# (';'-joined GroupIds); Direct is true when the user is also assigned it directly.
+def build_effective_assignments(memberships, user_assignments, group_assignments):
+    members = {}
+    for row in memberships:
+        if row.get('GroupId') and row.get('UserId'):
+            members.setdefault(row['GroupId'], set()).add(row['UserId'])
+
+    effective = {}
+    def entry(user_id, row):
+        key = (user_id, row['PermissionSetArn'], row.get('AccountId', ''))
+        if key not in effective:
+            effective[key] = {'direct': False, 'groups': set()}
+        return effective[key]
+
+    for row in user_assignments:
+        if row.get('UserId') and row.get('PermissionSetArn'):
+            entry(row['UserId'], row)['direct'] = True
+    for row in group_assignments:
+        if not row.get('PermissionSetArn'):
+            continue
+        for user_id in members.get(row.get('GroupId'), ()):
+            entry(user_id, row)['groups'].add(row['GroupId'])
+
+    return [
+        {
+            'UserId': user_id,
+            'PermissionSetArn': permission_set_arn,
+            'AccountId': account_id,
+            'ViaGroups': ';'.join(sorted(value['groups'])),
+            'Direct': 'true' if value['direct'] else 'false',
+        }
+        for (user_id, permission_set_arn, account_id), value in sorted(effective.items())
+    ]
+
+def export_effective_assignments(s3_bucket, s3_key, snapshot=None):
+    s3_key = f"{GRAPH_PREFIX}{s3_key}"
+    print(f"Exporting effective assignments to {s3_bucket}/{s3_key}")
+    s3 = boto3.client('s3')
+    s3.delete_object(Bucket=s3_bucket, Key=s3_key)
+    items = build_effective_assignments(
+        scan_table("AriaIdCGroupMembership", ["GroupId", "UserId"]),
+        scan_table("AriaIdCUserAccountAssignments", ["UserId", "PermissionSetArn", "AccountId"]),
+        scan_table("AriaIdCGroupAccountAssignments", ["GroupId", "PermissionSetArn", "AccountId"]),
+    )
+    if items:
+        table_headers = ["UniqueId", "UserId", "PermissionSetArn", "Label", "AccountId", "ViaGroups", "Direct"]
+        csv_headers = ["~id", "~from", "~to", "~label", "accountid:String", "viagroups:String", "direct:Bool"]
+        csv_data = convert_to_csv(items, table_headers, csv_headers, generate_uuid=True, label="EFFECTIVELY_ASSIGNED")
+        s3.put_object(Bucket=s3_bucket, Key=s3_key, Body=csv_data)
+        print(f"{len(items)} effective assignments exported to S3: {s3_bucket}/{s3_key}")
+        if snapshot is not None:
+            snapshot.add_csv(csv_data)
+    return items
+
+def degree_summary(degrees):
+    values = sorted(degrees)
+    if not values:
+        return {'nodes': 0}
+    return {
+        'nodes': len(values),
+        'min': values[0],
+        'max': values[-1],
+        'mean': round(sum(values) / len(values), 2),
+        'p50': values[len(values) // 2],
+        'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+    }
+
+# Label and edge counts, degree distributions, and per-account / per-permission-set
+# rollups, from the rows the export has already read (the snapshot builder holds every
+# node and edge; `effective` is the EFFECTIVELY_ASSIGNED rows). The rollup counts are
+# distinct users/roles/etc.
+def compute_graph_stats(snapshot, effective):
+    label_counts = {}
+    for label, _ in snapshot.nodes.values():
+        label_counts[label] = label_counts.get(label, 0) + 1
+
+    degrees = {}
+    per_node = {}
+    for label, pairs in snapshot.edges.items():
+        # Degrees count every edge row; the rollups below count distinct neighbours.
+        out_degree, in_degree = {}, {}
+        out_distinct, in_distinct = {}, {}
+        for (src, dst), rows in pairs.items():
+            out_degree[src] = out_degree.get(src, 0) + rows
+            in_degree[dst] = in_degree.get(dst, 0) + rows
+            out_distinct[src] = out_distinct.get(src, 0) + 1
+            in_distinct[dst] = in_distinct.get(dst, 0) + 1
+        degrees[label] = {'out': degree_summary(out_degree.values()), 'in': degree_summary(in_degree.values())}
+        per_node[label] = (out_distinct, in_distinct)
+
+    def edge_count(label, direction, node_id):
+        counts = per_node.get(label, ({}, {}))[0 if direction == 'out' else 1]
+        return counts.get(node_id, 0)
+
+    users = {}
+    for row in effective:
+        for node_id in (row['AccountId'], row['PermissionSetArn']):
+            sets = users.setdefault(node_id, (set(), set(), set()))
+            sets[0].add(row['UserId'])
+            if row['Direct'] == 'true':
+                sets[1].add(row['UserId'])
+            if row['ViaGroups']:
+                sets[2].add(row['UserId'])
+
+    def user_counts(node_id):
+        all_users, direct, via_groups = users.get(node_id, (set(), set(), set()))
+        return {'userscount': len(all_users), 'directuserscount': len(direct), 'groupuserscount': len(via_groups)}
+
+    accounts, permission_sets = {}, {}
+    for node_id, (label, props) in snapshot.nodes.items():
+        if label == 'AccountName':
+            accounts[node_id] = {
+                'name': props.get('name', ''),
+                **user_counts(node_id),
+                'permissionsetscount': edge_count('PROVISIONED_INTO', 'in', node_id),
+                'rolescount': edge_count('CREATED_IN', 'in', node_id),
+                'resourcescount': edge_count('BELONGS_TO', 'in', node_id),
+            }
+        elif label == 'PermissionSet':
+            permission_sets[node_id] = {
+                'name': props.get('name', ''),
+                **user_counts(node_id),
+                'accountscount': edge_count('PROVISIONED_INTO', 'out', node_id),
+                'rolescount': edge_count('CREATED_AS', 'out', node_id),
+            }
+
+    return {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'nodes': label_counts,
+        'edges': {label: sum(pairs.values()) for label, pairs in snapshot.edges.items()},
+        'degrees': degrees,
+        'accounts': accounts,
+        'permission_sets': permission_sets,
+    }
+
+# Writes the rollups as extra properties of the AccountName and PermissionSet nodes
+# (Neptune merges the properties of a node id that appears in several files) and the
+# whole stats document as JSON outside the graph prefix.
+def export_graph_stats(s3_bucket, stats, snapshot):
+    s3 = boto3.client('s3')
+    rollups = [
+        ("AriaIdCAccountRollups.csv", "AccountName", stats['accounts'],
+         ["userscount", "directuserscount", "groupuserscount", "permissionsetscount", "rolescount", "resourcescount"]),
+        ("AriaIdCPermissionSetRollups.csv", "PermissionSet", stats['permission_sets'],
+         ["userscount", "directuserscount", "groupuserscount", "accountscount", "rolescount"]),
+    ]
+    for s3_key, label, values, fields in rollups:
+        s3_key = f"{GRAPH_PREFIX}{s3_key}"
+        s3.delete_object(Bucket=s3_bucket, Key=s3_key)
+        if not values:
+            continue
+        items = [{'Id': node_id, **{f: v[f] for f in fields}} for node_id, v in values.items()]
+        csv_data = convert_to_csv(items, ["Id", "Label"] + fields, ["~id", "~label"] + [f"{f}:Int" for f in fields], label=label)
+        s3.put_object(Bucket=s3_bucket, Key=s3_key, Body=csv_data)
+        print(f"Rollups exported to S3: {s3_bucket}/{s3_key}")
+        for node_id, v in values.items():
+            snapshot.add_properties(node_id, {f: v[f] for f in fields})
+
+    s3.put_object(Bucket=s3_bucket, Key=STATS_KEY, Body=json.dumps(stats), ContentType='application/json')
+    print(f"Graph stats written to S3: {s3_bucket}/{STATS_KEY}")
 
 def check_table_has_items(dynamodb_table):
     try:
@@ -89,51 +503,60 @@ def lambda_handler(event, context):
     
     # The s3bucket parameter is passed in to the function from the calling step function
     s3_bucket = event['s3bucket']
+    snapshot = GraphSnapshotBuilder()
 
 #NODES
     # Export AriaIdCUsers to csv file
-    table_headers = ["UserId", "UserName", "Label"]
-    csv_headers = ["~id", "username:String","~label"]
-    export_dynamodb_to_s3("AriaIdCUsers", s3_bucket, "AriaIdCUsers.csv", table_headers, csv_headers,label="UserName")
+    # NameLc (name_lc) is the lower-cased name, see add_name_key. InstanceArn is the
+    # Identity Center instance (collection scope) the row was collected from.
+    table_headers = ["UserId", "UserName", "NameLc", "InstanceArn", "Label"]
+    csv_headers = ["~id", "username:String", "name_lc:String", "instancearn:String", "~label"]
+    export_dynamodb_to_s3("AriaIdCUsers", s3_bucket, "AriaIdCUsers.csv", table_headers, csv_headers,label="UserName", snapshot=snapshot, enrich=add_name_key("UserName"))
 
     # Export AriaIdCGroups to csv file
-    table_headers = ["GroupId", "GroupName", "Label"]
-    csv_headers = ["~id", "groupname:String","~label"]
-    export_dynamodb_to_s3("AriaIdCGroups", s3_bucket, "AriaIdCGroups.csv", table_headers, csv_headers,label="GroupName")
+    table_headers = ["GroupId", "GroupName", "NameLc", "InstanceArn", "Label"]
+    csv_headers = ["~id", "groupname:String", "name_lc:String", "instancearn:String", "~label"]
+    export_dynamodb_to_s3("AriaIdCGroups", s3_bucket, "AriaIdCGroups.csv", table_headers, csv_headers,label="GroupName", snapshot=snapshot, enrich=add_name_key("GroupName"))
 
     # Export AriaIdCPermissionSets to csv file
-    table_headers = ["PermissionSetArn", "Name", "Description", "Label"]
-    csv_headers = ["~id", "name:String", "description:String","~label"]
-    export_dynamodb_to_s3("AriaIdCPermissionSets", s3_bucket, "AriaIdCPermissionSets.csv", table_headers, csv_headers,label="PermissionSet")
+    table_headers = ["PermissionSetArn", "Name", "Description", "NameLc", "InstanceArn", "Label"]
+    csv_headers = ["~id", "name:String", "description:String", "name_lc:String", "instancearn:String", "~label"]
+    export_dynamodb_to_s3("AriaIdCPermissionSets", s3_bucket, "AriaIdCPermissionSets.csv", table_headers, csv_headers,label="PermissionSet", snapshot=snapshot, enrich=add_name_key("Name"))
 
     # Export AriaIdCAccounts to csv file
-    table_headers = ["AccountId", "Name", "Label"]
-    csv_headers = ["~id", "name:String","~label"]
-    export_dynamodb_to_s3("AriaIdCAccounts", s3_bucket, "AriaIdCAccounts.csv", table_headers, csv_headers,label="AccountName")
+    table_headers = ["AccountId", "Name", "NameLc", "InstanceArn", "Label"]
+    csv_headers = ["~id", "name:String", "name_lc:String", "instancearn:String", "~label"]
+    export_dynamodb_to_s3("AriaIdCAccounts", s3_bucket, "AriaIdCAccounts.csv", table_headers, csv_headers,label="AccountName", snapshot=snapshot, enrich=add_name_key("Name"))
 
     # Export AriaIdCIAMRoles to csv file
     table_headers = ["IamRoleArn", "AccountId", "RoleId", "RoleName", "AttachedPolicies", "Label"]
     csv_headers = ["~id", "accountid:String", "roleid:String", "rolename:String", "attachedpolicies:String","~label"]
-    export_dynamodb_to_s3("AriaIdCIAMRoles", s3_bucket, "AriaIdCIAMRoles.csv", table_headers, csv_headers,label="RoleName")
+    export_dynamodb_to_s3("AriaIdCIAMRoles", s3_bucket, "AriaIdCIAMRoles.csv", table_headers, csv_headers,label="RoleName", snapshot=snapshot)
 
     # Only export Internal Access Analyzer Findings if the table has items
     if check_table_has_items("AriaIdCInternalAAFindings"):
         #Export InternalAccessAnalyzerFindings to csv file
-        table_headers = ["FindingId", "ResourceARN", "FindingType", "AccessType", "Principal", "PrincipalName", "PrincipalOwnerAccount", "ResourceType", "Action", "ResourceControlPolicyRestrictionType", "ServiceControlPolicyRestrictionType", "Status", "NumberofUnusedActions", "NumberofUnusedServices", "Label"]
-        csv_headers = ["~id", "resourcearn:String", "findingtype:String", "accesstype:String", "principal:String", "principalname:String", "principalowneraccount:String", "resourcetype:String", "action:String", "resourcecontrolpolicyrestrictiontype:String", "servicecontrolpolicyrestrictiontype:String", "status:String", "numberofunusedactions:String", "numberofunusedservices:String", "~label"]
-        export_dynamodb_to_s3("AriaIdCInternalAAFindings", s3_bucket, "AriaIdCInternalAAFindings.csv", table_headers, csv_headers,label="InternalAccessFinding")
+        # The Is* flags and Services are derived from Action by classify_actions; Services
+        # is a ";"-separated String[] list.
+        table_headers = ["FindingId", "ResourceARN", "FindingType", "AccessType", "Principal", "PrincipalName", "PrincipalOwnerAccount", "ResourceType", "Action", "ResourceControlPolicyRestrictionType", "ServiceControlPolicyRestrictionType", "Status", "NumberofUnusedActions", "NumberofUnusedServices", "IsRead", "IsWrite", "IsDelete", "IsPermissionsMgmt", "Services", "Label"]
+        csv_headers = ["~id", "resourcearn:String", "findingtype:String", "accesstype:String", "principal:String", "principalname:String", "principalowneraccount:String", "resourcetype:String", "action:String", "resourcecontrolpolicyrestrictiontype:String", "servicecontrolpolicyrestrictiontype:String", "status:String", "numberofunusedactions:String", "numberofunusedservices:String", "is_read:Bool", "is_write:Bool", "is_delete:Bool", "is_permissions_mgmt:Bool", "services:String[]", "~label"]
+        export_dynamodb_to_s3("AriaIdCInternalAAFindings", s3_bucket, "AriaIdCInternalAAFindings.csv", table_headers, csv_headers,label="InternalAccessFinding", snapshot=snapshot, enrich=classify_actions)
 
         #Export Critical Resources to csv file
-        table_headers =  ["ResourceARN", "ResourceType", "Label"]
-        csv_headers = ["~id", "resourcetype:String", "~label"]
-        export_dynamodb_to_s3("AriaIdCInternalAAFindings", s3_bucket, "AriaIdCCriticalResources.csv", table_headers, csv_headers,label="CriticalResources")
+        # One row per resource, with its ARN split into arn_* properties by parse_arn and the
+        # lower-cased resource name as name_lc.
+        table_headers =  ["ResourceARN", "ResourceType", "ArnPartition", "ArnService", "ArnRegion", "ArnAccount", "ArnResourceType", "ArnResourceName", "NameLc", "Label"]
+        csv_headers = ["~id", "resourcetype:String", "arn_partition:String", "arn_service:String", "arn_region:String", "arn_account:String", "arn_resourcetype:String", "arn_resourcename:String", "name_lc:String", "~label"]
+        export_dynamodb_to_s3("AriaIdCInternalAAFindings", s3_bucket, "AriaIdCCriticalResources.csv", table_headers, csv_headers,label="CriticalResources", dedup_fields=["ResourceARN"], snapshot=snapshot, enrich=add_arn_components)
     
     # Only export Unused Access Analyzer Findings if the table has items
     if check_table_has_items("AriaIdCUnusedAAFindings"):
         #Export UnusedAccessAnalyzerFindings to csv file
-        table_headers = ["FindingId", "ResourceARN", "FindingType", "AccessType", "ResourceType", "Status", "NumberOfUnusedActions", "NumberOfUnusedServices", "Label"]
-        csv_headers = ["~id", "resourcearn:String", "findingtype:String", "accesstype:String", "resourcetype:String",  "status:String", "numberofunusedactions:String", "numberofunusedservices:String", "~label"]
-        export_dynamodb_to_s3("AriaIdCUnusedAAFindings", s3_bucket, "AriaIdCUnusedAAFindings.csv", table_headers, csv_headers,label="UnusedAccessFinding")
+        # UnusedServiceList/UnusedActionList are filled in by the enrichment pass of
+        # the AccessAnalyzerFindingIngestion function and are empty until it has run.
+        table_headers = ["FindingId", "ResourceARN", "FindingType", "AccessType", "ResourceType", "Status", "NumberOfUnusedActions", "NumberOfUnusedServices", "UnusedServiceList", "UnusedActionList", "Label"]
+        csv_headers = ["~id", "resourcearn:String", "findingtype:String", "accesstype:String", "resourcetype:String",  "status:String", "numberofunusedactions:String", "numberofunusedservices:String", "unusedservices:String", "unusedactions:String", "~label"]
+        export_dynamodb_to_s3("AriaIdCUnusedAAFindings", s3_bucket, "AriaIdCUnusedAAFindings.csv", table_headers, csv_headers,label="UnusedAccessFinding", snapshot=snapshot)
 
     
 #EDGES
@@ -148,7 +571,8 @@ def lambda_handler(event, context):
         table_headers, 
         csv_headers,
         generate_uuid=True,
-        label="HAS_MEMBERS"
+        label="HAS_MEMBERS",
+        snapshot=snapshot
     )
 
     # Export User to PermissionsSets to csv file - EDGE
@@ -162,7 +586,8 @@ def lambda_handler(event, context):
         csv_headers,
         generate_uuid=True,
         dedup_fields=["UserId", "PermissionSetArn"],
-        label="ASSIGNED_PERMISSIONSET"
+        label="ASSIGNED_PERMISSIONSET",
+        snapshot=snapshot
         )
     
     # Export Group to PermissionsSets to csv file - EDGE
@@ -176,7 +601,8 @@ def lambda_handler(event, context):
         csv_headers,
         generate_uuid=True,
         label="ASSIGNED_PERMISSIONSET",
-        dedup_fields=["GroupId", "PermissionSetArn"]
+        dedup_fields=["GroupId", "PermissionSetArn"],
+        snapshot=snapshot
         )
 
     # Export User to Accounts to csv file - EDGE
@@ -193,7 +619,8 @@ def lambda_handler(event, context):
         csv_headers,
         generate_uuid=True,
         label="ASSIGNED_ACCOUNT",
-        dedup_fields=["UserId", "AccountId"]
+        dedup_fields=["UserId", "AccountId"],
+        snapshot=snapshot
         )
     
     # Export Groups to Accounts to csv file - EDGE
@@ -210,9 +637,13 @@ def lambda_handler(event, context):
         csv_headers,
         generate_uuid=True,
         label="ASSIGNED_ACCOUNT",
-        dedup_fields=["GroupId", "AccountId"]
+        dedup_fields=["GroupId", "AccountId"],
+        snapshot=snapshot
         )
 
+    # Export User to PermissionSets through groups, flattened - EDGE
+    effective = export_effective_assignments(s3_bucket, "AriaIdCEffectiveAssignments_Edge.csv", snapshot=snapshot)
+
     # Export Account to PermissionSets to csv file - EDGE
     table_headers = ["UniqueId", "PermissionSetArn", "AccountId", "Label"]
     csv_headers = ["~id", "~from", "~to", "~label"]
@@ -223,7 +654,8 @@ def lambda_handler(event, context):
         table_headers, 
         csv_headers,
         generate_uuid=True,
-        label="PROVISIONED_INTO"
+        label="PROVISIONED_INTO",
+        snapshot=snapshot
         )
 
     #Export Roles to Accounts to csv file - EDGE
@@ -236,7 +668,8 @@ def lambda_handler(event, context):
         table_headers,
         csv_headers,
         generate_uuid=True,
-        label="CREATED_IN"
+        label="CREATED_IN",
+        snapshot=snapshot
         )
 
     #Export PermissionsSets to Roles to csv file - EDGE
@@ -249,7 +682,8 @@ def lambda_handler(event, context):
         table_headers,
         csv_headers,
         generate_uuid=True,
-        label="CREATED_AS"
+        label="CREATED_AS",
+        snapshot=snapshot
         )
     
     # Only export Internal Access Analyzer Findings if the table has items
@@ -265,7 +699,8 @@ def lambda_handler(event, context):
             table_headers,
             csv_headers,
             generate_uuid=True,
-            label="LINKED_TO"
+            label="LINKED_TO",
+            snapshot=snapshot
             )
 
         #Export Internal Access Analyzer Findings to Resource csv file - EDGE
@@ -278,7 +713,8 @@ def lambda_handler(event, context):
             table_headers,
             csv_headers,
             generate_uuid=True,
-            label="LINKED_TO"
+            label="LINKED_TO",
+            snapshot=snapshot
             )    
 
         #Export Internal Access Analyzer Findings Principal to Resource csv file - EDGE
@@ -292,7 +728,8 @@ def lambda_handler(event, context):
             csv_headers,
             generate_uuid=True,
             label="GRANTS_ACCESS_TO",
-            dedup_fields=["Principal", "ResourceARN"]
+            dedup_fields=["Principal", "ResourceARN"],
+            snapshot=snapshot
             )
 
         #Export Internal Access Analyzer Findings Resource to Account csv file - EDGE
@@ -306,7 +743,8 @@ def lambda_handler(event, context):
             csv_headers,
             generate_uuid=True,
             label="BELONGS_TO",
-            dedup_fields=["ResourceARN", "ResourceAccount"]
+            dedup_fields=["ResourceARN", "ResourceAccount"],
+            snapshot=snapshot
             )
 
     # Only export Unused Access Analyzer Findings if the table has items
@@ -322,9 +760,16 @@ def lambda_handler(event, context):
             table_headers, 
             csv_headers,
             generate_uuid=True,
-            label="HAS_UNUSED_ACCESS"
+            label="HAS_UNUSED_ACCESS",
+            snapshot=snapshot
         )
 
+    export_graph_stats(s3_bucket, compute_graph_stats(snapshot, effective), snapshot)
+
+    s3 = boto3.client('s3')
+    s3.put_object(Bucket=s3_bucket, Key=SNAPSHOT_KEY, Body=snapshot.build())
+    print(f"Graph snapshot written to S3: {s3_bucket}/{SNAPSHOT_KEY}")
+
     return {
         'statusCode': 200,
         'body': json.dumps('Data exported to S3')